@@ -1,98 +1,76 @@
-from env import api_details
 from oandapyV20 import API
-from oandapyV20.exceptions import V20Error
-from oandapyV20.endpoints.instruments import InstrumentsCandles
-import pandas as pd
-import time
-from datetime import datetime, timedelta
-import os
-
-# OANDA API credentials
-ACCOUNT_ID = api_details.account_id
-ACCESS_TOKEN = api_details.oanda_token
+import threading
+from support_resistance import SupportResistanceEngine
+from candle_store import CandleStore
+from breakout_sink import BreakoutSink
+from downloader import download_range, fetch_candles
+from live import LiveBreakoutEngine
+from scheduler import BACKFILL, LIVE, RequestScheduler
+
+# OANDA API credentials, from env.py when it is there (importing this module works without it)
+try:
+    from env import api_details
+except ImportError:
+    api_details = None
+
+ACCOUNT_ID = getattr(api_details, "account_id", None)
+ACCESS_TOKEN = getattr(api_details, "oanda_token", None)
 INSTRUMENT = "XAU_USD"
 
-# Initialize the OANDA API client
-api = API(access_token=ACCESS_TOKEN)
+# The scheduler and the sink start threads, so they are created on first use, not on import
+SCHEDULER = None
+BREAKOUT_SINK = None
+_CREATE_LOCK = threading.Lock()
 
 # File to store breakout data
 BREAKOUT_CSV = "breakout_data.csv"
 
+# Local store of downloaded candles, so past ranges are only fetched once
+CANDLE_STORE = CandleStore()
+
+# Function to get the scheduler for the OANDA API client
+# Every request goes through the scheduler: rate limited, retried, live polls first
+def get_scheduler():
+    global SCHEDULER
+    with _CREATE_LOCK:
+        if SCHEDULER is None:
+            SCHEDULER = RequestScheduler(API(access_token=ACCESS_TOKEN))
+        return SCHEDULER
+
+# Function to stop the scheduler's workers, the next get_scheduler() creates a new one
+def close_scheduler():
+    global SCHEDULER
+    with _CREATE_LOCK:
+        scheduler, SCHEDULER = SCHEDULER, None
+    if scheduler is not None:
+        scheduler.close(cancel_pending=True)
+
+# Function to get the sink breakouts are buffered in, written to BREAKOUT_CSV in batches
+def get_breakout_sink():
+    global BREAKOUT_SINK
+    with _CREATE_LOCK:
+        if BREAKOUT_SINK is None:
+            BREAKOUT_SINK = BreakoutSink(BREAKOUT_CSV)
+        return BREAKOUT_SINK
+
 # Function to fetch candlestick data
 def fetch_candlestick_data(start_time, end_time):
-    params = {
-        "granularity": "M30",  # 30-minute candles
-        "from": start_time,    # Start time
-        "to": end_time,        # End time
-        "price": "M",          # Midpoint candles (optional: "B" for bid, "A" for ask)
-    }
+    # Midpoint 30-minute candles, without the candle that is still forming
+    return download_historical_data(start_time, end_time, "M30")
 
-    try:
-        # Create the request
-        request = InstrumentsCandles(instrument=INSTRUMENT, params=params)
-
-        # Make the API call
-        response = api.request(request)
-
-        # Parse the response into a DataFrame
-        candles = response.get("candles", [])
-        data = []
-
-        for candle in candles:
-            data.append({
-                "time": candle["time"],
-                "open": float(candle["mid"]["o"]),
-                "high": float(candle["mid"]["h"]),
-                "low": float(candle["mid"]["l"]),
-                "close": float(candle["mid"]["c"]),
-                "volume": int(candle["volume"]),
-            })
-
-        df = pd.DataFrame(data)
-        df["time"] = pd.to_datetime(df["time"])
-        return df
-
-    except V20Error as e:
-        print(f"An error occurred while fetching data: {e}")
-        return None
-
-# Function to fetch historical candlestick data
+# Function to fetch historical candlestick data, reading the local store first
 def fetch_historical_data(start_time, end_time, granularity="M30"):
-    params = {
-        "granularity": granularity,  # 30-minute candles
-        "from": start_time,          # Start time
-        "to": end_time,              # End time
-        "price": "M",                # Midpoint candles (optional: "B" for bid, "A" for ask)
-    }
-
-    try:
-        # Create the request
-        request = InstrumentsCandles(instrument=INSTRUMENT, params=params)
-
-        # Make the API call
-        response = api.request(request)
-
-        # Parse the response into a DataFrame
-        candles = response.get("candles", [])
-        data = []
+    def download(from_time, to_time):
+        return download_range(
+            lambda a, b: download_historical_data(a, b, granularity),
+            INSTRUMENT, granularity, from_time, to_time,
+        )
 
-        for candle in candles:
-            data.append({
-                "time": candle["time"],
-                "open": float(candle["mid"]["o"]),
-                "high": float(candle["mid"]["h"]),
-                "low": float(candle["mid"]["l"]),
-                "close": float(candle["mid"]["c"]),
-                "volume": int(candle["volume"]),
-            })
+    return CANDLE_STORE.get(INSTRUMENT, granularity, "M", start_time, end_time, download)
 
-        df = pd.DataFrame(data)
-        df["time"] = pd.to_datetime(df["time"])
-        return df
-
-    except V20Error as e:
-        print(f"An error occurred while fetching data: {e}")
-        return None
+# Function to download historical candlestick data from OANDA
+def download_historical_data(start_time, end_time, granularity="M30"):
+    return fetch_candles(get_scheduler().client(BACKFILL), INSTRUMENT, start_time, end_time, granularity, price="M")
 
 
 # Function to detect support and resistance levels
@@ -154,54 +132,28 @@ def log_breakout_to_csv(candle, breakout_type, support, resistance):
         "resistance_level": resistance,
     }
 
-    # Convert the dictionary to a DataFrame
-    df = pd.DataFrame([breakout_data])
-
-    # Append the data to the CSV file
-    if not os.path.exists(BREAKOUT_CSV):
-        # Create the file if it doesn't exist
-        df.to_csv(BREAKOUT_CSV, index=False)
-    else:
-        # Append to the existing file
-        df.to_csv(BREAKOUT_CSV, mode="a", header=False, index=False)
+    # Buffer the record, the sink appends it to the CSV file with the next batch
+    get_breakout_sink().add(breakout_data)
 
-    print(f"Breakout logged to {BREAKOUT_CSV}")
+# Function to log a breakout as soon as its candle completes
+def log_new_breakout(candle, breakout_type, support, resistance):
+    print(f"Breakout detected: {breakout_type}")
+    log_breakout_to_csv(candle, breakout_type, support, resistance)
+    get_breakout_sink().flush()
 
 # Function to run the detection continuously
 def run_continuously():
     print("Starting continuous support/resistance detection...")
 
-    while True:
-        # Get the current time and calculate the start time for the last 100 candles
-        now = datetime.now()
-        start_time = (now - timedelta(minutes=30 * 100)).strftime("%Y-%m-%dT%H:%M:%SZ")
-        end_time = now.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        # Fetch the latest candlestick data
-        df = fetch_candlestick_data(start_time, end_time)
-        if df is None:
-            print("Failed to fetch data. Retrying in 1 minute...")
-            time.sleep(60)  # Wait 1 minute before retrying
-            continue
-
-        # Detect support and resistance levels
-        support, resistance = detect_support_resistance(df)
-        print(f"Current Support Level: {support}")
-        print(f"Current Resistance Level: {resistance}")
-
-        # Check the latest candle for breakouts
-        latest_candle = df.iloc[-1]
-        breakout = check_breakout(latest_candle, support, resistance)
-        if breakout:
-            print(f"Breakout detected: {breakout}")
-            # Log the breakout to the CSV file
-            log_breakout_to_csv(latest_candle, breakout, support, resistance)
-
-        # Wait until the next 30-minute candle starts
-        next_candle_time = (now + timedelta(minutes=30)).replace(second=0, microsecond=0)
-        sleep_duration = (next_candle_time - now).total_seconds()
-        print(f"Waiting for the next 30-minute candle at {next_candle_time}...")
-        time.sleep(sleep_duration)
+    # Polls only for new candles right after each one completes and updates the levels in place
+    live = LiveBreakoutEngine(
+        get_scheduler().client(LIVE), INSTRUMENT, "M30", num_candles=100, tolerance=None,
+        session=None, on_breakout=log_new_breakout,
+    )
+    try:
+        live.run()
+    finally:
+        close_scheduler()
 
 # Function to backtest over a specific period
 def backtest(start_time, end_time):
@@ -217,14 +169,21 @@ def backtest(start_time, end_time):
     support = None
     resistance = None
 
+    # Streaming S/R engine, only ever fed the candles before the current one
+    engine = SupportResistanceEngine(num_candles=100, tolerance=None)
+    opens = df["open"].to_numpy()
+    closes = df["close"].to_numpy()
+
     # Iterate through the historical data one candle at a time
     for i in range(len(df)):
         candle = df.iloc[i]
+        if i > 0:
+            engine.update(opens[i - 1], closes[i - 1])
         print(f"Processing candle at {candle['time']}...")
 
         # Update support and resistance levels using the last 100 candles
         if i >= 100:
-            support, resistance = detect_support_resistance(df.iloc[:i], num_candles=100)
+            support, resistance = engine.levels()
 
         # Check for breakouts
         breakout = check_breakout(candle, support, resistance)
@@ -233,21 +192,24 @@ def backtest(start_time, end_time):
             # Log the breakout to the CSV file
             log_breakout_to_csv(candle, breakout, support, resistance)
 
+    get_breakout_sink().flush()
     print("Backtest complete.")
 
 
 
 
-# Run the continuous detection
-# run_continuously()
+# Only run when started as a script, so benchmarks and other modules can import the functions
+if __name__ == "__main__":
+    # Run the continuous detection
+    # run_continuously()
 
 
-# Define the backtest period
-start_time = "2023-01-01T00:00:00Z"  # Start time in UTC
-end_time = "2023-01-31T23:59:59Z"    # End time in UTC
+    # Define the backtest period
+    start_time = "2023-01-01T00:00:00Z"  # Start time in UTC
+    end_time = "2023-01-31T23:59:59Z"    # End time in UTC
 
-# Run the backtest
-backtest(start_time, end_time)
+    # Run the backtest
+    backtest(start_time, end_time)
 
 
 
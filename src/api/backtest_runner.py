@@ -0,0 +1,121 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from breakouts import build_training_table
+from candle_store import STORE_DIR, CandleStore, to_epoch_ns
+from downloader import MAX_WORKERS, download_range, fetch_candles
+
+# Major FX pairs and metals screened by default
+INSTRUMENTS = [
+    "EUR_USD", "GBP_USD", "USD_JPY", "USD_CHF", "AUD_USD", "USD_CAD", "NZD_USD",
+    "XAU_USD", "XAG_USD",
+]
+GRANULARITIES = ["M30"]
+
+# Folder for the per-series datasets and the merged file
+OUTPUT_DIR = "breakouts"
+MERGED_CSV = "all_breakouts.csv"
+
+
+# Function to make sure the store holds every series in the grid
+def sync_store(api, store, instruments, granularities, start_time, end_time):
+    for instrument in instruments:
+        for granularity in granularities:
+            def download(from_time, to_time):
+                return download_range(
+                    lambda a, b: fetch_candles(api, instrument, a, b, granularity),
+                    instrument, granularity, from_time, to_time, max_workers=MAX_WORKERS,
+                )
+
+            if store.get(instrument, granularity, "M", start_time, end_time, download) is None:
+                print(f"Failed to sync {instrument} {granularity}")
+
+
+# Function run in a worker: backtest one series straight from the memory-mapped store
+def run_series(store_root, instrument, granularity, start_time, end_time, output_dir, num_candles, tolerance):
+    started = time.perf_counter()
+
+    # Workers open the .npy files themselves, nothing but arguments is pickled
+    arrays = CandleStore(store_root).load_arrays(instrument, granularity, "M")
+    times = arrays["time"]
+    lo = times.searchsorted(to_epoch_ns(start_time), side="left")
+    hi = times.searchsorted(to_epoch_ns(end_time), side="left")
+
+    df = pd.DataFrame({name: values[lo:hi] for name, values in arrays.items()})
+    df["time"] = pd.to_datetime(df["time"], unit="ns", utc=True)
+
+    table = build_training_table(df, num_candles=num_candles, tolerance=tolerance)
+    path = os.path.join(output_dir, f"{instrument}_{granularity}.csv")
+    table.to_csv(path, index=False)
+
+    return {
+        "instrument": instrument,
+        "granularity": granularity,
+        "candles": len(df),
+        "breakouts": len(table),
+        "seconds": time.perf_counter() - started,
+        "path": path,
+    }
+
+
+# Function to backtest a grid of instruments and granularities on a process pool
+def run_grid(instruments, granularities, start_time, end_time, store_root=STORE_DIR,
+             output_dir=OUTPUT_DIR, max_workers=None, num_candles=100, tolerance=2.0):
+    """Runs build_training_table for every series and merges the results.
+
+    The candles must already be in the store (see sync_store). Each worker
+    writes <output_dir>/<instrument>_<granularity>.csv; the merged dataset with
+    instrument and granularity columns is written to <output_dir>/MERGED_CSV.
+    Returns (merged DataFrame, per-series summary DataFrame).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(run_series, store_root, instrument, granularity, start_time, end_time,
+                        output_dir, num_candles, tolerance)
+            for instrument in instruments
+            for granularity in granularities
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"{result['instrument']} {result['granularity']}: "
+                  f"{result['breakouts']} breakouts from {result['candles']} candles "
+                  f"in {result['seconds']:.1f}s")
+            results.append(result)
+
+    summary = pd.DataFrame(results).sort_values(["instrument", "granularity"], ignore_index=True)
+
+    frames = []
+    for result in summary.itertuples():
+        table = pd.read_csv(result.path)
+        table.insert(1, "instrument", result.instrument)
+        table.insert(2, "granularity", result.granularity)
+        frames.append(table)
+    merged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not merged.empty:
+        merged = merged.sort_values("time", kind="stable", ignore_index=True)
+    merged.to_csv(os.path.join(output_dir, MERGED_CSV), index=False)
+
+    return merged, summary
+
+
+if __name__ == "__main__":
+    from env import api_details
+    from oandapyV20 import API
+    from downloader import pool_connections
+    from scheduler import RequestScheduler
+
+    start_time = "2024-01-01T00:00:00Z"
+    end_time = "2025-01-01T00:00:00Z"
+
+    scheduler = RequestScheduler(pool_connections(API(access_token=api_details.oanda_token), MAX_WORKERS))
+    sync_store(scheduler.client(), CandleStore(), INSTRUMENTS, GRANULARITIES, start_time, end_time)
+
+    merged, summary = run_grid(INSTRUMENTS, GRANULARITIES, start_time, end_time)
+    print(summary)
+    print(f"{len(merged)} breakouts written to {os.path.join(OUTPUT_DIR, MERGED_CSV)}")
@@ -0,0 +1,39 @@
+import time
+
+import pandas as pd
+
+from downloader import download_chunks, fetch_candles, pool_connections
+from mock_oanda import MockOandaServer, make_candles
+
+INSTRUMENT = "XAU_USD"
+GRANULARITY = "M30"
+
+# Simulated round-trip time of one OANDA request in seconds
+LATENCY = 0.15
+
+
+# Function to fetch one chunk from the mock server
+def make_download(api):
+    return lambda start_time, end_time: fetch_candles(api, INSTRUMENT, start_time, end_time, GRANULARITY)
+
+
+def main():
+    candles = make_candles(start="2024-01-01", end="2025-01-01")
+    chunks = [(d.date(), (d + pd.Timedelta(days=7)).date())
+              for d in pd.date_range("2024-01-01", "2024-12-24", freq="7D")]
+
+    with MockOandaServer({(INSTRUMENT, GRANULARITY): candles}, latency=LATENCY) as server:
+        for workers in (1, 4, 8, 16):
+            api = pool_connections(server.api(), workers)
+            download = make_download(api)
+
+            start = time.perf_counter()
+            df = download_chunks(download, chunks, max_workers=workers)
+            elapsed = time.perf_counter() - start
+
+            print(f"workers={workers:<3} chunks={len(chunks)} candles={len(df)} "
+                  f"time={elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from candle_parser import candles_to_frame
+
+# Candles in one full OANDA page
+PAGE_SIZE = 5000
+REPEAT = 20
+
+
+# Function to build a candles payload shaped like an InstrumentsCandles response
+def make_payload(count=PAGE_SIZE, seed=42):
+    rng = np.random.default_rng(seed)
+    times = pd.date_range("2024-01-01", periods=count, freq="30min", tz="UTC")
+    mids = 2000 + np.cumsum(rng.normal(0, 1.5, count))
+    return [
+        {
+            "complete": True,
+            "volume": int(volume),
+            "time": stamp,
+            "mid": {"o": f"{mid:.3f}", "h": f"{mid + 1:.3f}", "l": f"{mid - 1:.3f}", "c": f"{mid + 0.5:.3f}"},
+        }
+        for stamp, mid, volume in zip(times.strftime("%Y-%m-%dT%H:%M:%S.000000000Z"), mids, rng.integers(1, 5000, count))
+    ]
+
+
+# Per-candle dict parsing the fetch functions used before candle_parser
+def parse_rows(candles):
+    data = []
+    for candle in candles:
+        data.append({
+            "time": candle["time"],
+            "open": float(candle["mid"]["o"]),
+            "high": float(candle["mid"]["h"]),
+            "low": float(candle["mid"]["l"]),
+            "close": float(candle["mid"]["c"]),
+            "volume": int(candle["volume"]),
+        })
+
+    df = pd.DataFrame(data)
+    df["time"] = pd.to_datetime(df["time"])
+    return df
+
+
+def measure(parse, payload):
+    parse(payload)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        parse(payload)
+    elapsed = (time.perf_counter() - start) / REPEAT
+
+    tracemalloc.start()
+    parse(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    payload = make_payload()
+    for name, parse in (("per-row dicts", parse_rows), ("candle_parser", candles_to_frame)):
+        elapsed, peak = measure(parse, payload)
+        print(f"{name:<14} {elapsed * 1000:7.2f} ms/page  peak {peak / 1e6:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
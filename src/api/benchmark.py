@@ -0,0 +1,259 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import get_training
+from breakout_sink import BreakoutSink
+from candle_parser import candles_to_frame
+from mock_oanda import make_candles
+from support_resistance import SupportResistanceEngine
+
+# Candle counts every case is timed at
+SIZES = (10_000, 100_000, 1_000_000)
+
+# Stored timings new runs are compared to, next to this file
+BASELINE_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+# A case this much slower than its baseline is a regression
+TOLERANCE = 0.25
+
+# Small sizes are timed this many times and the fastest run kept
+REPEAT = 3
+REPEAT_UP_TO = 100_000
+
+# Synthetic candles start here, the baseline was taken with this start
+START = "2020-01-01"
+
+# Candles in one full OANDA page, the unit responses are parsed in
+PAGE_SIZE = 5000
+
+NUM_CANDLES = 100
+
+
+# Function to turn candles into OANDA response pages (lists of candle dicts)
+def make_pages(candles, page_size=PAGE_SIZE):
+    text = candles["time"].dt.strftime("%Y-%m-%dT%H:%M:%S.000000000Z").tolist()
+    columns = [candles[name].tolist() for name in ("open", "high", "low", "close", "volume")]
+    payload = [
+        {"complete": True, "volume": volume, "time": stamp,
+         "mid": {"o": f"{o:.3f}", "h": f"{h:.3f}", "l": f"{l:.3f}", "c": f"{c:.3f}"}}
+        for stamp, o, h, l, c, volume in zip(text, *columns)
+    ]
+    return [payload[i:i + page_size] for i in range(0, len(payload), page_size)]
+
+
+# Function to get the S/R levels every candle is checked against, as the backtest sees them
+def candle_levels(candles, num_candles=NUM_CANDLES):
+    engine = SupportResistanceEngine(num_candles=num_candles, tolerance=2.0)
+    support = np.full(len(candles), np.nan)
+    resistance = np.full(len(candles), np.nan)
+    for i, (o, c) in enumerate(zip(candles["open"].to_numpy(), candles["close"].to_numpy())):
+        if i >= num_candles:
+            s, r = engine.levels()
+            support[i] = np.nan if s is None else s
+            resistance[i] = np.nan if r is None else r
+        engine.update(o, c)
+    return support, resistance
+
+
+# Function to swap module attributes for the length of a with block
+@contextlib.contextmanager
+def patched(module, **values):
+    saved = {name: getattr(module, name) for name in values}
+    for name, value in values.items():
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(module, name, value)
+
+
+# Function to route get_training's data and output to the benchmark, with its prints muted
+@contextlib.contextmanager
+def offline_get_training(candles, folder):
+    sink = BreakoutSink(os.path.join(folder, "breakouts.csv"), flush_interval=0)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+            patched(get_training, fetch_multiple_data=lambda *args, **kwargs: candles, BREAKOUT_SINK=sink):
+        yield sink
+    sink.close()
+
+
+# Each case takes the candles and a scratch folder, runs once and returns (seconds, checksum)
+def case_parse(candles, folder):
+    pages = make_pages(candles)
+    started = time.perf_counter()
+    rows = sum(len(candles_to_frame(page)) for page in pages)
+    return time.perf_counter() - started, rows
+
+
+def case_detect_support_resistance(candles, folder):
+    # One call per window of NUM_CANDLES, like the original per-candle backtest made at every step
+    ends = range(NUM_CANDLES + 1, len(candles) + 1, NUM_CANDLES)
+    windows = [candles.iloc[end - NUM_CANDLES - 1:end] for end in ends]
+    started = time.perf_counter()
+    found = 0
+    for window in windows:
+        support, resistance = get_training.detect_support_resistance(window, NUM_CANDLES)
+        found += (support is not None) + (resistance is not None)
+    return time.perf_counter() - started, found
+
+
+def case_check_breakout(candles, folder):
+    records = candles[["time", "open", "close"]].to_dict("records")
+    support, resistance = candle_levels(candles)
+    support = [None if np.isnan(s) else s for s in support]
+    resistance = [None if np.isnan(r) else r for r in resistance]
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        started = time.perf_counter()
+        found = sum(
+            get_training.check_breakout(record, s, r) is not None
+            for record, s, r in zip(records, support, resistance)
+        )
+        elapsed = time.perf_counter() - started
+    return elapsed, found
+
+
+def case_backtest(candles, folder):
+    with offline_get_training(candles, folder) as sink:
+        started = time.perf_counter()
+        get_training.backtest("2020-01-01", "2020-01-02")
+        elapsed = time.perf_counter() - started
+    return elapsed, sink.written
+
+
+def case_backtest_batch(candles, folder):
+    with offline_get_training(candles, folder) as sink:
+        started = time.perf_counter()
+        get_training.backtest_batch("2020-01-01", "2020-01-02")
+        elapsed = time.perf_counter() - started
+    return elapsed, sink.written
+
+
+def case_log_breakout_to_csv(candles, folder):
+    # One logged breakout per candle, with the candles before it as Candle2-4
+    records = candles.to_dict("records")
+    with offline_get_training(candles, folder) as sink:
+        started = time.perf_counter()
+        for i in range(4, len(records)):
+            get_training.log_breakout_to_csv(records[i], records[i - 1], records[i - 1], records[i - 2],
+                                             records[i - 3], "support", 1990.0, 2010.0)
+        sink.flush()
+        elapsed = time.perf_counter() - started
+    return elapsed, sink.written
+
+
+CASES = {
+    "parse": case_parse,
+    "detect_support_resistance": case_detect_support_resistance,
+    "check_breakout": case_check_breakout,
+    "backtest": case_backtest,
+    "backtest_batch": case_backtest_batch,
+    "log_breakout_to_csv": case_log_breakout_to_csv,
+}
+
+
+# Function to time the cases at every size, best of REPEAT runs for the small sizes
+def run_benchmarks(sizes=SIZES, cases=tuple(CASES), **generator):
+    """Returns {case: {size: {"seconds": ..., "checksum": ...}}}; the checksum
+    (rows, levels or breakouts found) catches changes in results as well as speed."""
+    results = {name: {} for name in cases}
+    for n in sizes:
+        candles = make_candles(n, START, **generator)
+        for name in cases:
+            runs = []
+            for _ in range(REPEAT if n <= REPEAT_UP_TO else 1):
+                with tempfile.TemporaryDirectory() as folder:
+                    runs.append(CASES[name](candles, folder))
+            results[name][str(n)] = {"seconds": min(seconds for seconds, _ in runs), "checksum": int(runs[0][1])}
+            print(f"{name:<26} {n:>9} candles  {results[name][str(n)]['seconds']:9.3f}s", file=sys.stderr)
+    return results
+
+
+# Function to compare results with a baseline, one row per case and size
+def compare(results, baseline, tolerance=TOLERANCE):
+    """status is "slower"/"faster" outside the tolerance, "changed" when the checksum differs,
+    "new" without a baseline and "ok" otherwise."""
+    rows = []
+    for name, sizes in results.items():
+        for n, result in sizes.items():
+            base = baseline.get(name, {}).get(n)
+            row = {
+                "case": name,
+                "candles": int(n),
+                "seconds": result["seconds"],
+                "us_per_candle": result["seconds"] / int(n) * 1e6,
+                "baseline": np.nan if base is None else base["seconds"],
+                "ratio": np.nan if base is None else result["seconds"] / base["seconds"],
+                "status": "new",
+            }
+            if base is not None:
+                if result["checksum"] != base["checksum"]:
+                    row["status"] = "changed"
+                elif row["ratio"] > 1 + tolerance:
+                    row["status"] = "slower"
+                elif row["ratio"] < 1 / (1 + tolerance):
+                    row["status"] = "faster"
+                else:
+                    row["status"] = "ok"
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def load_baseline(path=BASELINE_JSON):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+# Function to store results as the baseline, keeping stored cases and sizes that were not run
+def save_baseline(results, path=BASELINE_JSON):
+    merged = load_baseline(path)
+    for name, sizes in results.items():
+        merged.setdefault(name, {}).update(sizes)
+
+    baseline = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "results": merged,
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the data and detection hot paths on synthetic candles.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--baseline", default=BASELINE_JSON)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these timings as the new baseline")
+    parser.add_argument("--volatility", type=float, default=1.5)
+    parser.add_argument("--gap-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes, args.cases, volatility=args.volatility, gap_rate=args.gap_rate)
+    report = compare(results, load_baseline(args.baseline), args.tolerance)
+    pd.set_option("display.width", 200)
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.4g}"))
+
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+    elif report["status"].isin(["slower", "changed"]).any():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
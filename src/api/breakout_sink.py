@@ -0,0 +1,159 @@
+import atexit
+import glob
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+
+# Records kept in memory before they are written out
+BATCH_SIZE = 1000
+
+# Seconds a buffered record may wait before a background flush writes it
+FLUSH_INTERVAL = 5.0
+
+
+class BreakoutSink():
+    """Buffers breakout records and writes them out in batches.
+
+    format="csv" appends to a CSV file, writing the header only when the file
+    is new, so the output matches log_breakout_to_csv. format="npz" writes one
+    columnar .npz part per flush into the directory at path; read them back
+    with read_breakouts(). The buffer is flushed when it holds batch_size
+    records, by a background thread every flush_interval seconds, on close()
+    and at interpreter exit.
+    """
+
+    def __init__(self, path, format="csv", batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        if format not in ("csv", "npz"):
+            raise ValueError(f"Unknown breakout sink format: {format}")
+
+        self.path = path
+        self.format = format
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.written = 0
+        self.lock = threading.RLock()
+        self.closed = False
+
+        self.stop_event = threading.Event()
+        self.thread = None
+        if flush_interval and flush_interval > 0:
+            self.thread = threading.Thread(target=self._flush_periodically, daemon=True)
+            self.thread.start()
+
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # Function to add one breakout record (a dict of column -> value)
+    def add(self, record):
+        with self.lock:
+            self.buffer.append(record)
+            if len(self.buffer) >= self.batch_size:
+                self.flush()
+
+    # Function to add a whole table of breakouts, e.g. from build_training_table
+    def add_frame(self, df):
+        with self.lock:
+            self.flush()
+            self._write(df)
+
+    def flush(self):
+        with self.lock:
+            if not self.buffer:
+                return
+            df = pd.DataFrame(self.buffer)
+            self.buffer = []
+            self._write(df)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def _flush_periodically(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def _write(self, df):
+        if df.empty:
+            return
+
+        with stage("csv_write" if self.format == "csv" else "npz_write", rows=len(df)):
+            if self.format == "csv":
+                if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                    df.to_csv(self.path, index=False)
+                else:
+                    df.to_csv(self.path, mode="a", header=False, index=False)
+            else:
+                _write_npz_part(self.path, df)
+
+        self.written += len(df)
+
+
+# Function to list the finished .npz parts in a sink directory, in write order
+def _part_files(folder):
+    parts = glob.glob(os.path.join(folder, "part-*.npz"))
+    return sorted(part for part in parts if not part.endswith(".tmp.npz"))
+
+
+# Function to write one DataFrame as a new .npz part in a directory
+def _write_npz_part(folder, df):
+    os.makedirs(folder, exist_ok=True)
+    # Named by write time, then pid and a random suffix, so processes sharing the folder never collide
+    part = f"part-{time.time_ns():020d}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+    columns = {}
+    utc_columns = []
+    for name in df.columns:
+        column = df[name]
+        if isinstance(column.dtype, pd.DatetimeTZDtype):
+            column = column.dt.tz_convert("UTC").dt.tz_localize(None)
+            utc_columns.append(name)
+        if column.dtype.kind in "biufmM":
+            columns[name] = column.to_numpy()
+        else:
+            columns[name] = column.astype(str).to_numpy(dtype=str)
+
+    columns["__columns__"] = np.array(list(df.columns), dtype=str)
+    columns["__utc__"] = np.array(utc_columns, dtype=str)
+
+    # Write next to the target and swap in, so a crash never leaves half a part
+    tmp = os.path.join(folder, f"{part}.tmp.npz")
+    np.savez(tmp, **columns)
+    os.replace(tmp, os.path.join(folder, f"{part}.npz"))
+
+
+# Function to read breakouts written by a BreakoutSink back into one DataFrame
+def read_breakouts(path, format=None):
+    if format is None:
+        format = "npz" if os.path.isdir(path) else "csv"
+    if format == "csv":
+        return pd.read_csv(path)
+
+    frames = []
+    for part in _part_files(path):
+        with np.load(part, allow_pickle=False) as data:
+            df = pd.DataFrame({str(name): data[name] for name in data["__columns__"]})
+            for name in data["__utc__"].tolist():
+                df[name] = df[name].dt.tz_localize("UTC")
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
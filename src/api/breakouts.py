@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+
+from profiling import stage
+from sessions import utc_window_mask
+from support_resistance import detect_support_resistance_series
+
+# Columns written by log_breakout_to_csv in get_training.py
+TRAINING_COLUMNS = [
+    "time",
+    "size",
+    "volume",
+    "Candle1Size",
+    "Candle2Size",
+    "Candle3Size",
+    "Candle4Size",
+    "breakout_type",
+    "support_level",
+    "resistance_level",
+]
+
+# Breakout codes used by the array functions
+NO_BREAKOUT = 0
+RESISTANCE_BREAKOUT = 1
+SUPPORT_BREAKOUT = -1
+
+BREAKOUT_NAMES = {RESISTANCE_BREAKOUT: "resistance", SUPPORT_BREAKOUT: "support"}
+
+# Rules for accepting a breakout: the next candle must move the same way, or any
+CONFIRMATION_RULES = ("same_direction", "none")
+
+
+# Function to check every candle for a breakout, same rules as check_breakout
+def check_breakouts(opens, closes, support, resistance):
+    opens = np.asarray(opens)
+    closes = np.asarray(closes)
+
+    # NaN levels compare False, just like a None level is skipped
+    resistance_break = (opens < resistance) & (closes > resistance)
+    support_break = (opens > support) & (closes < support)
+
+    codes = np.full(len(opens), NO_BREAKOUT, dtype=np.int8)
+    codes[support_break] = SUPPORT_BREAKOUT
+    codes[resistance_break] = RESISTANCE_BREAKOUT
+    return codes
+
+
+# Function to find breakouts whose next candle moves in the same direction
+def confirmed_breakouts(opens, closes, codes):
+    opens = np.asarray(opens)
+    closes = np.asarray(closes)
+
+    falling = opens > closes
+    rising = opens < closes
+
+    confirmed = np.zeros(len(codes), dtype=bool)
+    same_direction = (falling[:-1] & falling[1:]) | (rising[:-1] & rising[1:])
+    confirmed[:-1] = (codes[:-1] != NO_BREAKOUT) & same_direction
+    return confirmed
+
+
+# Function to pick the breakout candles that get logged, returns (rows, codes)
+def select_breakouts(opens, closes, support, resistance, session_mask, num_candles=100,
+                     confirmation="same_direction"):
+    if confirmation not in CONFIRMATION_RULES:
+        raise ValueError(f"Unknown confirmation rule: {confirmation}")
+
+    # backtest() only starts using levels once it has num_candles of history
+    support = np.where(np.arange(len(support)) < num_candles, np.nan, support)
+    resistance = np.where(np.arange(len(resistance)) < num_candles, np.nan, resistance)
+
+    codes = check_breakouts(opens, closes, support, resistance)
+    codes[~np.asarray(session_mask, dtype=bool)] = NO_BREAKOUT
+
+    if confirmation == "same_direction":
+        selected = confirmed_breakouts(opens, closes, codes)
+    else:
+        # Every breakout that has a next candle to measure
+        selected = codes != NO_BREAKOUT
+        selected[-1:] = False
+
+    rows = np.flatnonzero(selected)
+    return rows[rows >= 3], codes
+
+
+# Function to build the whole breakout training table in one pass
+def build_training_table(df, num_candles=100, tolerance=2.0, session_mask=None, confirmation="same_direction"):
+    """Returns the rows backtest() would log, in the same column order.
+
+    session_mask defaults to the fixed 10:00-16:00 UTC window used by backtest().
+    """
+    opens = df["open"].to_numpy(dtype=np.float64)
+    closes = df["close"].to_numpy(dtype=np.float64)
+
+    if session_mask is None:
+        with stage("session_filter"):
+            session_mask = utc_window_mask(df["time"])
+
+    with stage("sr_detection"):
+        support, resistance = detect_support_resistance_series(opens, closes, num_candles, tolerance)
+    with stage("breakout_check"):
+        rows, codes = select_breakouts(opens, closes, support, resistance, session_mask, num_candles, confirmation)
+
+    sizes = np.abs(closes - opens)
+    table = pd.DataFrame({
+        "time": df["time"].iloc[rows + 1].reset_index(drop=True),
+        "size": sizes[rows + 1],
+        "volume": df["volume"].to_numpy()[rows + 1],
+        "Candle1Size": sizes[rows],
+        "Candle2Size": sizes[rows - 1],
+        "Candle3Size": sizes[rows - 2],
+        "Candle4Size": sizes[rows - 3],
+        "breakout_type": np.where(codes[rows] == RESISTANCE_BREAKOUT, "resistance", "support"),
+        "support_level": support[rows],
+        "resistance_level": resistance[rows],
+    }, columns=TRAINING_COLUMNS)
+
+    return table
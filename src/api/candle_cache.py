@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from candle_store import GRANULARITY_SECONDS
+
+# OANDA aligns daily and multi-hour candles to 17:00 New York time by default
+ALIGNMENT_TIMEZONE = ZoneInfo("America/New_York")
+DAILY_ALIGNMENT = 17
+
+
+# Function to get the epoch time (seconds) when the current candle closes
+def next_candle_close(granularity, now=None):
+    now = time.time() if now is None else now
+    step = GRANULARITY_SECONDS[granularity]
+
+    # Seconds, minutes and H1 candles line up with UTC
+    if step <= 3600:
+        return (now // step + 1) * step
+
+    # Longer candles count from the last 17:00 in New York, which follows DST
+    local = datetime.fromtimestamp(now, ALIGNMENT_TIMEZONE)
+    anchor = local.replace(hour=DAILY_ALIGNMENT, minute=0, second=0, microsecond=0)
+    if anchor > local:
+        anchor -= timedelta(days=1)
+
+    if granularity == "W":
+        # Weekly candles close on Friday at 17:00 New York
+        days = (4 - anchor.weekday()) % 7
+        return (anchor + timedelta(days=days or 7)).timestamp()
+
+    if granularity == "M":
+        # Expire monthly candles with the daily close, they still change every day
+        return (anchor + timedelta(days=1)).timestamp()
+
+    start = anchor.timestamp()
+    return start + ((now - start) // step + 1) * step
+
+
+# Function to roughly measure the memory held by a candles response
+def _sizeof(obj):
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_sizeof(k) + _sizeof(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)) or getattr(obj, "dtype", None) == object:
+        size += sum(_sizeof(item) for item in obj)
+    elif hasattr(obj, "nbytes"):
+        size += obj.nbytes
+    return size
+
+
+class CandleCache():
+    """LRU cache for candle responses that expire when their candle closes.
+
+    Keys are request parameters (instrument, granularity, count or from/to).
+    Entries are dropped when they expire, when there are more than
+    max_entries, or when they take more than max_bytes in total, oldest use
+    first. hits, misses, evictions and expirations count what happened.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] <= now:
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, expires_at=float("inf")):
+        size = _sizeof(value)
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                return
+
+            self.entries[key] = (value, expires_at, size)
+            self.bytes += size
+
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _drop(self, key):
+        self.bytes -= self.entries.pop(key)[2]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+            }
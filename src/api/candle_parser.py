@@ -0,0 +1,63 @@
+from operator import itemgetter
+
+import numpy as np
+import pandas as pd
+
+# Price component letters used in the "price" request parameter
+PRICE_KEYS = {"M": "mid", "B": "bid", "A": "ask"}
+
+# Column dtypes produced by parse_candles, time is epoch nanoseconds UTC
+COLUMNS = {
+    "time": np.int64,
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.int32,
+}
+
+_ohlc = itemgetter("o", "h", "l", "c")
+
+
+# Function to parse OANDA candle times (RFC3339 or UNIX) into epoch nanoseconds
+def _parse_times(times):
+    if times and "T" not in times[0]:
+        seconds = np.array(times, dtype=np.float64)
+        return np.round(seconds * 1e9).astype(np.int64)
+    return np.array([t.rstrip("Z") for t in times], dtype="datetime64[ns]").view(np.int64)
+
+
+# Function to turn an InstrumentsCandles "candles" list into typed columns
+def parse_candles(candles, price="M", complete_only=True):
+    """Returns a dict of NumPy columns: time, open, high, low, close, volume.
+
+    price picks the mid ("M"), bid ("B") or ask ("A") component. Candles that
+    are still forming are skipped unless complete_only is False.
+    """
+    key = PRICE_KEYS[price]
+    if complete_only:
+        candles = [candle for candle in candles if candle.get("complete", True)]
+    count = len(candles)
+
+    # Gather all price strings in one flat list and let NumPy parse them in C
+    flat = []
+    for candle in candles:
+        flat.extend(_ohlc(candle[key]))
+    prices = np.array(flat, dtype=np.float64).reshape(count, 4).T.copy()
+
+    return {
+        "time": _parse_times([candle["time"] for candle in candles]),
+        "open": prices[0],
+        "high": prices[1],
+        "low": prices[2],
+        "close": prices[3],
+        "volume": np.fromiter((candle["volume"] for candle in candles), dtype=np.int32, count=count),
+    }
+
+
+# Function to parse a candles list straight into the DataFrame the scripts use
+def candles_to_frame(candles, price="M", complete_only=True):
+    columns = parse_candles(candles, price, complete_only)
+    df = pd.DataFrame(columns)
+    df["time"] = pd.to_datetime(df["time"], unit="ns", utc=True)
+    return df
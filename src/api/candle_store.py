@@ -0,0 +1,274 @@
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from profiling import timed
+
+# Default folder for stored candles, relative like BREAKOUT_CSV
+STORE_DIR = "candle_store"
+
+# Length of one candle in seconds for each OANDA granularity
+GRANULARITY_SECONDS = {
+    "S5": 5, "S10": 10, "S15": 15, "S30": 30,
+    "M1": 60, "M2": 120, "M4": 240, "M5": 300, "M10": 600, "M15": 900, "M30": 1800,
+    "H1": 3600, "H2": 7200, "H3": 10800, "H4": 14400, "H6": 21600, "H8": 28800, "H12": 43200,
+    "D": 86400, "W": 604800, "M": 2678400,
+}
+
+# Stored columns and their on-disk dtypes, time is epoch nanoseconds UTC
+COLUMNS = {
+    "time": np.int64,
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.int64,
+}
+
+# Bytes before the values in a column file, room for any header so lengths can be rewritten in place
+HEADER_SIZE = 128
+
+# Values copied at a time when a write has to rewrite the stored candles after it
+COPY_ROWS = 1 << 20
+
+
+# Function to turn a date, datetime or RFC3339 string into epoch nanoseconds UTC
+def to_epoch_ns(value):
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize("UTC")
+    return int(stamp.tz_convert("UTC").as_unit("ns").value)
+
+
+# Function to format epoch nanoseconds the way OANDA expects in from/to
+def to_rfc3339(epoch_ns):
+    return pd.Timestamp(epoch_ns, unit="ns", tz="UTC").strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+# Function to merge overlapping or touching [start, end) ranges
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+# Function to get the parts of [start, end) that are not in covered ranges
+def subtract_ranges(start, end, covered):
+    missing = []
+    cursor = start
+    for cov_start, cov_end in covered:
+        if cov_end <= cursor:
+            continue
+        if cov_start >= end:
+            break
+        if cov_start > cursor:
+            missing.append((cursor, cov_start))
+        cursor = max(cursor, cov_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+# Function to build a .npy header for a 1-D column, padded to HEADER_SIZE bytes
+def _npy_header(dtype, length):
+    header = repr({"descr": np.lib.format.dtype_to_descr(np.dtype(dtype)), "fortran_order": False,
+                   "shape": (int(length),)})
+    header = header.ljust(HEADER_SIZE - 11) + "\n"
+    return np.lib.format.MAGIC_PREFIX + bytes([1, 0]) + struct.pack("<H", len(header)) + header.encode("latin1")
+
+
+# Function to find where the values start in a .npy file, None if there is no file
+def _data_offset(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            np.lib.format.read_array_header_1_0(f)
+        else:
+            np.lib.format.read_array_header_2_0(f)
+        return f.tell()
+
+
+# Function to copy values[start:stop] of a (memory-mapped) column to a file, COPY_ROWS at a time
+def _copy_rows(f, values, start, stop):
+    for i in range(start, stop, COPY_ROWS):
+        f.write(np.ascontiguousarray(values[i:min(stop, i + COPY_ROWS)]).tobytes())
+
+
+class CandleStore():
+    """On-disk candle store with one .npy file per column.
+
+    Candles are kept per (instrument, granularity, price) in
+    <root>/<instrument>/<granularity>/<price>/ and can be memory-mapped with
+    load_arrays(). coverage.json lists the [start, end) ranges that have been
+    downloaded, so weekends and closures are not requested again. New candles
+    after the stored ones are appended in place, only overlapping candles are
+    merged. Reads and writes are serialised per store, so chunks can be
+    fetched from threads.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self.lock = threading.RLock()
+
+    def path(self, instrument, granularity, price):
+        return os.path.join(self.root, instrument, granularity, price)
+
+    # Function to read the downloaded ranges for one series
+    def coverage(self, instrument, granularity, price):
+        path = os.path.join(self.path(instrument, granularity, price), "coverage.json")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [list(r) for r in json.load(f)]
+
+    # Function to list the [start, end) ranges that still need downloading
+    def missing_ranges(self, instrument, granularity, price, start_time, end_time):
+        start = to_epoch_ns(start_time)
+        end = to_epoch_ns(end_time)
+        if end <= start:
+            return []
+        return subtract_ranges(start, end, self.coverage(instrument, granularity, price))
+
+    # Function to load the stored columns, memory-mapped by default
+    def load_arrays(self, instrument, granularity, price, mmap=True):
+        folder = self.path(instrument, granularity, price)
+        arrays = {}
+        with self.lock:
+            for name, dtype in COLUMNS.items():
+                path = os.path.join(folder, name + ".npy")
+                if not os.path.exists(path):
+                    return {n: np.empty(0, dtype=d) for n, d in COLUMNS.items()}
+                arrays[name] = np.load(path, mmap_mode="r" if mmap else None)
+        # A write cut short can leave some columns longer, their extra candles were never stored
+        length = min(len(values) for values in arrays.values())
+        return {name: values[:length] for name, values in arrays.items()}
+
+    # Function to load candles in [start, end) as a DataFrame like fetch_historical_data
+    @timed("store_read")
+    def load(self, instrument, granularity, price, start_time=None, end_time=None):
+        arrays = self.load_arrays(instrument, granularity, price)
+        times = arrays["time"]
+
+        lo = 0 if start_time is None else np.searchsorted(times, to_epoch_ns(start_time), side="left")
+        hi = len(times) if end_time is None else np.searchsorted(times, to_epoch_ns(end_time), side="left")
+
+        df = pd.DataFrame({name: np.array(arrays[name][lo:hi]) for name in COLUMNS})
+        df["time"] = pd.to_datetime(df["time"], unit="ns", utc=True)
+        return df
+
+    # Function to add downloaded candles and mark [start, end) as covered
+    @timed("store_write")
+    def write(self, instrument, granularity, price, df, start_time, end_time):
+        folder = self.path(instrument, granularity, price)
+        os.makedirs(folder, exist_ok=True)
+
+        start = to_epoch_ns(start_time)
+        end = to_epoch_ns(end_time)
+
+        # Never store or cover the candle that is still forming
+        step = GRANULARITY_SECONDS.get(granularity, 0) * 10**9
+        last_closed = time.time_ns() - step
+        end = min(end, last_closed)
+
+        new = {}
+        if df is not None and len(df):
+            new["time"] = pd.DatetimeIndex(pd.to_datetime(df["time"], utc=True)).as_unit("ns").asi8
+            for name, dtype in COLUMNS.items():
+                if name != "time":
+                    new[name] = df[name].to_numpy(dtype=dtype)
+            keep = (new["time"] >= start) & (new["time"] < end)
+            new = {name: values[keep] for name, values in new.items()}
+
+        with self.lock:
+            if new and len(new["time"]):
+                self._merge(folder, new, self.load_arrays(instrument, granularity, price))
+
+            if end > start:
+                ranges = merge_ranges(self.coverage(instrument, granularity, price) + [[start, end]])
+                tmp = os.path.join(folder, "coverage.json.tmp")
+                with open(tmp, "w") as f:
+                    json.dump(ranges, f)
+                os.replace(tmp, os.path.join(folder, "coverage.json"))
+
+    # Function to merge new candles into the stored columns, touching only what they overlap
+    def _merge(self, folder, new, old):
+        """Only stored candles from the first to the last new time are loaded and
+        merged. New candles after everything stored are appended in place; anything
+        else rewrites the column files, copying the untouched parts in slices."""
+        times = old["time"]
+        lo = np.searchsorted(times, new["time"].min(), side="left")
+        hi = np.searchsorted(times, new["time"].max(), side="right")
+        merged = {name: np.concatenate([np.array(old[name][lo:hi]), new[name]]) for name in COLUMNS}
+
+        # Sort by time and keep the newest copy of any duplicate candle
+        order = np.argsort(merged["time"], kind="stable")[::-1]
+        _, first = np.unique(merged["time"][order], return_index=True)
+        order = order[first]
+        merged = {name: merged[name][order].astype(dtype) for name, dtype in COLUMNS.items()}
+
+        paths = {name: os.path.join(folder, name + ".npy") for name in COLUMNS}
+        in_place = len(times) > 0 and hi == len(times) and all(
+            _data_offset(path) == HEADER_SIZE for path in paths.values())
+        if in_place:
+            # Values first, lengths last: until a header grows, readers see the old candles
+            for name, path in paths.items():
+                with open(path, "r+b") as f:
+                    f.seek(HEADER_SIZE + lo * merged[name].itemsize)
+                    f.write(merged[name].tobytes())
+                    f.truncate()
+            for name, path in paths.items():
+                with open(path, "r+b") as f:
+                    f.write(_npy_header(COLUMNS[name], lo + len(merged[name])))
+            return
+
+        length = lo + len(merged["time"]) + len(times) - hi
+        for name, path in paths.items():
+            # Write next to the target and swap in, so readers never see half a file
+            tmp = os.path.join(folder, name + ".tmp.npy")
+            with open(tmp, "wb") as f:
+                f.write(_npy_header(COLUMNS[name], length))
+                _copy_rows(f, old[name], 0, lo)
+                f.write(merged[name].tobytes())
+                _copy_rows(f, old[name], hi, len(times))
+            os.replace(tmp, path)
+
+    # Function to download only the missing parts of [start, end), returns False if any failed
+    def sync(self, instrument, granularity, price, start_time, end_time, download, max_candles=None):
+        """download(from_str, to_str) returns a DataFrame, or None on failure.
+
+        max_candles splits long gaps so no more than that many candles are held
+        in memory before they are written.
+        """
+        span = None
+        if max_candles is not None:
+            span = max_candles * GRANULARITY_SECONDS.get(granularity, 1) * 10**9
+
+        for start, end in self.missing_ranges(instrument, granularity, price, start_time, end_time):
+            while start < end:
+                stop = end if span is None else min(end, start + span)
+                data = download(to_rfc3339(start), to_rfc3339(stop))
+                if data is None:
+                    return False
+                self.write(instrument, granularity, price, data, start, stop)
+                start = stop
+        return True
+
+    # Function to return [start, end) candles, downloading only the missing ranges
+    def get(self, instrument, granularity, price, start_time, end_time, download):
+        """download(from_str, to_str) returns a DataFrame, or None on failure."""
+        if not self.sync(instrument, granularity, price, start_time, end_time, download):
+            return None
+        return self.load(instrument, granularity, price, start_time, end_time)
@@ -1,99 +1,213 @@
-from env import api_details
+# OANDA API credentials, from env.py when it is there (importing this module works without it)
+try:
+   from env import api_details
+except ImportError:
+   api_details = None
 from oandapyV20 import API
 import oandapyV20.endpoints.instruments as instruments
 import numpy as np
+import time
+from planner import MAX_CANDLES, plan_requests
+from candle_parser import parse_candles
+from candle_cache import CandleCache, next_candle_close
+from candle_store import GRANULARITY_SECONDS, to_epoch_ns, to_rfc3339
+from resample import bar_starts, resample_arrays
+
+class CandleSeries():
+   """Candles held as NumPy arrays, newest first so shift 0 is the latest candle."""
+
+   __slots__ = ('time', 'open', 'high', 'low', 'close', 'volume')
+
+   def __init__(self, time, open, high, low, close, volume):
+      self.time = time
+      self.open = open
+      self.high = high
+      self.low = low
+      self.close = close
+      self.volume = volume
+
+   @classmethod
+   def fromCandles(cls, candles, price='M'):
+      # candles is an OANDA candles list, already ordered newest first
+      columns = parse_candles(candles, price, complete_only=False)
+      time = columns['time'].view('datetime64[ns]')
+      return cls(time, columns['open'], columns['high'], columns['low'], columns['close'], columns['volume'])
+
+   def __len__(self):
+      return len(self.close)
+
+   def getHigh(self, shift):
+      return self.high[shift]
+
+   def getLow(self, shift):
+      return self.low[shift]
+
+   def getOpen(self, shift):
+      return self.open[shift]
+
+   def getClose(self, shift):
+      return self.close[shift]
+
+   def getVolume(self, shift):
+      return self.volume[shift]
+
+   def getTime(self, shift):
+      return self.time[shift]
+
+   def isBearish(self, shift):
+      return self.open[shift] > self.close[shift]
+
+   def isBullish(self, shift):
+      return self.close[shift] >= self.open[shift]
+
+   def bearishMask(self):
+      return self.open > self.close
+
+   def bullishMask(self):
+      return self.close >= self.open
 
 class Candles():
 
    instrument = 'XAU_USD'
    candle_list = []
-   api = API(access_token=api_details.oanda_token)
+   api = API(access_token=getattr(api_details, 'oanda_token', None))
    granularity = 'M30'
    useCache = False
-   candle_data = []
+   series = None
+   # Epoch seconds when the loaded series' latest candle closes and it has to be fetched again
+   series_expires = 0.0
+   # Candles fetched on the first accessor call, enough for the usual shifts in one request
+   series_size = 100
+   # Responses shared by all instances, keyed by request and kept until the candle closes
+   cache = CandleCache()
 
    def __init__(self):
       pass
 
    def loadCandleData(self, num_of_candles):
-      self.candle_data = self.getCandleData(num_of_candles)
+      now = time.time()
+      self.series = self.getCandleSeries(num_of_candles)
+      self.series_expires = next_candle_close(self.getGranularity(), now)
+
+   def getSeries(self, shift):
+      # One bulk fetch per instance, the accessors read from it until its latest candle closes
+      # or a deeper shift is asked for
+      if self.series is None or shift >= len(self.series) or time.time() >= self.series_expires:
+         self.loadCandleData(max(shift+1, self.series_size))
+      return self.series
 
    def getHigh(self, shift):
-      if self.getUseCache():
-         return self.candle_data[shift]['mid']['h']
-      return self.getCandleInfo(shift, 'h')
+      return self.getSeries(shift).getHigh(shift)
 
    def getLow(self, shift):
-      if self.getUseCache():
-         return self.candle_data[shift]['mid']['l']
-      return self.getCandleInfo(shift, 'l')
+      return self.getSeries(shift).getLow(shift)
    
    def getOpen(self, shift):
-      if self.getUseCache():
-         return self.candle_data[shift]['mid']['o']
-      return self.getCandleInfo(shift, 'o')
+      return self.getSeries(shift).getOpen(shift)
    
    def getClose(self, shift):
-      if self.getUseCache():
-         return self.candle_data[shift]['mid']['o']
-      return self.getCandleInfo(shift, 'c')
+      return self.getSeries(shift).getClose(shift)
    
    def getVolume(self, shift):
-      if self.getUseCache():
-         return self.candle_data[shift]['volume']
-      return self.getCandleMeta(shift, 'volume')
+      return self.getSeries(shift).getVolume(shift)
 
    def setGranularity(self, granularity):
       self.granularity = granularity
+      self.series = None
    
    def getGranularity(self):
       return self.granularity
    
    def setInstrument(self, instrument):
       self.instrument = instrument
+      self.series = None
 
    def getInstrument(self):
       return self.instrument
    
    def setUseCache(self, useCache):
       self.useCache = useCache
+      # Turning the cache off fetches fresh candles on the next accessor call
+      if not useCache:
+         self.series = None
    
    def getUseCache(self):
       return self.useCache
    
    def isBearish(self, shift):
-      if self.getUseCache():
-         candle = self.candle_data[shift]['mid']
-      else:
-         candle = self.getCandleMeta(shift, 'mid')
-      return candle['o'] > candle['c']
+      return self.getSeries(shift).isBearish(shift)
    
    def isBullish(self, shift):
-      if self.getUseCache():
-         candle = self.candle_data[shift]['mid']
-      else:
-         candle = self.getCandleMeta(shift, 'mid')
-      return candle['c'] >= candle['o']
+      return self.getSeries(shift).isBullish(shift)
+
+   def getCandleSeries(self, num_of_candles):
+      return CandleSeries.fromCandles(self.getCandleData(num_of_candles))
+
+   # Function to build a coarser series (e.g. H4, D) from this granularity's candles, without another request
+   def getResampledSeries(self, granularity, num_of_candles):
+      ratio = GRANULARITY_SECONDS[granularity] // GRANULARITY_SECONDS[self.getGranularity()]
+      candles = self.getCandleData(min((num_of_candles + 1) * ratio, MAX_CANDLES))
 
-   def getCandleInfo(self, shift, type):
-      res = self.getCandleData(shift+1)
-      return res[shift]['mid'][type]
+      # Candles come newest first, bars are built oldest first
+      bars = resample_arrays(parse_candles(np.flip(candles), 'M', complete_only=False), granularity, self.getGranularity())
+      return self._barSeries(bars, num_of_candles)
 
-   def getCandleMeta(self, shift, type):
-      res = self.getCandleData(shift+1)
-      return res[shift][type]
+   # Function to build a coarser series over a time range from this granularity's candles
+   def getResampledSeriesByTime(self, granularity, start_time, end_time):
+      # Base candles from the start of the bar holding start_time, so the first bar is whole
+      first_bar = bar_starts([to_epoch_ns(start_time)], granularity)[0]
+      candles = self.getCandleDataByTime(None, to_rfc3339(first_bar), end_time)
+      bars = resample_arrays(parse_candles(np.flip(candles), 'M', complete_only=False), granularity,
+                             self.getGranularity(), data_start=first_bar)
+      return self._barSeries(bars)
+
+   def _barSeries(self, bars, num_of_candles=None):
+      # A first bar the base candles start partway through is left out, the forming last bar stays in like OANDA's
+      keep = bars['complete'].copy()
+      keep[-1:] = True
+      bars = {name: values[keep] for name, values in bars.items()}
+      if num_of_candles is not None:
+         bars = {name: values[-num_of_candles:] for name, values in bars.items()}
+      bars = {name: np.flip(values) for name, values in bars.items()}
+      time = bars['time'].view('datetime64[ns]')
+      return CandleSeries(time, bars['open'], bars['high'], bars['low'], bars['close'], bars['volume'])
 
    def getCandleData(self, num_of_candles):
+      # Shared responses are only read with useCache on, otherwise OANDA is always asked
+      key = (self.getInstrument(), self.getGranularity(), 'count', num_of_candles)
+      candles = self.cache.get(key) if self.getUseCache() else None
+      if candles is not None:
+         return candles
+
       params = {'granularity' : self.getGranularity(), 'count' : num_of_candles}
       r = instruments.InstrumentsCandles(instrument=self.getInstrument(), params=params)
       self.api.request(r)
       candles = np.flip(r.response['candles'])
+      self.cache.put(key, candles, next_candle_close(self.getGranularity()))
       return candles
       
    def getCandleDataByTime(self, num_of_candles, start_time, end_time):
-      params = {'granularity' : self.getGranularity(), 'from' : start_time, 'to' : end_time, 'price' : 'M'}
-      r = instruments.InstrumentsCandles(instrument=self.getInstrument(), params=params)
-      self.api.request(r)
-      candles = np.flip(r.response['candles'])
+      key = (self.getInstrument(), self.getGranularity(), 'M', start_time, end_time)
+      candles = self.cache.get(key) if self.getUseCache() else None
+      if candles is not None:
+         return candles
+
+      # Split the range so no request goes over OANDA's candle limit
+      candles = []
+      for from_time, to_time in plan_requests(self.getInstrument(), self.getGranularity(), start_time, end_time):
+         params = {'granularity' : self.getGranularity(), 'from' : from_time, 'to' : to_time, 'price' : 'M'}
+         r = instruments.InstrumentsCandles(instrument=self.getInstrument(), params=params)
+         self.api.request(r)
+         candles.extend(r.response['candles'])
+      candles = np.flip(candles)
+
+      # Ranges that end before the current candle opened never change
+      next_close = next_candle_close(self.getGranularity())
+      if to_epoch_ns(end_time) / 1e9 <= next_close - GRANULARITY_SECONDS[self.getGranularity()]:
+         self.cache.put(key, candles)
+      else:
+         self.cache.put(key, candles, next_close)
       return candles
 
+   def getCacheStats(self):
+      return self.cache.stats()
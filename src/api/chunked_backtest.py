@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+from breakouts import BREAKOUT_NAMES, TRAINING_COLUMNS, build_training_table
+from candle_store import COLUMNS, to_epoch_ns
+from sessions import BACKTEST_WINDOW, utc_window_mask
+
+# Candles backtested per chunk; at 1M a chunk's working arrays take a few hundred MB
+CHUNK_CANDLES = 1_000_000
+
+# Compact dtypes of the training table columns, time stays datetime64[ns, UTC]
+COMPACT_DTYPES = {
+    "size": np.float32,
+    "volume": np.int32,
+    "Candle1Size": np.float32,
+    "Candle2Size": np.float32,
+    "Candle3Size": np.float32,
+    "Candle4Size": np.float32,
+    "support_level": np.float32,
+    "resistance_level": np.float32,
+}
+
+BREAKOUT_TYPES = pd.CategoricalDtype(list(BREAKOUT_NAMES.values()))
+
+
+# Function to shrink a training table to float32/int32 columns and a categorical breakout type
+def compact_training_table(table):
+    table = table.astype(COMPACT_DTYPES)
+    table["breakout_type"] = table["breakout_type"].astype(BREAKOUT_TYPES)
+    return table
+
+
+# Function to backtest store arrays chunk by chunk, yielding one compact table per chunk
+def iter_training_tables(arrays, start_time=None, end_time=None, chunk_size=CHUNK_CANDLES, num_candles=100,
+                         tolerance=2.0, session_window=BACKTEST_WINDOW, confirmation="same_direction"):
+    """arrays are (memory-mapped) store columns, see CandleStore.load_arrays().
+
+    Each chunk is read with num_candles + 1 candles of context before it, which
+    rebuilds the S/R state the chunk starts with, and one candle after it for
+    the confirmation rule. Together the chunks give exactly the rows
+    build_training_table gives for the whole range, but only one chunk is
+    ever in memory.
+    """
+    times = arrays["time"]
+    lo = 0 if start_time is None else int(np.searchsorted(times, to_epoch_ns(start_time), side="left"))
+    hi = len(times) if end_time is None else int(np.searchsorted(times, to_epoch_ns(end_time), side="left"))
+    context = num_candles + 1
+
+    for start in range(lo, hi, chunk_size):
+        stop = min(start + chunk_size, hi)
+        first = max(start - context, lo)
+        last = min(stop + 1, hi)
+
+        df = pd.DataFrame({name: np.array(arrays[name][first:last]) for name in COLUMNS})
+        df["time"] = pd.to_datetime(df["time"], unit="ns", utc=True)
+
+        # Context rows only warm the levels up, their breakouts belong to the chunk before
+        mask = utc_window_mask(df["time"], *session_window)
+        mask[:start - first] = False
+
+        # The candle after the chunk is last in df, so it is never selected itself
+        table = build_training_table(df, num_candles, tolerance, mask, confirmation)
+        yield compact_training_table(table)
+
+
+# Function to backtest a whole stored series with bounded memory
+def backtest_store(store, instrument, granularity, price="M", start_time=None, end_time=None, sink=None,
+                   chunk_size=CHUNK_CANDLES, **kwargs):
+    """Writes every chunk's breakouts to sink (a BreakoutSink) and returns how many
+    there were, or returns them all as one compact table when there is no sink."""
+    arrays = store.load_arrays(instrument, granularity, price)
+
+    tables = []
+    count = 0
+    for table in iter_training_tables(arrays, start_time, end_time, chunk_size, **kwargs):
+        count += len(table)
+        if sink is not None:
+            sink.add_frame(table)
+        else:
+            tables.append(table)
+
+    if sink is not None:
+        return count
+    if not tables:
+        return compact_training_table(pd.DataFrame({name: [] for name in TRAINING_COLUMNS}))
+    return pd.concat(tables, ignore_index=True)
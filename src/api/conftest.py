@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The modules import each other flat (from breakouts import ...), like the scripts run from this folder
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
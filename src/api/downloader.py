@@ -0,0 +1,86 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from oandapyV20.endpoints.instruments import InstrumentsCandles
+from oandapyV20.exceptions import V20Error
+from requests.adapters import HTTPAdapter
+
+from candle_parser import candles_to_frame
+from planner import MAX_CANDLES, plan_requests
+from profiling import add_count, stage
+
+# Default number of chunk requests in flight at once
+MAX_WORKERS = 8
+
+
+# Function to let an oandapyV20 client keep enough connections open for the pool
+def pool_connections(api, max_workers=MAX_WORKERS):
+    adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+    api.client.mount("https://", adapter)
+    api.client.mount("http://", adapter)
+    return api
+
+
+# Function to fetch one from/to range of candles from OANDA as a DataFrame
+def fetch_candles(api, instrument, start_time, end_time, granularity="M30", price="M", count=None):
+    """Leave start_time or end_time as None to fetch count candles up to now or from start_time."""
+    params = {"granularity": granularity, "price": price}
+    if start_time is not None:
+        params["from"] = str(start_time)
+    if end_time is not None:
+        params["to"] = str(end_time)
+    if count is not None:
+        params["count"] = count
+
+    try:
+        request = InstrumentsCandles(instrument=instrument, params=params)
+        with stage("fetch", instrument=instrument, granularity=granularity):
+            response = api.request(request)
+        with stage("parse"):
+            df = candles_to_frame(response.get("candles", []), price)
+        add_count("requests")
+        add_count("candles_fetched", len(df))
+        return df
+
+    except V20Error as e:
+        print(f"An error occurred while fetching data: {e}")
+        return None
+
+
+# Function to download many [from, to) chunks in parallel and join them once
+def download_chunks(download, chunks, max_workers=MAX_WORKERS, skip_failed=True):
+    """download(from_time, to_time) returns a DataFrame with a time column, or None.
+
+    Chunks are fetched on a bounded thread pool, joined in time order with a
+    single concat and candles repeated on chunk boundaries are dropped. With
+    skip_failed=False a single failed chunk makes the whole result None.
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+
+    if max_workers <= 1:
+        frames = [download(start, end) for start, end in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            frames = list(pool.map(lambda chunk: download(*chunk), chunks))
+
+    if not skip_failed and any(frame is None for frame in frames):
+        return None
+
+    frames = [frame for frame in frames if isinstance(frame, pd.DataFrame) and not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+
+    with stage("concat", chunks=len(frames)):
+        all_df = pd.concat(frames, ignore_index=True)
+        all_df = all_df.sort_values("time", kind="stable")
+        all_df = all_df.drop_duplicates(subset="time", keep="last")
+        return all_df.reset_index(drop=True)
+
+
+# Function to download any date range, split into requests OANDA will accept
+def download_range(download, instrument, granularity, start_time, end_time,
+                   max_workers=1, max_candles=MAX_CANDLES):
+    chunks = plan_requests(instrument, granularity, start_time, end_time, max_candles)
+    return download_chunks(download, chunks, max_workers=max_workers, skip_failed=False)
@@ -3,9 +3,7 @@
 import candles as CC
 from datetime import datetime, timedelta
 
-candles = []
 cc = CC.Candles()
-num_of_candles = 2
 
 # Define the time range (e.g., last 7 days)
 end_time = datetime.now() - timedelta(hours=1)
@@ -18,22 +16,15 @@ to_time = end_time.isoformat("T") + "Z"
 print("Start Time: ",start_time)
 print("End Time: ", end_time)
 
-# Set granularity of candle data to get back, e.g. 30M, 4H, 1D
-cc.setGranularity("D")
+# Daily candles are built from the M30 candles (the base granularity) instead of a separate request,
+# use cc.setGranularity("D") and cc.getCandleDataByTime(...) to fetch OANDA's own daily candles
+series = cc.getResampledSeriesByTime("D", from_time, to_time)
 
-# Get candle data by time, set start and to
-candles = cc.getCandleDataByTime(num_of_candles,from_time,to_time)
+# Iterate over the daily candles, oldest first, and print each one
+for shift in reversed(range(len(series))):
 
-# Get candle data based on number of candles received
-# candles = cc.getCandleData(num_of_candles)
-
-# Iterate over candle data and print each one
-for candle in candles:
-
-   # Print the 'mid' for each candle object.
-   print(candle['time']," - OHLC:", candle['mid'])
-   # print(candle)
-
-# Print previous 4H candle
-# print("\nPrevious 4H Candle:", candles[1]['mid'])
+   # Print the OHLC for each candle
+   print(series.getTime(shift), " - OHLC:", series.getOpen(shift), series.getHigh(shift), series.getLow(shift), series.getClose(shift))
 
+# Print previous daily candle
+# print("\nPrevious D Candle:", series.getClose(1))
@@ -1,24 +1,71 @@
-from env import api_details
 from oandapyV20 import API
-from oandapyV20.exceptions import V20Error
-from oandapyV20.endpoints.instruments import InstrumentsCandles
-import pandas as pd
-import time
 import datetime
-import os
-
-# OANDA API credentials
-ACCOUNT_ID = api_details.account_id
-ACCESS_TOKEN = api_details.oanda_token
+import threading
+from support_resistance import SupportResistanceEngine
+from candle_store import GRANULARITY_SECONDS, CandleStore, to_epoch_ns, to_rfc3339
+from breakout_sink import BreakoutSink
+from downloader import MAX_WORKERS, download_chunks, download_range, fetch_candles, pool_connections
+from planner import plan_requests
+from breakouts import build_training_table
+from sessions import BACKTEST_WINDOW, utc_window_mask
+from live import LiveBreakoutEngine
+from scheduler import BACKFILL, LIVE, RequestScheduler
+from resample import bar_starts, resample_candles
+from chunked_backtest import CHUNK_CANDLES, backtest_store
+from model_registry import REGISTRY_DIR
+from inference import SizePredictor
+from profiling import add_count, stage
+
+# OANDA API credentials, from env.py when it is there (importing this module works without it)
+try:
+    from env import api_details
+except ImportError:
+    api_details = None
+
+ACCOUNT_ID = getattr(api_details, "account_id", None)
+ACCESS_TOKEN = getattr(api_details, "oanda_token", None)
 INSTRUMENT = "XAU_USD"
 
-# Initialize the OANDA API client
-api = API(access_token=ACCESS_TOKEN)
+# Finest granularity downloaded, coarser ones are resampled from it
+BASE_GRANULARITY = "M30"
+
+# The scheduler and the sink start threads, so they are created on first use, not on import
+SCHEDULER = None
+BREAKOUT_SINK = None
+_CREATE_LOCK = threading.Lock()
 
 # File to store breakout data
 # BREAKOUT_CSV = "breakout_data.csv"
 BREAKOUT_CSV = "data.csv"
 
+# Local store of downloaded candles, so past ranges are only fetched once
+CANDLE_STORE = CandleStore()
+
+# Function to get the scheduler for the OANDA API client, with a connection pool for parallel downloads
+# Every request goes through the scheduler: rate limited, retried, live polls first
+def get_scheduler():
+    global SCHEDULER
+    with _CREATE_LOCK:
+        if SCHEDULER is None:
+            SCHEDULER = RequestScheduler(pool_connections(API(access_token=ACCESS_TOKEN), MAX_WORKERS))
+        return SCHEDULER
+
+# Function to stop the scheduler's workers, the next get_scheduler() creates a new one
+def close_scheduler():
+    global SCHEDULER
+    with _CREATE_LOCK:
+        scheduler, SCHEDULER = SCHEDULER, None
+    if scheduler is not None:
+        scheduler.close(cancel_pending=True)
+
+# Function to get the sink breakouts are buffered in, written to BREAKOUT_CSV in batches
+def get_breakout_sink():
+    global BREAKOUT_SINK
+    with _CREATE_LOCK:
+        if BREAKOUT_SINK is None:
+            BREAKOUT_SINK = BreakoutSink(BREAKOUT_CSV)
+        return BREAKOUT_SINK
+
 # Function to check if bullish candle
 def is_bullish(candle):
     return candle["open"] > candle["close"]
@@ -30,134 +77,57 @@ def is_bearish(candle):
 # Function to check if candle is in london session
 def is_in_london_session(candle):
     """Checks if a candle's time (UTC) falls within the London session (10 AM - 4 PM UTC)."""
-
-    candle_time = candle["time"]
-
-    # Handle string times (if needed):
-    if isinstance(candle_time, str):
-        candle_time = datetime.datetime.fromisoformat(candle_time.replace('Z', '+00:00')) # Handles 'Z' for UTC
-    
-    # Ensure the datetime object is timezone-aware. If it's naive, assume UTC.
-    if candle_time.tzinfo is None:
-      candle_time = candle_time.replace(tzinfo=datetime.timezone.utc)
-
-    start_time = datetime.time(10, 0, 0, tzinfo=datetime.timezone.utc)  # 10:00 AM UTC (timezone-aware)
-    end_time = datetime.time(16, 0, 0, tzinfo=datetime.timezone.utc)    # 4:00 PM UTC (timezone-aware)
-
-    start_datetime = datetime.datetime.combine(candle_time.date(), start_time)
-    end_datetime = datetime.datetime.combine(candle_time.date(), end_time)
-
-    return start_datetime <= candle_time <= end_datetime
+    # Single-candle form of sessions.utc_window_mask, use the mask for whole frames
+    return bool(utc_window_mask([candle["time"]])[0])
 
 
 # Function to fetch candlestick data
 def fetch_candlestick_data(start_time, end_time):
-    params = {
-        "granularity": "M30",  # 30-minute candles
-        "from": start_time,    # Start time
-        "to": end_time,        # End time
-        "price": "M",          # Midpoint candles (optional: "B" for bid, "A" for ask)
-    }
+    # Midpoint 30-minute candles, without the candle that is still forming
+    return download_historical_data(start_time, end_time, "M30")
 
-    try:
-        # Create the request
-        request = InstrumentsCandles(instrument=INSTRUMENT, params=params)
-
-        # Make the API call
-        response = api.request(request)
-
-        # Parse the response into a DataFrame
-        candles = response.get("candles", [])
-        data = []
-
-        for candle in candles:
-            data.append({
-                "time": candle["time"],
-                "open": float(candle["mid"]["o"]),
-                "high": float(candle["mid"]["h"]),
-                "low": float(candle["mid"]["l"]),
-                "close": float(candle["mid"]["c"]),
-                "volume": int(candle["volume"]),
-            })
-
-        df = pd.DataFrame(data)
-        df["time"] = pd.to_datetime(df["time"])
-        return df
-
-    except V20Error as e:
-        print(f"An error occurred while fetching data: {e}")
-        return None
-
-# Function to fetch historical candlestick data
+# Function to fetch historical candlestick data, reading the local store first
 def fetch_historical_data(start_time, end_time, granularity="M30"):
-    params = {
-        "granularity": granularity,  # 30-minute candles
-        "from": start_time,          # Start time
-        "to": end_time,              # End time
-        "price": "M",                # Midpoint candles (optional: "B" for bid, "A" for ask)
-    }
+    def download(from_time, to_time):
+        return download_range(
+            lambda a, b: download_historical_data(a, b, granularity),
+            INSTRUMENT, granularity, from_time, to_time,
+        )
 
-    try:
-        # Create the request
-        request = InstrumentsCandles(instrument=INSTRUMENT, params=params)
-
-        # Make the API call
-        response = api.request(request)
-
-        # Parse the response into a DataFrame
-        candles = response.get("candles", [])
-        data = []
-
-        for candle in candles:
-            data.append({
-                "time": candle["time"],
-                "open": float(candle["mid"]["o"]),
-                "high": float(candle["mid"]["h"]),
-                "low": float(candle["mid"]["l"]),
-                "close": float(candle["mid"]["c"]),
-                "volume": int(candle["volume"]),
-            })
-
-        df = pd.DataFrame(data)
-        df["time"] = pd.to_datetime(df["time"])
-        return df
+    return CANDLE_STORE.get(INSTRUMENT, granularity, "M", start_time, end_time, download)
 
-    except V20Error as e:
-        print(f"An error occurred while fetching data: {e}")
-        return None
+# Function to download historical candlestick data from OANDA
+def download_historical_data(start_time, end_time, granularity="M30"):
+    return fetch_candles(get_scheduler().client(BACKFILL), INSTRUMENT, start_time, end_time, granularity, price="M")
 
 
 # Function to get multiple api requests
-def fetch_multiple_data(start_date_str, end_date_str):  # Accept date strings
-    # Start with empty DataFrame
-    all_df = pd.DataFrame()
+def fetch_multiple_data(start_date_str, end_date_str, granularity="M30"):  # Accept date strings
+    # Coarser candles are built from the M30 ones (already in the store) instead of fetched again
+    if GRANULARITY_SECONDS[granularity] > GRANULARITY_SECONDS[BASE_GRANULARITY]:
+        # Fetched back to the start of the bar holding start_date, so the first bar is whole
+        first_bar = bar_starts([to_epoch_ns(start_date_str)], granularity)[0]
+        base_start_str = to_rfc3339(first_bar)[:10]
+        base = fetch_multiple_data(base_start_str, end_date_str, BASE_GRANULARITY)
+        if base is None or base.empty:
+            return base
+        with stage("resample", granularity=granularity):
+            bars = resample_candles(base, granularity, BASE_GRANULARITY, data_start=base_start_str)
+        return bars[bars["time"] >= to_rfc3339(first_bar)].reset_index(drop=True)
 
     # Convert date strings to datetime.date objects
     start_date = datetime.datetime.strptime(start_date_str, "%Y-%m-%d").date() # Example format, adjust if needed
     end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%d").date()   # Example format, adjust if needed
 
-    current_date = start_date
-
-    while current_date < end_date:
-        # Request data for 90 days at a time
-        period_end = current_date + datetime.timedelta(days=90)
-        
-        if period_end > end_date:
-            period_end = end_date
-
-        data = fetch_historical_data(current_date, period_end)
-
-        # print("Type: ", type(data))
-
-        if isinstance(data, pd.DataFrame): # Check if data is a DataFrame before concatenation
-            all_df = pd.concat([all_df, data], ignore_index=True) # Concatenate DataFrames
-        elif data is not None: # Handle other data types or None as needed
-            print("Data is not a DataFrame, skipping concatenation.")
-            print(data) # Print or log the non-DataFrame data for debugging
-
-        current_date = period_end
+    # Split the range into the fewest requests under OANDA's candle limit
+    with stage("plan"):
+        chunks = plan_requests(INSTRUMENT, granularity, start_date, end_date)
 
-    return all_df
+    # Fetch the chunks in parallel, then join them once in time order
+    return download_chunks(
+        lambda from_time, to_time: fetch_historical_data(from_time, to_time, granularity),
+        chunks, max_workers=MAX_WORKERS,
+    )
 
 # Function to detect support and resistance levels
 def detect_support_resistance(df, num_candles=100):
@@ -223,54 +193,46 @@ def log_breakout_to_csv(candle, candle1, candle2, candle3, candle4, breakout_typ
         "resistance_level": resistance,
     }
 
-    # Convert the dictionary to a DataFrame
-    df = pd.DataFrame([breakout_data])
+    # Buffer the record, the sink appends it to the CSV file with the next batch
+    get_breakout_sink().add(breakout_data)
 
-    # Append the data to the CSV file
-    if not os.path.exists(BREAKOUT_CSV):
-        # Create the file if it doesn't exist
-        df.to_csv(BREAKOUT_CSV, index=False)
-    else:
-        # Append to the existing file
-        df.to_csv(BREAKOUT_CSV, mode="a", header=False, index=False)
+# Function to report a breakout as soon as its candle completes
+def report_breakout(candle, breakout_type, support, resistance):
+    print(f"Breakout detected: {breakout_type}")
 
-    print(f"Breakout logged to {BREAKOUT_CSV}")
+# Function to log a breakout once the next candle has confirmed it
+def log_confirmed_breakout(*breakout):
+    log_breakout_to_csv(*breakout)
+    get_breakout_sink().flush()
 
 # Function to run the detection continuously
 def run_continuously():
     print("Starting continuous support/resistance detection...")
 
-    while True:
-        # Get the current time and calculate the start time for the last 100 candles
-        now = datetime.now()
-        start_time = (now - timedelta(minutes=30 * 100)).strftime("%Y-%m-%dT%H:%M:%SZ")
-        end_time = now.strftime("%Y-%m-%dT%H:%M:%SZ")
-
-        # Fetch the latest candlestick data
-        df = fetch_candlestick_data(start_time, end_time)
-        if df is None:
-            print("Failed to fetch data. Retrying in 1 minute...")
-            time.sleep(60)  # Wait 1 minute before retrying
-            continue
-
-        # Detect support and resistance levels
-        support, resistance = detect_support_resistance(df)
-        print(f"Current Support Level: {support}")
-        print(f"Current Resistance Level: {resistance}")
-
-        # Check the latest candle for breakouts
-        latest_candle = df.iloc[-1]
-        breakout = check_breakout(latest_candle, support, resistance)
-        if breakout:
-            print(f"Breakout detected: {breakout}")
-            # Log the breakout to the CSV file
-            log_breakout_to_csv(latest_candle, breakout, support, resistance)
-
-        # Wait until the next 30-minute candle starts
-        next_candle_time = (now + timedelta(minutes=30)).replace(second=0, microsecond=0)
-        sleep_duration = (next_candle_time - now).total_seconds()
-        print(f"Waiting for the next 30-minute candle at {next_candle_time}...")
-        time.sleep(sleep_duration)
+    # Model saved by train_model.py, loaded once so each prediction takes about a millisecond
+    predictor = SizePredictor.from_registry("size", REGISTRY_DIR)
+    if predictor is None:
+        print("No trained model found, breakouts are logged without a predicted size.")
+
+    # Predict first, the size is needed for TP/SL before anything is written
+    def on_confirmed(*breakout):
+        if predictor is not None:
+            with stage("predict"):
+                size = predictor.predict_breakout(*breakout)
+            latency = predictor.latency()
+            print(f"Predicted size: {size:.2f} (p50 {latency['p50_ms']:.2f} ms, p99 {latency['p99_ms']:.2f} ms)")
+        log_confirmed_breakout(*breakout)
+
+    # Polls only for new candles right after each one completes and updates the levels in place
+    live = LiveBreakoutEngine(
+        get_scheduler().client(LIVE), INSTRUMENT, "M30", num_candles=100, tolerance=2.0,
+        session=BACKTEST_WINDOW, confirmation="same_direction",
+        on_breakout=report_breakout, on_confirmed=on_confirmed,
+    )
+    try:
+        live.run()
+    finally:
+        close_scheduler()
 
 # Function to backtest over a specific period
 def backtest(start_time, end_time):
@@ -280,7 +242,7 @@ def backtest(start_time, end_time):
     # df = fetch_historical_data(start_time, end_time)
     df = fetch_multiple_data(start_time, end_time)
 
-    if df is None:
+    if df is None or df.empty:
         print("Failed to fetch historical data. Exiting...")
         return
 
@@ -288,20 +250,36 @@ def backtest(start_time, end_time):
     support = None
     resistance = None
 
+    # Streaming S/R engine, only ever fed the candles before the current one
+    engine = SupportResistanceEngine(num_candles=100, tolerance=2.0)
+    opens = df["open"].to_numpy()
+    closes = df["close"].to_numpy()
+
+    # London session (10 AM - 4 PM UTC) flags for every candle at once
+    with stage("session_filter"):
+        in_session = utc_window_mask(df["time"])
+
     # Iterate through the historical data one candle at a time
     for i in range(len(df)):
-        candle = df.iloc[i]
+        with stage("row_access"):
+            candle = df.iloc[i]
+        if i > 0:
+            with stage("sr_detection"):
+                engine.update(opens[i - 1], closes[i - 1])
 
         # Check if candle is in London session only
-        if is_in_london_session(candle):
+        if in_session[i]:
 
             # Update support and resistance levels using the last 100 candles
             if i >= 100:
-                support, resistance = detect_support_resistance(df.iloc[:i], num_candles=100)
+                with stage("sr_detection"):
+                    support, resistance = engine.levels()
 
             # Check for breakouts
-            breakout = check_breakout(candle, support, resistance)
+            with stage("breakout_check"):
+                breakout = check_breakout(candle, support, resistance)
             if breakout:
+                add_count("breakouts")
                 # print(f"Breakout detected: {breakout}")
 
                 if i + 1 < len(df):
@@ -320,17 +298,63 @@ def backtest(start_time, end_time):
 
                         i += 1
 
+    get_breakout_sink().flush()
+    print("Backtest complete.")
+
+# Function to backtest over a specific period with whole-array operations
+def backtest_batch(start_time, end_time):
+    print(f"Starting batch backtest from {start_time} to {end_time}...")
+
+    df = fetch_multiple_data(start_time, end_time)
+
+    if df is None or df.empty:
+        print("Failed to fetch historical data. Exiting...")
+        return
+
+    # Same rows and columns backtest() logs, built in one go
+    table = build_training_table(df, num_candles=100, tolerance=2.0)
+
+    get_breakout_sink().add_frame(table)
+
+    print(f"{len(table)} breakouts logged to {BREAKOUT_CSV}")
+    print("Backtest complete.")
+
+# Function to backtest a long period (years of M1) straight from the candle store, a chunk at a time
+def backtest_streaming(start_time, end_time, granularity="M30", chunk_size=CHUNK_CANDLES):
+    print(f"Starting streaming backtest from {start_time} to {end_time}...")
+
+    def download(from_time, to_time):
+        return download_range(
+            lambda a, b: download_historical_data(a, b, granularity),
+            INSTRUMENT, granularity, from_time, to_time, max_workers=MAX_WORKERS,
+        )
+
+    # Missing candles go to the store chunk by chunk, nothing is kept in memory
+    if not CANDLE_STORE.sync(INSTRUMENT, granularity, "M", start_time, end_time, download, max_candles=chunk_size):
+        print("Failed to fetch historical data. Exiting...")
+        return
+
+    count = backtest_store(CANDLE_STORE, INSTRUMENT, granularity, "M", start_time, end_time,
+                           sink=get_breakout_sink(), chunk_size=chunk_size)
+
+    get_breakout_sink().flush()
+    print(f"{count} breakouts logged to {BREAKOUT_CSV}")
     print("Backtest complete.")
 
 
 
 
-# Run the continuous detection
-# run_continuously()
+# Only run when started as a script, so benchmarks and other modules can import the functions
+# Run with FX_PROFILE=1 to get the time spent in every stage and a JSON trace (profiling.py)
+if __name__ == "__main__":
+    # Run the continuous detection
+    # run_continuously()
 
 
-start_date_str = "2024-01-01"
-end_date_str = "2024-12-31"
+    start_date_str = "2024-01-01"
+    end_date_str = "2024-12-31"
 
-# Run the backtest
-backtest(start_date_str, end_date_str)
+    # Run the backtest
+    # backtest(start_date_str, end_date_str)
+    # backtest_streaming(start_date_str, end_date_str, "M1")
+    backtest_batch(start_date_str, end_date_str)
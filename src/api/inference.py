@@ -0,0 +1,202 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from model_registry import REGISTRY_DIR, ModelRegistry
+from training import FEATURE_COLUMNS
+
+# Micro-batching defaults: most breakouts scored together, and how long the first one waits for company
+MAX_BATCH = 64
+MAX_WAIT = 0.002
+
+# Latencies kept for the p50/p99 report, oldest dropped first
+LATENCY_WINDOW = 10_000
+
+
+# Function to turn a breakout (the arguments log_breakout_to_csv takes) into a feature vector
+def breakout_features(candle, candle1, candle2, candle3, candle4, breakout_type, support, resistance,
+                      columns=FEATURE_COLUMNS):
+    """Returns float64 values in the order of columns, no DataFrame involved.
+    A missing level (None) becomes NaN, like it does in the training CSV."""
+    values = {
+        "volume": candle["volume"],
+        "Candle1Size": abs(candle1["close"] - candle1["open"]),
+        "Candle2Size": abs(candle2["close"] - candle2["open"]),
+        "Candle3Size": abs(candle3["close"] - candle3["open"]),
+        "Candle4Size": abs(candle4["close"] - candle4["open"]),
+        "support_level": np.nan if support is None else support,
+        "resistance_level": np.nan if resistance is None else resistance,
+        "breakout_type_support": 1.0 if breakout_type == "support" else 0.0,
+    }
+    return np.array([values[name] for name in columns], dtype=np.float64)
+
+
+class FlatForest():
+    """The trees of a fitted sklearn forest packed into flat arrays and scored with NumPy.
+
+    All trees are walked together one level per step, so a single row costs
+    a few dozen small array operations instead of a predict() call with input
+    validation and a thread pool. NaN inputs follow each split's missing
+    value direction. Leaves point at themselves, which lets every tree take
+    the same number of steps. Gives the same predictions as
+    the forest's predict().
+    """
+
+    def __init__(self, model):
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        sizes = np.array([tree.node_count for tree in trees])
+        offsets = np.r_[0, np.cumsum(sizes)[:-1]]
+
+        left = np.concatenate([tree.children_left for tree in trees]).astype(np.int64)
+        right = np.concatenate([tree.children_right for tree in trees]).astype(np.int64)
+        leaf = left == -1
+        nodes = np.arange(len(left))
+        node_offsets = np.repeat(offsets, sizes)
+
+        self.left = np.where(leaf, nodes, left + node_offsets)
+        self.right = np.where(leaf, nodes, right + node_offsets)
+        self.feature = np.where(leaf, 0, np.concatenate([tree.feature for tree in trees])).astype(np.int64)
+        self.threshold = np.where(leaf, np.inf, np.concatenate([tree.threshold for tree in trees]))
+        # Where a NaN input (a level not found yet) goes at each split
+        self.missing_left = np.concatenate([tree.missing_go_to_left for tree in trees]).astype(bool)
+        self.value = np.concatenate([tree.value[:, 0, 0] for tree in trees])
+        self.roots = offsets.astype(np.int64)
+        self.depth = max(tree.max_depth for tree in trees)
+
+    # Function to score a (rows, features) matrix, or one row
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        single = X.ndim == 1
+        X = np.atleast_2d(X).astype(np.float32)  # sklearn trees compare float32 inputs
+        rows = np.arange(len(X))[:, None]
+
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        for _ in range(self.depth):
+            values = X[rows, self.feature[node]]
+            go_left = np.where(np.isnan(values), self.missing_left[node], values <= self.threshold[node])
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        predicted = self.value[node].mean(axis=1)
+        return predicted[0] if single else predicted
+
+
+class LatencyRecorder():
+    """Keeps the last LATENCY_WINDOW latencies (seconds) and reports them in milliseconds."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.values = np.zeros(window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.values[self.count % len(self.values)] = seconds
+            self.count += 1
+
+    def stats(self):
+        with self.lock:
+            values = self.values[:min(self.count, len(self.values))].copy()
+        if not len(values):
+            return {"count": 0, "p50_ms": np.nan, "p99_ms": np.nan, "max_ms": np.nan}
+        return {
+            "count": self.count,
+            "p50_ms": float(np.percentile(values, 50)) * 1000,
+            "p99_ms": float(np.percentile(values, 99)) * 1000,
+            "max_ms": float(values.max()) * 1000,
+        }
+
+
+class SizePredictor():
+    """Predicts the size of a breakout with a model loaded once up front.
+
+    predict_breakout() takes the arguments of log_breakout_to_csv (the
+    LiveBreakoutEngine on_confirmed callback) and returns the predicted size;
+    latency() gives p50/p99 of those calls.
+    """
+
+    def __init__(self, model, columns=FEATURE_COLUMNS):
+        self.columns = list(columns)
+        self.forest = FlatForest(model)
+        self.latencies = LatencyRecorder()
+
+    # Function to load the latest (or a given) version of a model from the registry
+    @classmethod
+    def from_registry(cls, name="size", root=REGISTRY_DIR, version=None):
+        model, meta = ModelRegistry(root).load(name, version, mmap=False)
+        if model is None:
+            return None
+        return cls(model, meta["columns"])
+
+    # Function to score a (rows, features) matrix in one go
+    def predict(self, X):
+        return self.forest.predict(X)
+
+    # Function to predict the size of one breakout
+    def predict_breakout(self, *breakout):
+        started = time.perf_counter()
+        predicted = float(self.forest.predict(breakout_features(*breakout, columns=self.columns)))
+        self.latencies.add(time.perf_counter() - started)
+        return predicted
+
+    def latency(self):
+        return self.latencies.stats()
+
+
+class MicroBatcher():
+    """Scores breakouts from many instruments in small batches on one thread.
+
+    submit() queues a breakout and returns a Future of its predicted size.
+    The worker takes the first waiting breakout, waits up to max_wait for
+    more (never beyond max_batch) and scores them all with one predict().
+    latency() reports the time from submit() to the result being set.
+    """
+
+    def __init__(self, predictor, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.latencies = LatencyRecorder()
+        self.batches = 0
+
+        self.worker = threading.Thread(target=self._work, daemon=True, name="size-batcher")
+        self.worker.start()
+
+    # Function to queue one breakout, returns a Future of its predicted size
+    def submit(self, *breakout):
+        future = Future()
+        features = breakout_features(*breakout, columns=self.predictor.columns)
+        self.queue.put((time.perf_counter(), features, future))
+        return future
+
+    def _work(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                predicted = self.predictor.predict(np.stack([features for _, features, _ in batch]))
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            done = time.perf_counter()
+            for (queued, _, future), value in zip(batch, predicted):
+                future.set_result(float(value))
+                self.latencies.add(done - queued)
+
+    def latency(self):
+        stats = self.latencies.stats()
+        stats["batches"] = self.batches
+        return stats
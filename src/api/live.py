@@ -0,0 +1,185 @@
+import time
+from collections import deque
+
+import numpy as np
+
+from breakouts import BREAKOUT_NAMES, CONFIRMATION_RULES, NO_BREAKOUT, check_breakouts
+from candle_store import to_epoch_ns, to_rfc3339
+from downloader import fetch_candles
+from planner import candle_ns
+from profiling import add_count, stage
+from sessions import BACKTEST_WINDOW, utc_window_mask
+from support_resistance import SupportResistanceEngine
+
+# Seconds to wait after a candle closes before asking for it, OANDA needs a moment to complete it
+SETTLE_SECONDS = 1.0
+
+# First wait when a poll finds no new candle, doubled on every empty poll up to one candle
+RETRY_SECONDS = 5.0
+
+
+class LiveBreakoutEngine():
+    """Watches one instrument and reports breakouts as soon as candles complete.
+
+    bootstrap() loads the last num_candles complete candles once; after that
+    poll() only asks OANDA for candles newer than the last one seen and feeds
+    them to a streaming SupportResistanceEngine. The rules are the backtest's:
+    a candle inside session (a UTC hour window, None for all day) that breaks
+    the levels of the candles before it is a breakout. on_breakout(candle,
+    breakout_type, support, resistance) fires when that candle completes.
+    on_confirmed(next_candle, candle1, candle2, candle3, candle4, breakout_type,
+    support, resistance) fires once the next candle has passed the
+    confirmation rule, with the arguments log_breakout_to_csv takes.
+
+    clock and sleep default to the real time.time and time.sleep; pass a
+    ReplayClock's to replay history from a MockOandaServer.
+    """
+
+    def __init__(self, api, instrument, granularity="M30", num_candles=100, tolerance=2.0,
+                 session=BACKTEST_WINDOW, confirmation="same_direction", on_breakout=None,
+                 on_confirmed=None, clock=time.time, sleep=time.sleep, settle=SETTLE_SECONDS):
+        if confirmation not in CONFIRMATION_RULES:
+            raise ValueError(f"Unknown confirmation rule: {confirmation}")
+
+        self.api = api
+        self.instrument = instrument
+        self.granularity = granularity
+        self.num_candles = num_candles
+        self.session = session
+        self.confirmation = confirmation
+        self.on_breakout = on_breakout
+        self.on_confirmed = on_confirmed
+        self.clock = clock
+        self.sleep = sleep
+        self.settle = settle
+        self.step = candle_ns(granularity)
+
+        self.engine = SupportResistanceEngine(num_candles=num_candles, tolerance=tolerance)
+        self.recent = deque(maxlen=4)
+        self.pending = None
+        self.seen = 0
+        self.last_time = None
+
+    # Function to load the candles the levels need, without reporting old breakouts
+    def bootstrap(self):
+        df = self.fetch_new()
+        if df is None:
+            return False
+        self.process(df, report=False)
+        return True
+
+    # Function to fetch and process the candles completed since the last one seen
+    def poll(self):
+        """Returns the number of new candles, or None when the request failed."""
+        with stage("poll", instrument=self.instrument, granularity=self.granularity):
+            df = self.fetch_new()
+            if df is None:
+                return None
+            return self.process(df)
+
+    # Function to fetch the candles completed since the last one seen, without processing them
+    def fetch_new(self):
+        # Before anything was seen, the last few candles are enough for the levels
+        if self.last_time is None:
+            return fetch_candles(self.api, self.instrument, None, None, self.granularity, count=self.num_candles + 4)
+        start_time = to_rfc3339(to_epoch_ns(self.last_time) + self.step)
+        return fetch_candles(self.api, self.instrument, start_time, None, self.granularity)
+
+    # Function to process fetched candles in time order, skipping any already seen
+    def process(self, df, report=True):
+        if self.last_time is not None:
+            df = df[df["time"] > self.last_time]
+        for i in range(len(df)):
+            self._advance(df.iloc[i], report)
+        return len(df)
+
+    # Function to get the epoch seconds the next candle completes at
+    def next_close(self):
+        if self.last_time is None:
+            return self.clock()
+        return (to_epoch_ns(self.last_time) + 2 * self.step) / 1e9
+
+    # Function to poll right after every candle close, forever or until max_candles are processed
+    def run(self, max_candles=None):
+        while not self.bootstrap():
+            print(f"Failed to load {self.instrument} candles. Retrying in {RETRY_SECONDS:.0f} seconds...")
+            self.sleep(RETRY_SECONDS)
+
+        processed = 0
+        retry = RETRY_SECONDS
+        while max_candles is None or processed < max_candles:
+            wait = self.next_close() + self.settle - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+
+            new = self.poll()
+            if new:
+                processed += new
+                retry = RETRY_SECONDS
+                continue
+
+            # Not completed yet, or the market is closed: back off up to one candle
+            if new is None:
+                print(f"Failed to fetch {self.instrument} candles. Retrying in {retry:.0f} seconds...")
+            self.sleep(retry)
+            retry = min(retry * 2, self.step / 1e9)
+
+        return processed
+
+    # Function to move the state on by one completed candle
+    def _advance(self, candle, report):
+        support, resistance = None, None
+        if self.seen >= self.num_candles:
+            with stage("sr_detection"):
+                support, resistance = self.engine.levels()
+
+        # The candle after a breakout decides whether it is confirmed
+        if self.pending is not None:
+            breakout, level_support, level_resistance = self.pending
+            self.pending = None
+            previous = self.recent[-1]
+            if len(self.recent) == 4 and self._confirms(previous, candle) and report and self.on_confirmed:
+                self.on_confirmed(candle, previous, self.recent[-2], self.recent[-3], self.recent[-4],
+                                  breakout, level_support, level_resistance)
+
+        with stage("session_filter"):
+            in_session = self.session is None or utc_window_mask([candle["time"]], *self.session)[0]
+        if in_session:
+            with stage("breakout_check"):
+                code = check_breakouts(
+                    [candle["open"]], [candle["close"]],
+                    np.nan if support is None else support,
+                    np.nan if resistance is None else resistance,
+                )[0]
+            if code != NO_BREAKOUT:
+                self.pending = (BREAKOUT_NAMES[code], support, resistance)
+                if report and self.on_breakout:
+                    self.on_breakout(candle, BREAKOUT_NAMES[code], support, resistance)
+
+        with stage("sr_detection"):
+            self.engine.update(candle["open"], candle["close"])
+        add_count("candles_processed")
+        self.recent.append(candle)
+        self.seen += 1
+        self.last_time = candle["time"]
+
+    def _confirms(self, candle, next_candle):
+        if self.confirmation == "none":
+            return True
+        direction = np.sign(candle["close"] - candle["open"])
+        return direction != 0 and direction == np.sign(next_candle["close"] - next_candle["open"])
+
+
+if __name__ == "__main__":
+    from mock_oanda import MockOandaServer, ReplayClock, make_candles
+
+    # Replay a week of random candles at 1800x, one M30 candle a second
+    candles = make_candles(start="2024-03-04", end="2024-03-09")
+    clock = ReplayClock("2024-03-06T00:00:00Z", speed=1800)
+    with MockOandaServer({("XAU_USD", "M30"): candles}, clock=clock.time) as server:
+        live = LiveBreakoutEngine(
+            server.api(), "XAU_USD", clock=clock.time, sleep=clock.sleep,
+            on_breakout=lambda candle, kind, s, r: print(f"{candle['time']} - {kind} broken ({s}, {r})"),
+            on_confirmed=lambda candle, *rest: print(f"{candle['time']} - confirmed {rest[4]}"),
+        )
+        live.run(max_candles=48)
@@ -0,0 +1,246 @@
+import asyncio
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+from oandapyV20 import API
+from oandapyV20 import oandapyV20 as v20_client
+
+from candle_store import GRANULARITY_SECONDS, to_epoch_ns
+from planner import candle_ns
+from scheduler import TokenBucket
+
+# OANDA refuses from/to ranges holding more candles than this
+MAX_CANDLES = 5000
+
+CANDLES_PATH = re.compile(r"^/v3/instruments/(?P<instrument>[A-Z0-9_]+)/candles$")
+PRICE_KEYS = {"M": "mid", "B": "bid", "A": "ask"}
+
+
+# Function to make deterministic random-walk candles to serve, benchmark or replay
+def make_candles(n=None, start="2024-01-01", end=None, granularity="M30", price=2000.0, volatility=1.5,
+                 gap_rate=0.0, weekends=False, seed=42):
+    """Gives n candles from start, or with end every candle in [start, end).
+    The same arguments always give the same candles.
+
+    Prices follow a random walk with volatility per candle, rounded to cents
+    like XAU_USD. gap_rate is the share of candles missing at random and
+    weekends=False leaves out Saturdays and Sundays; the walk goes on while
+    candles are missing, so every time gap is also a price gap between one
+    close and the next open.
+    """
+    rng = np.random.default_rng(seed)
+    step = pd.Timedelta(seconds=GRANULARITY_SECONDS[granularity])
+
+    if end is not None:
+        grid = pd.date_range(start, end, freq=step, tz="UTC", inclusive="left")
+    else:
+        # Enough slots on the time grid that n survive the gaps
+        keep_share = (1 - gap_rate) * (1.0 if weekends else 5 / 7)
+        grid = pd.date_range(start, periods=int(n / keep_share * 1.1) + 1000, freq=step, tz="UTC")
+    slots = len(grid)
+    keep = rng.random(slots) >= gap_rate
+    if not weekends:
+        keep &= np.asarray(grid.dayofweek < 5)
+    kept = np.flatnonzero(keep)[:n]
+
+    walk = np.round(price + np.cumsum(rng.normal(0, volatility, slots + 1)), 2)
+    open_ = walk[kept]
+    close = walk[kept + 1]
+    wick = np.abs(rng.normal(0, volatility / 2, (2, len(kept))))
+    return pd.DataFrame({
+        "time": grid[kept],
+        "open": open_,
+        "high": np.round(np.maximum(open_, close) + wick[0], 2),
+        "low": np.round(np.minimum(open_, close) - wick[1], 2),
+        "close": close,
+        "volume": (100 + np.abs(close - open_) * 200 + rng.integers(0, 2000, len(kept))).astype(np.int64),
+    })
+
+
+# Function to format one price the way OANDA does (string with 5 decimals)
+def _price(value):
+    return f"{value:.5f}"
+
+
+class ReplayClock():
+    """Simulated wall clock that starts at start and runs speed times faster.
+
+    time(), sleep() and async_sleep() stand in for time.time(), time.sleep()
+    and asyncio.sleep(), so a live loop driven by this clock against a
+    MockOandaServer replays history.
+    """
+
+    def __init__(self, start, speed=1.0):
+        self.start = to_epoch_ns(start) / 1e9
+        self.speed = speed
+        self.started = time.monotonic()
+
+    def time(self):
+        return self.start + (time.monotonic() - self.started) * self.speed
+
+    def sleep(self, seconds):
+        time.sleep(max(seconds, 0) / self.speed)
+
+    async def async_sleep(self, seconds):
+        await asyncio.sleep(max(seconds, 0) / self.speed)
+
+
+class MockOandaServer():
+    """Local stand-in for the OANDA v20 REST API, serving stored candles.
+
+    candles maps (instrument, granularity) to a DataFrame with time, open,
+    high, low, close and volume columns. Only the InstrumentsCandles endpoint
+    is served; bid/ask are derived from mid with a fixed spread. latency adds
+    a sleep to every request to mimic the network. Use api() to get an
+    oandapyV20 client that talks to this server.
+
+    clock, e.g. ReplayClock().time, replays history: only candles that have
+    opened by clock() are served and the one still forming is incomplete.
+    rate_limit answers requests beyond that many a second with a 429, like
+    OANDA does.
+    """
+
+    def __init__(self, candles, spread=0.0, latency=0.0, clock=None, rate_limit=None, host="127.0.0.1", port=0):
+        self.candles = {}
+        for key, df in candles.items():
+            times = pd.DatetimeIndex(pd.to_datetime(df["time"], utc=True)).as_unit("ns")
+            self.candles[key] = {
+                "time": times.asi8,
+                "text": times.strftime("%Y-%m-%dT%H:%M:%S.000000000Z").to_numpy(),
+                "open": df["open"].to_numpy(dtype=np.float64),
+                "high": df["high"].to_numpy(dtype=np.float64),
+                "low": df["low"].to_numpy(dtype=np.float64),
+                "close": df["close"].to_numpy(dtype=np.float64),
+                "volume": df["volume"].to_numpy(dtype=np.int64),
+            }
+        self.spread = spread
+        self.latency = latency
+        self.clock = clock
+        self.limiter = TokenBucket(rate_limit, max(1, int(rate_limit))) if rate_limit else None
+        self.request_count = 0
+        self.throttled_count = 0
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                status, body = server.handle(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # Function to get an oandapyV20 client pointed at this server
+    def api(self, environment=None):
+        # One environment per server, so clients of an earlier server never reach this one
+        environment = environment or f"mock-{self.httpd.server_address[1]}"
+        v20_client.TRADING_ENVIRONMENTS[environment] = {"api": self.url, "stream": self.url}
+        return API(access_token="mock-token", environment=environment)
+
+    # Function to answer one GET request, returns (status, json body)
+    def handle(self, path):
+        with self.lock:
+            self.request_count += 1
+
+        if self.limiter is not None and self.limiter.try_acquire() > 0:
+            with self.lock:
+                self.throttled_count += 1
+            return 429, {"errorMessage": "Rate limit violation of allowed requests per second"}
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlparse(path)
+        match = CANDLES_PATH.match(url.path)
+        if not match:
+            return 404, {"errorMessage": f"Unknown path {url.path}"}
+
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        key = (match["instrument"], query.get("granularity", "S5"))
+        if key not in self.candles:
+            return 400, {"errorMessage": f"No candles for {key}"}
+        return self.candles_response(key, query)
+
+    def candles_response(self, key, query):
+        data = self.candles[key]
+        times = data["time"]
+
+        # Hide the future when replaying, the last candle served may still be forming
+        now = None
+        if self.clock is not None:
+            now = int(self.clock() * 1e9)
+            times = times[:np.searchsorted(times, now, side="right")]
+        count = int(query["count"]) if "count" in query else None
+
+        if "from" in query:
+            lo = np.searchsorted(times, to_epoch_ns(query["from"]), side="left")
+        else:
+            lo = None
+        if "to" in query:
+            hi = np.searchsorted(times, to_epoch_ns(query["to"]), side="left")
+        else:
+            hi = len(times)
+
+        if lo is None:
+            lo = max(hi - (count or 500), 0)
+        elif "to" not in query:
+            hi = min(lo + (count or 500), len(times))
+        elif count is not None:
+            return 400, {"errorMessage": "'count' cannot be used with both 'from' and 'to'"}
+
+        if hi - lo > MAX_CANDLES:
+            return 400, {"errorMessage": "Maximum value for 'count' exceeded"}
+
+        price = query.get("price", "M")
+        candles = []
+        for i in range(lo, hi):
+            complete = now is None or data["time"][i] + candle_ns(key[1]) <= now
+            candle = {"complete": bool(complete), "volume": int(data["volume"][i]), "time": data["text"][i]}
+            for letter in price:
+                shift = {"M": 0.0, "B": -self.spread / 2, "A": self.spread / 2}[letter]
+                candle[PRICE_KEYS[letter]] = {
+                    "o": _price(data["open"][i] + shift),
+                    "h": _price(data["high"][i] + shift),
+                    "l": _price(data["low"][i] + shift),
+                    "c": _price(data["close"][i] + shift),
+                }
+            candles.append(candle)
+
+        return 200, {"instrument": key[0], "granularity": key[1], "candles": candles}
+
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from training import FEATURE_COLUMNS, make_model
+
+# Default folder for saved models, relative like BREAKOUT_CSV
+REGISTRY_DIR = "models"
+
+# Trees in a freshly trained forest, RandomForestRegressor's default
+BASE_TREES = 100
+
+# A forest grown past this many times its base trees is retrained from scratch
+MAX_GROWTH = 3
+
+# Params that change how a model is fitted but not the model, ignored when comparing
+RUNTIME_PARAMS = ("n_jobs", "verbose")
+
+
+# Function to hash the first rows of a feature matrix and its target
+def data_hash(X, y, rows=None):
+    rows = len(y) if rows is None else rows
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(X[:rows]).tobytes())
+    digest.update(np.ascontiguousarray(y[:rows]).tobytes())
+    return digest.hexdigest()
+
+
+# Function to turn breakout rows (dicts or a DataFrame) into model inputs
+def encode_rows(rows, columns=FEATURE_COLUMNS):
+    """breakout_type may be given as "support"/"resistance" or already as breakout_type_support."""
+    rows = pd.DataFrame(rows)
+    if "breakout_type_support" not in rows and "breakout_type" in rows:
+        rows["breakout_type_support"] = (rows["breakout_type"].astype(str) == "support").astype(float)
+    missing = [name for name in columns if name not in rows]
+    if missing:
+        raise ValueError(f"Missing model inputs: {missing}")
+    return rows[columns].to_numpy(dtype=np.float64)
+
+
+class ModelRegistry():
+    """Saves fitted models with their feature schema, params and training data hash.
+
+    Each version lives in <root>/<name>/<version>/ as model.joblib (uncompressed,
+    so its arrays can be memory-mapped on load) and meta.json. train() reuses the
+    latest version when nothing changed, grows it with warm_start when rows were
+    only appended, and retrains from scratch otherwise.
+    """
+
+    def __init__(self, root=REGISTRY_DIR):
+        self.root = root
+
+    def path(self, name, version):
+        return os.path.join(self.root, name, f"{version:06d}")
+
+    # Function to list the saved versions of a model, oldest first
+    def versions(self, name):
+        folder = os.path.join(self.root, name)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(int(entry) for entry in os.listdir(folder) if entry.isdigit())
+
+    # Function to read the metadata of a version, the latest by default, None when there is none
+    def meta(self, name, version=None):
+        versions = self.versions(name)
+        if not versions:
+            return None
+        version = versions[-1] if version is None else version
+        with open(os.path.join(self.path(name, version), "meta.json")) as f:
+            return json.load(f)
+
+    # Function to load a model and its metadata, the model's arrays memory-mapped by default
+    def load(self, name, version=None, mmap=True):
+        meta = self.meta(name, version)
+        if meta is None:
+            return None, None
+        model = joblib.load(os.path.join(self.path(name, meta["version"]), "model.joblib"),
+                            mmap_mode="r" if mmap else None)
+        return model, meta
+
+    # Function to save a fitted model as the next version
+    def save(self, name, model, features, params, action):
+        versions = self.versions(name)
+        version = versions[-1] + 1 if versions else 1
+        folder = self.path(name, version)
+        tmp = folder + ".tmp"
+        os.makedirs(tmp, exist_ok=True)
+
+        meta = {
+            "version": version,
+            "columns": list(features["columns"]),
+            "params": params,
+            "rows": len(features["y"]),
+            "data_hash": data_hash(features["X"], features["y"]),
+            "base_trees": params.get("n_estimators", BASE_TREES),
+            "trees": len(model.estimators_),
+            "action": action,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        }
+        joblib.dump(model, os.path.join(tmp, "model.joblib"))
+        with open(os.path.join(tmp, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        # Swap the whole folder in, so a crash never leaves half a version
+        os.replace(tmp, folder)
+        return meta
+
+    # Function to bring a model up to date with the features, doing as little work as possible
+    def train(self, name, features, **params):
+        """Returns (model, meta, action), action is "unchanged", "warm_start" or "retrained".
+
+        The latest version is reused as is when the columns, params and data
+        hash all match. When the data only gained rows at the end, new trees
+        are fitted on all rows and added to the forest, about one per
+        base_trees / rows new rows, until it is MAX_GROWTH times its base size.
+        """
+        params = json.loads(json.dumps(params))
+        setup = {key: value for key, value in params.items() if key not in RUNTIME_PARAMS}
+        X, y = features["X"], features["y"]
+        model, meta = self.load(name, mmap=True)
+
+        same_setup = meta is not None and meta["columns"] == list(features["columns"]) and meta["params"] == setup
+        if same_setup and meta["rows"] == len(y) and meta["data_hash"] == data_hash(X, y):
+            return model, meta, "unchanged"
+
+        appended = (
+            same_setup and meta["rows"] < len(y)
+            and meta["data_hash"] == data_hash(X, y, meta["rows"])
+        )
+        extra = 0
+        if appended:
+            extra = max(1, round(meta["base_trees"] * (len(y) - meta["rows"]) / len(y)))
+        if appended and meta["trees"] + extra <= meta["base_trees"] * MAX_GROWTH:
+            # Old trees are memory-mapped read-only, only the new ones are fitted
+            model.set_params(warm_start=True, n_estimators=meta["trees"] + extra,
+                             **{key: params[key] for key in RUNTIME_PARAMS if key in params})
+            model.fit(X, y)
+            action = "warm_start"
+        else:
+            model = make_model(**params)
+            model.fit(X, y)
+            action = "retrained"
+
+        model.set_params(warm_start=False)
+        meta = self.save(name, model, features, setup, action)
+        return model, meta, action
+
+    # Function to predict with the latest (or a given) version, checking the feature schema
+    def predict(self, name, rows, version=None):
+        model, meta = self.load(name, version)
+        if model is None:
+            raise ValueError(f"No saved model named {name}")
+        return model.predict(encode_rows(rows, meta["columns"]))
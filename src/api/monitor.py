@@ -0,0 +1,156 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from candle_store import to_epoch_ns
+from downloader import MAX_WORKERS, pool_connections
+from live import RETRY_SECONDS, SETTLE_SECONDS, LiveBreakoutEngine
+from sessions import BACKTEST_WINDOW
+
+# Seconds between the polls of streams whose candles close at the same moment
+STAGGER_SECONDS = 0.05
+
+
+class LiveMonitor():
+    """Watches many (instrument, granularity) streams from one asyncio loop.
+
+    Every stream keeps its own LiveBreakoutEngine state. All requests go
+    through one pooled oandapyV20 client on a thread pool of max_requests, so
+    at most that many are in flight; streams whose candles close together are
+    staggered by stagger seconds. Breakout events are put on the asyncio queue
+    self.events as dicts with instrument, granularity, event ("breakout" or
+    "confirmed"), time, breakout_type, support, resistance, candles and
+    latency, the seconds between the candle close and its detection.
+    """
+
+    def __init__(self, api, streams, num_candles=100, tolerance=2.0, session=BACKTEST_WINDOW,
+                 confirmation="same_direction", max_requests=MAX_WORKERS, stagger=STAGGER_SECONDS,
+                 settle=SETTLE_SECONDS, clock=time.time, sleep=asyncio.sleep):
+        self.api = pool_connections(api, max_requests)
+        self.max_requests = max_requests
+        self.stagger = stagger
+        self.settle = settle
+        self.clock = clock
+        self.sleep = sleep
+        self.events = asyncio.Queue()
+        self.latencies = {}
+
+        self.streams = {}
+        for instrument, granularity in streams:
+            key = (instrument, granularity)
+            self.streams[key] = LiveBreakoutEngine(
+                self.api, instrument, granularity, num_candles=num_candles, tolerance=tolerance,
+                session=session, confirmation=confirmation,
+                on_breakout=self._publisher(key, "breakout"),
+                on_confirmed=self._publisher(key, "confirmed"),
+                clock=clock, settle=settle,
+            )
+            self.latencies[key] = []
+
+    # Function to make the callback that turns one stream's breakouts into queue events
+    def _publisher(self, key, event):
+        def publish(candle, *args):
+            # Confirmed breakouts get the four candles before as well, the levels always come last
+            breakout_type, support, resistance = args[-3:]
+            candles = (candle,) + args[:-3]
+            engine = self.streams[key]
+            close = (to_epoch_ns(candle["time"]) + engine.step) / 1e9
+            self.events.put_nowait({
+                "instrument": key[0],
+                "granularity": key[1],
+                "event": event,
+                "time": candle["time"],
+                "breakout_type": breakout_type,
+                "support": support,
+                "resistance": resistance,
+                "candles": candles,
+                "latency": self.clock() - close,
+            })
+        return publish
+
+    # Function to run a blocking fetch on the shared request pool
+    async def _fetch(self, pool, engine):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, engine.fetch_new)
+
+    # Function to follow one stream: sleep to its next close, fetch, update the levels
+    async def _watch(self, pool, key, offset, max_candles):
+        engine = self.streams[key]
+
+        while True:
+            df = await self._fetch(pool, engine)
+            if df is not None:
+                break
+            print(f"Failed to load {key[0]} {key[1]} candles. Retrying in {RETRY_SECONDS:.0f} seconds...")
+            await self.sleep(RETRY_SECONDS)
+        engine.process(df, report=False)
+
+        processed = 0
+        retry = RETRY_SECONDS
+        while max_candles is None or processed < max_candles:
+            wait = engine.next_close() + self.settle + offset - self.clock()
+            if wait > 0:
+                await self.sleep(wait)
+
+            df = await self._fetch(pool, engine)
+            started = self.clock()
+            new = None if df is None else engine.process(df)
+            if new:
+                close = (to_epoch_ns(engine.last_time) + engine.step) / 1e9
+                self.latencies[key].append(started - close)
+                processed += new
+                retry = RETRY_SECONDS
+                continue
+
+            # Not completed yet, or the market is closed: back off up to one candle
+            if new is None:
+                print(f"Failed to fetch {key[0]} {key[1]} candles. Retrying in {retry:.0f} seconds...")
+            await self.sleep(retry)
+            retry = min(retry * 2, engine.step / 1e9)
+
+        return processed
+
+    # Function to watch every stream until each has processed max_candles, or forever
+    async def run(self, max_candles=None):
+        # Streams that close together are spread out by their position in the watchlist
+        with ThreadPoolExecutor(max_workers=self.max_requests) as pool:
+            tasks = [
+                self._watch(pool, key, i * self.stagger, max_candles)
+                for i, key in enumerate(self.streams)
+            ]
+            counts = await asyncio.gather(*tasks)
+        return dict(zip(self.streams, counts))
+
+    # Function to get per-stream detection latency, the seconds from candle close to processing
+    def stats(self):
+        rows = {}
+        for key, latencies in self.latencies.items():
+            values = np.array(latencies)
+            rows[key] = {
+                "candles": self.streams[key].seen,
+                "p50": float(np.percentile(values, 50)) if len(values) else np.nan,
+                "max": float(values.max()) if len(values) else np.nan,
+            }
+        return rows
+
+
+if __name__ == "__main__":
+    from env import api_details
+    from oandapyV20 import API
+
+    from backtest_runner import GRANULARITIES, INSTRUMENTS
+    from scheduler import LIVE, RequestScheduler
+
+    async def main():
+        scheduler = RequestScheduler(API(access_token=api_details.oanda_token))
+        monitor = LiveMonitor(scheduler.client(LIVE),
+                              [(i, g) for i in INSTRUMENTS for g in GRANULARITIES])
+        watching = asyncio.create_task(monitor.run())
+        while not watching.done():
+            event = await monitor.events.get()
+            print(f"{event['time']} {event['instrument']} {event['granularity']} - "
+                  f"{event['event']} {event['breakout_type']} ({event['latency']:.1f}s)")
+
+    asyncio.run(main())
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+from breakouts import BREAKOUT_NAMES, RESISTANCE_BREAKOUT
+
+# Bars a trade is followed for before it is closed at market (one day of M30)
+MAX_BARS = 48
+
+# Trades scanned per block, keeps the (trades x bars) windows at a few tens of MB
+OUTCOME_CHUNK = 65536
+
+# Outcome codes of a simulated trade
+TAKE_PROFIT = 1
+STOP_LOSS = -1
+TIMED_OUT = 0
+NO_CANDLE = -2
+
+OUTCOME_NAMES = {TAKE_PROFIT: "tp", STOP_LOSS: "sl", TIMED_OUT: "timeout", NO_CANDLE: "missing"}
+
+
+# Function to get candle columns as arrays from a DataFrame or CandleStore.load_arrays()
+def _candle_arrays(candles):
+    if isinstance(candles, pd.DataFrame):
+        times = pd.DatetimeIndex(pd.to_datetime(candles["time"], utc=True)).as_unit("ns").asi8
+    else:
+        times = np.asarray(candles["time"], dtype=np.int64)
+    return (
+        times,
+        np.asarray(candles["open"], dtype=np.float64),
+        np.asarray(candles["high"], dtype=np.float64),
+        np.asarray(candles["low"], dtype=np.float64),
+        np.asarray(candles["close"], dtype=np.float64),
+    )
+
+
+# Function to find the first bar of each row where a condition holds, -1 when it never does
+def _first_hit(hits):
+    first = hits.argmax(axis=1)
+    first[~hits.any(axis=1)] = -1
+    return first
+
+
+# Function to simulate TP and SL for every logged breakout
+def simulate_outcomes(trades, candles, tp_ratio=1.0, sl_ratio=1.0, size_column="predicted_size", max_bars=MAX_BARS):
+    """Returns one row per trade with its outcome, exit bar, exit price and pnl.
+
+    trades are breakout rows as logged by log_breakout_to_csv or built by
+    build_training_table, where "time" is the confirmation candle. The trade
+    is entered at that candle's close, once the breakout is confirmed, long on
+    a resistance breakout and short on a support breakout. TP and SL sit
+    tp_ratio and sl_ratio times size_column away from the entry; that has to
+    be known at entry, e.g. a model's predicted size, never the logged "size".
+    The trade is followed for up to max_bars candles after the confirmation
+    candle; when one candle reaches both levels the stop is assumed to have
+    been hit first. Trades that neither hit are closed at the last close.
+    A stop reached by a gap is filled at the open beyond it. Trades without
+    a size, or whose confirmation candle or the candle after it is not in
+    candles, are marked missing.
+    """
+    if size_column == "size":
+        raise ValueError("size is the logged breakout size, the model's target; "
+                         "size TP/SL from a prediction or another value known at entry")
+
+    times, opens, highs, lows, closes = _candle_arrays(candles)
+    count = len(trades)
+
+    confirm_times = pd.DatetimeIndex(pd.to_datetime(trades["time"], utc=True)).as_unit("ns").asi8
+    confirm = times.searchsorted(confirm_times)
+    found = confirm < len(times) - 1
+    found[found] = times[confirm[found]] == confirm_times[found]
+    entry = confirm + 1
+
+    direction = np.where(np.asarray(trades["breakout_type"]) == BREAKOUT_NAMES[RESISTANCE_BREAKOUT], 1.0, -1.0)
+    size = np.asarray(trades[size_column], dtype=np.float64)
+    found &= np.isfinite(size)
+    entry_price = np.full(count, np.nan)
+    entry_price[found] = closes[confirm[found]]
+    tp_price = entry_price + direction * tp_ratio * size
+    sl_price = entry_price - direction * sl_ratio * size
+
+    outcome = np.full(count, NO_CANDLE, dtype=np.int8)
+    exit_bar = np.full(count, -1, dtype=np.int64)
+    exit_price = np.full(count, np.nan)
+
+    # Pad so every entry has max_bars candles ahead, padding never hits a level
+    pad = np.full(max_bars, np.nan)
+    window_highs = np.lib.stride_tricks.sliding_window_view(np.r_[highs, pad], max_bars)
+    window_lows = np.lib.stride_tricks.sliding_window_view(np.r_[lows, pad], max_bars)
+    last_bar = np.minimum(max_bars, len(times) - entry) - 1
+
+    rows = np.flatnonzero(found)
+    for start in range(0, len(rows), OUTCOME_CHUNK):
+        block = rows[start:start + OUTCOME_CHUNK]
+        highs_ahead = window_highs[entry[block]]
+        lows_ahead = window_lows[entry[block]]
+        longs = (direction[block] > 0)[:, None]
+
+        # Longs take profit on the high and stop on the low, shorts the other way round
+        tp_hits = np.where(longs, highs_ahead >= tp_price[block, None], lows_ahead <= tp_price[block, None])
+        sl_hits = np.where(longs, lows_ahead <= sl_price[block, None], highs_ahead >= sl_price[block, None])
+        tp_bar = _first_hit(tp_hits)
+        sl_bar = _first_hit(sl_hits)
+
+        stopped = (sl_bar >= 0) & ((tp_bar < 0) | (sl_bar <= tp_bar))
+        took_profit = (tp_bar >= 0) & ~stopped
+        timed_out = ~stopped & ~took_profit
+
+        outcome[block] = np.select([took_profit, stopped], [TAKE_PROFIT, STOP_LOSS], TIMED_OUT)
+        exit_bar[block] = np.select([took_profit, stopped], [tp_bar, sl_bar], last_bar[block])
+        exit_price[block] = np.where(took_profit, tp_price[block], sl_price[block])
+        # A candle that opens past the stop fills there, not at the stop
+        gapped = block[stopped]
+        gap_opens = opens[entry[gapped] + sl_bar[stopped]]
+        exit_price[gapped] = np.where(direction[gapped] > 0, np.minimum(exit_price[gapped], gap_opens),
+                                      np.maximum(exit_price[gapped], gap_opens))
+        closed = block[timed_out]
+        exit_price[closed] = closes[entry[closed] + last_bar[closed]]
+
+    pnl = (exit_price - entry_price) * direction
+    risk = sl_ratio * size
+    return pd.DataFrame({
+        "time": trades["time"].to_numpy(),
+        "breakout_type": trades["breakout_type"].to_numpy(),
+        "entry_price": entry_price,
+        "tp_price": tp_price,
+        "sl_price": sl_price,
+        "outcome": pd.Series(outcome).map(OUTCOME_NAMES).to_numpy(),
+        "exit_bar": exit_bar,
+        "exit_price": exit_price,
+        "pnl": pnl,
+        "r_multiple": np.divide(pnl, risk, out=np.full(count, np.nan), where=risk > 0),
+    })
+
+
+# Function to summarise simulated trades into hit rates and expectancy
+def summarize_outcomes(results, by="breakout_type"):
+    """Returns one row per group plus an "all" row.
+
+    expectancy is the mean pnl in price units, expectancy_r the mean pnl in
+    multiples of the stop distance. Missing trades are counted but left out of
+    the rates.
+    """
+    groups = [("all", results)]
+    if by is not None:
+        groups += list(results.groupby(by, sort=True))
+
+    summary = []
+    for name, group in groups:
+        traded = group[group["outcome"] != OUTCOME_NAMES[NO_CANDLE]]
+        outcomes = traded["outcome"]
+        summary.append({
+            by or "group": name,
+            "trades": len(traded),
+            "missing": len(group) - len(traded),
+            "tp_rate": (outcomes == OUTCOME_NAMES[TAKE_PROFIT]).mean() if len(traded) else np.nan,
+            "sl_rate": (outcomes == OUTCOME_NAMES[STOP_LOSS]).mean() if len(traded) else np.nan,
+            "timeout_rate": (outcomes == OUTCOME_NAMES[TIMED_OUT]).mean() if len(traded) else np.nan,
+            "mean_bars": traded["exit_bar"].mean() + 1 if len(traded) else np.nan,
+            "expectancy": traded["pnl"].mean() if len(traded) else np.nan,
+            "expectancy_r": traded["r_multiple"].mean() if len(traded) else np.nan,
+        })
+    return pd.DataFrame(summary)
+
+
+# Function to simulate logged breakouts against the candles kept in a CandleStore
+def simulate_from_store(trades, store, instrument, granularity, price="M", **kwargs):
+    return simulate_outcomes(trades, store.load_arrays(instrument, granularity, price), **kwargs)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from breakout_sink import read_breakouts
+    from candle_store import CandleStore
+    from model_registry import REGISTRY_DIR, ModelRegistry
+
+    # Score the breakouts written by get_training.py (data.csv, or its npz sink folder) against the stored candles
+    parser = argparse.ArgumentParser(description="Simulate TP/SL outcomes of logged breakouts.")
+    parser.add_argument("path", nargs="?", default="data.csv", help="breakout CSV or npz sink folder")
+    parser.add_argument("--size-column", default="predicted_size",
+                        help="column TP/SL are sized from, known at entry (not size)")
+    parser.add_argument("--predict", action="store_true",
+                        help="fill --size-column with the latest size model from the registry")
+    parser.add_argument("--instrument", default="XAU_USD")
+    parser.add_argument("--granularity", default="M30")
+    args = parser.parse_args()
+
+    if args.size_column == "size":
+        parser.error("size is the breakout's own logged size, TP/SL sized from it would use the future")
+    trades = read_breakouts(args.path)
+    if args.predict:
+        trades[args.size_column] = ModelRegistry(REGISTRY_DIR).predict("size", trades)
+    if args.size_column not in trades:
+        parser.error(f"{args.path} has no {args.size_column} column, add predictions or pass --predict")
+    results = simulate_from_store(trades, CandleStore(), args.instrument, args.granularity,
+                                  size_column=args.size_column)
+    print(summarize_outcomes(results).to_string(index=False))
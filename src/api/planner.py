@@ -0,0 +1,92 @@
+import numpy as np
+
+from candle_store import GRANULARITY_SECONDS, to_epoch_ns, to_rfc3339
+
+# OANDA rejects from/to requests that would return more candles than this
+MAX_CANDLES = 5000
+
+# Weekly closure that holds in both summer and winter time, in seconds after
+# Monday 00:00 UTC: Friday 22:00 UTC until Sunday 21:00 UTC
+WEEKEND_CLOSE = 4 * 86400 + 22 * 3600
+WEEKEND_OPEN = 6 * 86400 + 21 * 3600
+
+# Instruments that keep trading over the weekend
+ALWAYS_OPEN = set()
+
+# Number of candle slots examined at once, keeps memory flat on long S5/M1 ranges
+SEGMENT = 1_000_000
+
+NS = 10**9
+WEEK_NS = 7 * 86400 * NS
+# 1970-01-05 was the first Monday after the epoch
+MONDAY_NS = 4 * 86400 * NS
+
+
+# Function to get the shortest possible length of one candle in nanoseconds
+def candle_ns(granularity):
+    if granularity == "M":
+        # Shortest month, so the candle count is never underestimated
+        return 28 * 86400 * NS
+    return GRANULARITY_SECONDS[granularity] * NS
+
+
+# Function to mark which candle slots can hold a candle
+def _open_slots(starts, step, instrument, closures):
+    ends = starts + step
+    is_open = np.ones(len(starts), dtype=bool)
+
+    # A slot is closed only when it lies completely inside a closure
+    if instrument not in ALWAYS_OPEN:
+        offset = (starts - MONDAY_NS) % WEEK_NS
+        is_open &= ~((offset >= WEEKEND_CLOSE * NS) & (offset + step <= WEEKEND_OPEN * NS))
+
+    for closed_start, closed_end in closures:
+        is_open &= ~((starts >= closed_start) & (ends <= closed_end))
+
+    return is_open
+
+
+# Function to split a date range into the fewest requests under the candle limit
+def plan_requests(instrument, granularity, start_time, end_time, max_candles=MAX_CANDLES, closures=()):
+    """Returns a list of (from, to) RFC3339 strings that tile [start, end).
+
+    Candle counts are estimated on a grid of candle-length slots. Every slot
+    is counted except those lying completely inside the Friday 22:00 - Sunday
+    21:00 UTC closure or one of the extra closures (a list of (start, end)
+    times), so slots that touch trading time at either edge are kept whatever
+    the candle alignment. The estimate, and so the max_candles limit, only
+    holds when the instrument really has no candles in those closures: add
+    instruments quoted over the weekend to ALWAYS_OPEN and pass only
+    closures that are certain. Closed slots are folded into the neighbouring
+    requests instead of costing requests of their own. A range with no
+    trading time at all returns no requests.
+    """
+    start = to_epoch_ns(start_time)
+    end = to_epoch_ns(end_time)
+    if end <= start:
+        return []
+
+    step = candle_ns(granularity)
+    closures = [(to_epoch_ns(s), to_epoch_ns(e)) for s, e in closures]
+    num_slots = -(-(end - start) // step)
+
+    boundaries = []
+    count = 0
+    for first in range(0, num_slots, SEGMENT):
+        starts = start + np.arange(first, min(first + SEGMENT, num_slots), dtype=np.int64) * step
+        open_starts = starts[_open_slots(starts, step, instrument, closures)]
+
+        # The slot that fills a request to max_candles ends that request
+        position = count + np.arange(1, len(open_starts) + 1)
+        boundaries.extend((open_starts[position % max_candles == 0] + step).tolist())
+        count += len(open_starts)
+
+    if count == 0:
+        return []
+
+    # The last request always runs to the end of the range
+    if count % max_candles == 0:
+        boundaries.pop()
+
+    edges = [start] + boundaries + [end]
+    return [(to_rfc3339(a), to_rfc3339(b)) for a, b in zip(edges[:-1], edges[1:])]
@@ -0,0 +1,181 @@
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+# Set FX_PROFILE=1 to time every stage; the summary and trace are written when the process exits
+PROFILE_ENV = "FX_PROFILE"
+TRACE_ENV = "FX_PROFILE_TRACE"
+TRACE_JSON = "profile_trace.json"
+
+# Trace events kept, stage totals keep counting after this
+MAX_EVENTS = 1_000_000
+
+# The one context handed out while profiling is off, so a stage costs a function call
+_OFF = contextlib.nullcontext()
+
+
+class Profiler():
+    """Collects per-stage timings and counters.
+
+    stage(name) times a block and adds it to the totals of that stage and
+    to the trace; count(name) adds to a counter. summary() gives a table per
+    stage and write_trace() saves every event as Chrome trace JSON (open it
+    in chrome://tracing or Perfetto) with the totals and counters alongside.
+    Stages can nest (a poll holds its fetch and parse), an outer stage's time
+    includes the inner ones. Safe to use from the download threads.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.origin = time.perf_counter()
+            self.totals = {}
+            self.counters = {}
+            self.events = []
+            self.dropped = 0
+
+    def add(self, name, started, seconds, fields=None):
+        with self.lock:
+            total = self.totals.get(name)
+            if total is None:
+                total = self.totals[name] = {"calls": 0, "seconds": 0.0, "max": 0.0}
+            total["calls"] += 1
+            total["seconds"] += seconds
+            total["max"] = max(total["max"], seconds)
+
+            if len(self.events) < self.max_events:
+                self.events.append((name, started, seconds, threading.get_ident(), fields))
+            else:
+                self.dropped += 1
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, started, time.perf_counter() - started, fields or None)
+
+    # Function to get one row per stage, slowest first
+    def summary(self):
+        with self.lock:
+            totals = {name: dict(total) for name, total in self.totals.items()}
+        wall = time.perf_counter() - self.origin
+        rows = [
+            {
+                "stage": name,
+                "calls": total["calls"],
+                "total_s": total["seconds"],
+                "mean_ms": total["seconds"] / total["calls"] * 1000,
+                "max_ms": total["max"] * 1000,
+                "wall_pct": total["seconds"] / wall * 100 if wall > 0 else 0.0,
+            }
+            for name, total in totals.items()
+        ]
+        columns = ["stage", "calls", "total_s", "mean_ms", "max_ms", "wall_pct"]
+        return pd.DataFrame(rows, columns=columns).sort_values("total_s", ascending=False, ignore_index=True)
+
+    # Function to print the stage table and the counters
+    def print_summary(self):
+        table = self.summary()
+        if table.empty and not self.counters:
+            return
+        print(table.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+        for name, value in sorted(self.counters.items()):
+            print(f"{name}: {value}")
+
+    # Function to write the trace as Chrome trace JSON, timestamps in microseconds from reset()
+    def write_trace(self, path=TRACE_JSON):
+        with self.lock:
+            events = list(self.events)
+            counters = dict(self.counters)
+            dropped = self.dropped
+        trace = {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (started - self.origin) * 1e6,
+                    "dur": seconds * 1e6,
+                    "pid": os.getpid(),
+                    "tid": thread,
+                    **({"args": fields} if fields else {}),
+                }
+                for name, started, seconds, thread, fields in events
+            ],
+            "stages": self.summary().to_dict("records"),
+            "counters": counters,
+            "droppedEvents": dropped,
+        }
+        with open(path, "w") as f:
+            json.dump(trace, f, default=str)
+        return path
+
+
+PROFILER = Profiler()
+enabled = os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+# Function to time a block as one stage, e.g. with stage("fetch"): ...
+def stage(name, **fields):
+    if not enabled:
+        return _OFF
+    return PROFILER.stage(name, **fields)
+
+
+# Function to add to a counter, e.g. candles fetched
+def add_count(name, value=1):
+    if enabled:
+        PROFILER.count(name, value)
+
+
+# Function to time every call of a function as one stage
+def timed(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with PROFILER.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _report():
+    PROFILER.print_summary()
+    print(f"Profile trace written to {PROFILER.write_trace(os.environ.get(TRACE_ENV, TRACE_JSON))}")
+
+
+# Function to switch profiling on from code, the same as setting FX_PROFILE=1
+def enable(report_at_exit=True):
+    global enabled
+    if not enabled:
+        PROFILER.reset()
+    enabled = True
+    if report_at_exit:
+        atexit.unregister(_report)
+        atexit.register(_report)
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+if enabled:
+    atexit.register(_report)
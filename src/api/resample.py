@@ -0,0 +1,229 @@
+import numpy as np
+import pandas as pd
+
+from candle_cache import ALIGNMENT_TIMEZONE, DAILY_ALIGNMENT
+from candle_store import GRANULARITY_SECONDS, to_epoch_ns
+from sessions import SESSIONS
+
+NS = 10**9
+
+# Granularities built from the store, finest first, when no base is given
+BASE_GRANULARITIES = ["M1", "M5", "M15", "M30", "H1"]
+
+# Weekly candles start when the Friday session closes
+WEEKLY_ALIGNMENT = 4
+
+
+# Function to turn a DataFrame or a dict of columns into int64-ns time and the other columns
+def _columns(candles):
+    if isinstance(candles, pd.DataFrame):
+        times = pd.DatetimeIndex(pd.to_datetime(candles["time"], utc=True)).as_unit("ns").asi8
+    else:
+        times = np.asarray(candles["time"], dtype=np.int64)
+    return {
+        "time": times,
+        "open": np.asarray(candles["open"], dtype=np.float64),
+        "high": np.asarray(candles["high"], dtype=np.float64),
+        "low": np.asarray(candles["low"], dtype=np.float64),
+        "close": np.asarray(candles["close"], dtype=np.float64),
+        "volume": np.asarray(candles["volume"], dtype=np.int64),
+    }
+
+
+# Function to get where the base data begins in epoch ns, the first candle when not given
+def _data_start(columns, data_start=None):
+    if data_start is None:
+        return columns["time"][0]
+    if isinstance(data_start, (int, np.integer)):
+        return int(data_start)
+    return to_epoch_ns(data_start)
+
+
+# Function to find the 17:00 New York open of the trading day each time belongs to
+def _trading_day_opens(times):
+    local = pd.DatetimeIndex(times, tz="UTC").tz_convert(ALIGNMENT_TIMEZONE).tz_localize(None)
+    return (local - pd.Timedelta(hours=DAILY_ALIGNMENT)).normalize() + pd.Timedelta(hours=DAILY_ALIGNMENT)
+
+
+# Function to turn New York wall-clock times back into epoch nanoseconds
+def _from_local(local):
+    return pd.DatetimeIndex(local).tz_localize(ALIGNMENT_TIMEZONE).tz_convert("UTC").as_unit("ns").asi8
+
+
+# Function to get the start (epoch ns) of the bar each time falls in, aligned like OANDA
+def bar_starts(times, granularity):
+    """Up to H1 bars line up with UTC. Longer bars count from 17:00 New York,
+    weekly bars start on Friday at 17:00 and monthly bars at 17:00 on the day
+    before the 1st, all following New York daylight saving time.
+    """
+    times = np.asarray(times, dtype=np.int64)
+    step = GRANULARITY_SECONDS[granularity] * NS
+    if step <= 3600 * NS:
+        return times - times % step
+
+    opens = _trading_day_opens(times)
+    if granularity == "W":
+        days = (opens.dayofweek - WEEKLY_ALIGNMENT) % 7
+        return _from_local(opens - pd.to_timedelta(days, unit="D"))
+    if granularity == "M":
+        # The trading day that opens at 17:00 is dated the next calendar day
+        trading_dates = opens + pd.Timedelta(days=1)
+        month_starts = trading_dates.normalize() - pd.to_timedelta(trading_dates.day - 1, unit="D")
+        return _from_local(month_starts - pd.Timedelta(days=1) + pd.Timedelta(hours=DAILY_ALIGNMENT))
+
+    day_opens = _from_local(opens)
+    return day_opens + (times - day_opens) // step * step
+
+
+# Function to aggregate sorted candles into one bar per distinct key
+def _aggregate(columns, keys):
+    if len(keys) == 0:
+        return {name: values[:0] for name, values in columns.items()}
+
+    first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    last = np.r_[first[1:] - 1, len(keys) - 1]
+    return {
+        "time": keys[first],
+        "open": columns["open"][first],
+        "high": np.maximum.reduceat(columns["high"], first),
+        "low": np.minimum.reduceat(columns["low"], first),
+        "close": columns["close"][last],
+        "volume": np.add.reduceat(columns["volume"], first),
+    }
+
+
+# Function to build bars as NumPy columns, with a complete flag for each bar
+def resample_arrays(candles, granularity, base_granularity="M30", data_start=None):
+    """candles are base candles in time order (DataFrame or store arrays).
+
+    data_start is where the base data begins (a time or epoch ns), the first
+    candle's time by default. Bars are built from whatever base candles fall
+    inside them, so the first bar is only complete when it starts at or after
+    data_start; a bar the data starts partway through is flagged incomplete.
+    The last bar is complete once the base candles reach its close, every bar
+    in between is complete.
+    """
+    columns = _columns(candles)
+    bars = _aggregate(columns, bar_starts(columns["time"], granularity))
+
+    complete = np.ones(len(bars["time"]), dtype=bool)
+    if len(complete):
+        complete[0] = bars["time"][0] >= _data_start(columns, data_start)
+        data_end = columns["time"][-1] + GRANULARITY_SECONDS[base_granularity] * NS
+        complete[-1] &= bar_starts([data_end], granularity)[0] != bars["time"][-1]
+    bars["complete"] = complete
+    return bars
+
+
+# Function to turn bar columns into a DataFrame shaped like candles_to_frame()
+def _to_frame(bars, complete_only):
+    keep = bars["complete"] if complete_only else np.ones(len(bars["time"]), dtype=bool)
+    df = pd.DataFrame({name: bars[name][keep] for name in ("time", "open", "high", "low", "close", "volume")})
+    df["time"] = pd.to_datetime(df["time"], unit="ns", utc=True)
+    return df
+
+
+# Function to resample base candles to a coarser granularity
+def resample_candles(candles, granularity, base_granularity="M30", complete_only=True, data_start=None):
+    return _to_frame(resample_arrays(candles, granularity, base_granularity, data_start), complete_only)
+
+
+# Function to build one bar per day for a named session, e.g. the London session
+def session_bars(candles, session, base_granularity="M30", complete_only=True, data_start=None):
+    """Bars run from the session open to its close in local time (see sessions.SESSIONS)
+    and are stamped with the open; weekends have none. As in resample_arrays(), a
+    session the data starts partway through is incomplete."""
+    zone, open_hour, close_hour = SESSIONS[session]
+    columns = _columns(candles)
+
+    local = pd.DatetimeIndex(columns["time"], tz="UTC").tz_convert(zone).tz_localize(None)
+    time_of_day = local - local.normalize()
+    inside = np.asarray(
+        (time_of_day >= pd.Timedelta(hours=open_hour)) & (time_of_day < pd.Timedelta(hours=close_hour))
+    ) & (np.asarray(local.dayofweek) < 5)
+
+    session_open = local.normalize() + pd.Timedelta(hours=open_hour)
+    keys = pd.DatetimeIndex(session_open[inside]).tz_localize(zone).tz_convert("UTC").as_unit("ns").asi8
+    bars = _aggregate({name: values[inside] for name, values in columns.items()}, keys)
+
+    # Only the first session can be missing candles and only the last can still be open
+    complete = np.ones(len(bars["time"]), dtype=bool)
+    if len(complete):
+        complete[0] = bars["time"][0] >= _data_start(columns, data_start)
+        close = bars["time"][-1] + (close_hour - open_hour) * 3600 * NS
+        complete[-1] &= columns["time"][-1] + GRANULARITY_SECONDS[base_granularity] * NS >= close
+    bars["complete"] = complete
+    return _to_frame(bars, complete_only)
+
+
+class Resampler():
+    """Keeps one coarser granularity up to date as base candles arrive.
+
+    update() takes the new complete base candles, oldest first, and returns
+    the bars they completed; current holds the bar still forming, or None.
+    """
+
+    def __init__(self, granularity, base_granularity="M30"):
+        self.granularity = granularity
+        self.base_granularity = base_granularity
+        self.current = None
+        self.last_time = None
+        self.data_start = None
+
+    def update(self, candles):
+        columns = _columns(candles)
+        if self.last_time is not None:
+            new = columns["time"] > self.last_time
+            columns = {name: values[new] for name, values in columns.items()}
+        if len(columns["time"]) == 0:
+            return _to_frame(resample_arrays(columns, self.granularity, self.base_granularity), True)
+        self.last_time = columns["time"][-1]
+        if self.data_start is None:
+            self.data_start = columns["time"][0]
+
+        # The forming bar goes back in as one candle at its own start, it lands in the same bar
+        if self.current is not None:
+            columns = {name: np.r_[self.current[name], values] for name, values in columns.items()}
+
+        bars = resample_arrays(columns, self.granularity, self.base_granularity, self.data_start)
+        if bars["complete"][-1]:
+            self.current = None
+        else:
+            self.current = {name: values[-1] for name, values in bars.items() if name != "complete"}
+        return _to_frame(bars, True)
+
+
+class MultiTimeframe():
+    """One Resampler per granularity fed from the same base candles."""
+
+    def __init__(self, granularities, base_granularity="M30"):
+        self.resamplers = {g: Resampler(g, base_granularity) for g in granularities}
+
+    # Function to feed new base candles, returns {granularity: bars completed by them}
+    def update(self, candles):
+        return {g: resampler.update(candles) for g, resampler in self.resamplers.items()}
+
+    # Function to get the bar still forming in every granularity
+    def current(self):
+        return {g: resampler.current for g, resampler in self.resamplers.items()}
+
+
+# Function to build a granularity from the finest stored candles covering a range
+def load_resampled(store, instrument, granularity, price="M", start_time=None, end_time=None,
+                   base_granularities=BASE_GRANULARITIES, complete_only=True):
+    """Returns None when no finer stored granularity covers [start_time, end_time)."""
+    step = GRANULARITY_SECONDS[granularity]
+    for base in base_granularities:
+        if GRANULARITY_SECONDS[base] > step or step % GRANULARITY_SECONDS[base]:
+            continue
+        if not store.coverage(instrument, base, price):
+            continue
+        if start_time is not None and end_time is not None and store.missing_ranges(
+                instrument, base, price, start_time, end_time):
+            continue
+
+        candles = store.load(instrument, base, price, start_time, end_time)
+        if base == granularity:
+            return candles
+        return resample_candles(candles, granularity, base, complete_only, start_time)
+    return None
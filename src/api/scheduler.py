@@ -0,0 +1,302 @@
+import itertools
+import queue
+import random
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from oandapyV20.exceptions import V20Error
+
+# Request priorities, lower goes first: live polling jumps ahead of backfills
+LIVE = 0
+BACKFILL = 1
+
+PRIORITY_NAMES = {LIVE: "live", BACKFILL: "backfill"}
+
+# OANDA allows 120 requests per second per client, stay a little under it
+RATE = 100.0
+BURST = 20
+
+# Requests in flight at once, matches the downloader's connection pool
+MAX_IN_FLIGHT = 8
+
+# Retry with full jitter: attempt n waits uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2**n)) seconds
+MAX_RETRIES = 5
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+# HTTP codes worth retrying, everything else is the caller's problem
+RETRY_CODES = {429, 500, 502, 503, 504}
+
+# Priority of the item that stops a worker, after every real request
+_STOP = float("inf")
+
+
+class TokenBucket():
+    """Classic token bucket: rate tokens a second, at most burst saved up."""
+
+    def __init__(self, rate=RATE, burst=BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Function to take a token if one is free, returns the seconds to wait otherwise
+    def try_acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate
+
+    # Function to block until a token is free, returns the seconds spent waiting
+    def acquire(self):
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    # Function to hand out no tokens for a while, e.g. after the server said 429
+    def pause(self, seconds):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.tokens = 0.0
+
+
+class _Job():
+    def __init__(self, endpoint, priority):
+        self.endpoint = endpoint
+        self.priority = priority
+        self.attempts = 0
+        self.future = Future()
+
+
+class ScheduledClient():
+    """Stands in for an oandapyV20 API object, sending requests through a scheduler at one priority."""
+
+    def __init__(self, scheduler, priority):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    # The underlying requests session, so pool_connections() still works on this client
+    @property
+    def client(self):
+        return self.scheduler.api.client
+
+    def request(self, endpoint):
+        return self.scheduler.request(endpoint, self.priority)
+
+
+class RequestScheduler():
+    """Sends every request of one oandapyV20 API object through a central queue.
+
+    Requests wait in a priority queue (LIVE before BACKFILL, first come first
+    served within a priority), take a token from a token bucket of rate
+    requests a second and run on max_in_flight worker threads. 429s, 5xx
+    answers and connection errors are retried with jittered exponential
+    backoff; a 429 also pauses the bucket so every worker slows down. When
+    the retries run out the last error is raised in the caller, like
+    api.request would. client(priority) gives an object with the API's
+    request() that existing fetch functions can use as their api. close(),
+    or leaving a with block, stops the workers.
+    """
+
+    def __init__(self, api, rate=RATE, burst=BURST, max_in_flight=MAX_IN_FLIGHT, max_retries=MAX_RETRIES,
+                 base_backoff=BASE_BACKOFF, max_backoff=MAX_BACKOFF):
+        self.api = api
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self.queue = queue.PriorityQueue()
+        self.order = itertools.count()
+        self.lock = threading.Lock()
+        self.closed = False
+        # Jobs backing off before a retry, with the timer that queues them again
+        self.retrying = {}
+        self.metrics = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "throttled": 0,
+            "in_flight": 0,
+            "waiting_retry": 0,
+            "token_wait": 0.0,
+        }
+
+        self.workers = [
+            threading.Thread(target=self._work, daemon=True, name=f"request-scheduler-{i}")
+            for i in range(max_in_flight)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # Function to stop the workers, after the queued requests unless cancel_pending
+    def close(self, wait=True, cancel_pending=False):
+        """Requests waiting to be retried are cancelled either way, as are queued
+        ones with cancel_pending; their futures raise CancelledError."""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            retrying, self.retrying = self.retrying, {}
+            self.metrics["waiting_retry"] = 0
+
+        for job, timer in retrying.items():
+            timer.cancel()
+            job.future.cancel()
+
+        if cancel_pending:
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                item[2].future.cancel()
+
+        for _ in self.workers:
+            self.queue.put((_STOP, next(self.order), None))
+        if wait:
+            for worker in self.workers:
+                if worker is not threading.current_thread():
+                    worker.join()
+
+    # Function to get an API-like client whose requests go through this scheduler
+    def client(self, priority=BACKFILL):
+        return ScheduledClient(self, priority)
+
+    # Function to queue a request and wait for its response, same contract as api.request
+    def request(self, endpoint, priority=BACKFILL):
+        return self.submit(endpoint, priority).result()
+
+    # Function to queue a request, returns a Future of the response
+    def submit(self, endpoint, priority=BACKFILL):
+        job = _Job(endpoint, priority)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("RequestScheduler is closed")
+            self.metrics["requests"] += 1
+        self._enqueue(job)
+        return job.future
+
+    def _enqueue(self, job):
+        self.queue.put((job.priority, next(self.order), job))
+
+    def _retry_later(self, job, delay):
+        def requeue():
+            # Queued under the lock, so a close() that comes next still finds it ahead of the stops
+            with self.lock:
+                if self.retrying.pop(job, None) is None:
+                    return
+                self.metrics["waiting_retry"] -= 1
+                self._enqueue(job)
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self.lock:
+            if self.closed:
+                job.future.cancel()
+                return
+            self.metrics["retries"] += 1
+            self.metrics["waiting_retry"] += 1
+            self.retrying[job] = timer
+        timer.start()
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def _work(self):
+        while True:
+            # Job first, so idle workers never sit on tokens and bursts stay within the bucket
+            item = self.queue.get()
+            if item[0] == _STOP:
+                return
+            waited = self.bucket.acquire()
+            if waited:
+                item = self._most_urgent(item)
+            job = item[2]
+
+            with self.lock:
+                self.metrics["token_wait"] += waited
+                self.metrics["in_flight"] += 1
+            try:
+                response = self.api.request(job.endpoint)
+            except (V20Error, requests.RequestException) as e:
+                self._failed(job, e)
+            except Exception as e:
+                job.future.set_exception(e)
+                with self.lock:
+                    self.metrics["failed"] += 1
+            else:
+                job.future.set_result(response)
+                with self.lock:
+                    self.metrics["succeeded"] += 1
+            finally:
+                with self.lock:
+                    self.metrics["in_flight"] -= 1
+
+    # Function to swap a job that waited for a token with a more urgent one queued meanwhile
+    def _most_urgent(self, item):
+        try:
+            head = self.queue.get_nowait()
+        except queue.Empty:
+            return item
+        if head[:2] < item[:2]:
+            self.queue.put(item)
+            return head
+        self.queue.put(head)
+        return item
+
+    def _failed(self, job, error):
+        code = getattr(error, "code", None)
+        retryable = not isinstance(error, V20Error) or code in RETRY_CODES
+
+        if code == 429:
+            with self.lock:
+                self.metrics["throttled"] += 1
+
+        if retryable and job.attempts < self.max_retries:
+            delay = self._backoff(job.attempts)
+            job.attempts += 1
+            if code == 429:
+                self.bucket.pause(delay)
+            self._retry_later(job, delay)
+            return
+
+        job.future.set_exception(error)
+        with self.lock:
+            self.metrics["failed"] += 1
+
+    # Function to get the queue depth per priority and the request counters
+    def stats(self):
+        """token_wait is the total seconds workers spent held back by the bucket."""
+        with self.queue.mutex:
+            queued = [item[0] for item in self.queue.queue if item[0] != _STOP]
+        with self.lock:
+            stats = dict(self.metrics)
+        stats["queued"] = len(queued)
+        for priority, name in PRIORITY_NAMES.items():
+            stats[f"queued_{name}"] = queued.count(priority)
+        return stats
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+
+# Trading sessions in local exchange time: (timezone, open hour, close hour).
+# Local hours follow each city's daylight saving changes.
+SESSIONS = {
+    "sydney": ("Australia/Sydney", 7, 16),
+    "tokyo": ("Asia/Tokyo", 9, 18),
+    "london": ("Europe/London", 8, 17),
+    "new_york": ("America/New_York", 8, 17),
+}
+
+# Session pairs that overlap during the week
+OVERLAPS = {
+    "tokyo_london": ("tokyo", "london"),
+    "london_new_york": ("london", "new_york"),
+    "sydney_tokyo": ("sydney", "tokyo"),
+}
+
+# Fixed UTC window the training backtest uses for London (10 AM - 4 PM UTC)
+BACKTEST_WINDOW = (10, 16)
+
+
+# Function to turn any time column into a UTC DatetimeIndex, naive times are UTC
+def _utc_index(times):
+    return pd.DatetimeIndex(pd.to_datetime(times, utc=True))
+
+
+# Function to get the time of day of every entry as a Timedelta array
+def _time_of_day(times):
+    return times - times.normalize()
+
+
+# Function to mark times inside a fixed UTC window, both ends included
+def utc_window_mask(times, start_hour=BACKTEST_WINDOW[0], end_hour=BACKTEST_WINDOW[1]):
+    time_of_day = _time_of_day(_utc_index(times).tz_localize(None))
+    return np.asarray(
+        (time_of_day >= pd.Timedelta(hours=start_hour)) & (time_of_day <= pd.Timedelta(hours=end_hour))
+    )
+
+
+# Function to mark times inside a named session, open included and close excluded
+def session_mask(times, session):
+    zone, open_hour, close_hour = SESSIONS[session]
+    local = _utc_index(times).tz_convert(zone).tz_localize(None)
+    time_of_day = _time_of_day(local)
+    weekday = np.asarray(local.dayofweek)
+
+    inside = (time_of_day >= pd.Timedelta(hours=open_hour)) & (time_of_day < pd.Timedelta(hours=close_hour))
+    return np.asarray(inside) & (weekday < 5)
+
+
+# Function to build every session and overlap mask in one go
+def session_masks(times):
+    """Returns a DataFrame of boolean columns, one per session and overlap."""
+    times = _utc_index(times)
+    masks = {name: session_mask(times, name) for name in SESSIONS}
+    for name, (first, second) in OVERLAPS.items():
+        masks[name] = masks[first] & masks[second]
+    return pd.DataFrame(masks, index=times)
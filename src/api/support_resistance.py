@@ -0,0 +1,241 @@
+from collections import deque
+
+import numpy as np
+
+# Number of reversal events compared at once when linking events
+LINK_CHUNK = 65536
+
+
+# Function to build the acceptance rule used when walking older reversals
+def _band_rule(direction, tolerance):
+    # direction is +1 for resistance (levels may only step up) and -1 for support
+    if tolerance is None:
+        if direction > 0:
+            return lambda level, value: value > level
+        return lambda level, value: value < level
+
+    if direction > 0:
+        return lambda level, value: level <= value <= level + tolerance
+    return lambda level, value: level >= value >= level - tolerance
+
+
+class _LevelChain():
+    """Reversal events for one side (support or resistance) inside the window.
+
+    detect_support_resistance walks reversals from newest to oldest and only
+    moves the level to an older reversal that the rule accepts. Which older
+    reversal is picked after a given one never depends on the window, so each
+    event stores a link to it when it arrives. The current level is the oldest
+    in-window event on the chain that starts at the newest event.
+    """
+
+    __slots__ = ("accepts", "events", "chain")
+
+    def __init__(self, accepts):
+        self.accepts = accepts
+        # Each event is [bar index, value, link to next older accepted event]
+        self.events = deque()
+        # Chain walked from the newest event, newest first
+        self.chain = deque()
+
+    def add(self, index, value, window_start):
+        link = None
+        for event in reversed(self.events):
+            if event[0] < window_start:
+                break
+            if self.accepts(value, event[1]):
+                link = event
+                break
+
+        event = [index, value, link]
+        self.events.append(event)
+
+        if link is None:
+            self.chain = deque([event])
+        elif self.chain and self.chain[0] is link:
+            self.chain.appendleft(event)
+        else:
+            chain = deque()
+            while event is not None and event[0] >= window_start:
+                chain.append(event)
+                event = event[2]
+            self.chain = chain
+
+    def expire(self, window_start):
+        events = self.events
+        while events and events[0][0] < window_start:
+            # Cut the link so expired events can be garbage collected
+            events.popleft()[2] = None
+
+        chain = self.chain
+        while chain and chain[-1][0] < window_start:
+            chain.pop()
+
+    def level(self):
+        if self.chain:
+            return self.chain[-1][1]
+        return None
+
+
+class SupportResistanceEngine():
+    """Streaming version of detect_support_resistance.
+
+    Feed candles one at a time with update(); levels() returns the same
+    (support, resistance) pair that detect_support_resistance would return
+    for all candles fed so far. tolerance=None reproduces the plain
+    highest-resistance / lowest-support rule used in ai_get_training.py.
+    """
+
+    def __init__(self, num_candles=100, tolerance=2.0):
+        self.num_candles = num_candles
+        self.tolerance = tolerance
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.prev_open = None
+        self.prev_close = None
+        self.support_chain = _LevelChain(_band_rule(-1, self.tolerance))
+        self.resistance_chain = _LevelChain(_band_rule(1, self.tolerance))
+
+    # Function to add the next candle to the engine
+    def update(self, open_price, close_price):
+        index = self.count
+        window_start = index + 1 - self.num_candles
+
+        if index > 0:
+            prev_open = self.prev_open
+            prev_close = self.prev_close
+
+            # Previous candle bullish and current candle bearish
+            if prev_close > prev_open and close_price < open_price:
+                self.resistance_chain.add(index, prev_close, window_start)
+
+            # Previous candle bearish and current candle bullish
+            elif prev_close < prev_open and close_price > open_price:
+                self.support_chain.add(index, prev_close, window_start)
+
+        self.count = index + 1
+        self.prev_open = open_price
+        self.prev_close = close_price
+
+        self.support_chain.expire(window_start)
+        self.resistance_chain.expire(window_start)
+
+    # Function to add many candles at once, e.g. a freshly fetched DataFrame
+    def update_many(self, opens, closes):
+        for open_price, close_price in zip(opens, closes):
+            self.update(open_price, close_price)
+
+    # Function to get the current support and resistance levels
+    def levels(self):
+        return self.support_chain.level(), self.resistance_chain.level()
+
+
+# Function to find bull->bear and bear->bull reversal pairs in one pass
+def find_reversals(opens, closes):
+    """Returns (resistance_idx, resistance_val, support_idx, support_val).
+
+    Indices are the bar of the second candle of each pair and values are the
+    close of the first candle, as used by detect_support_resistance.
+    """
+    opens = np.asarray(opens, dtype=np.float64)
+    closes = np.asarray(closes, dtype=np.float64)
+
+    bullish = closes > opens
+    bearish = closes < opens
+
+    resistance_mask = bullish[:-1] & bearish[1:]
+    support_mask = bearish[:-1] & bullish[1:]
+
+    resistance_idx = np.flatnonzero(resistance_mask) + 1
+    support_idx = np.flatnonzero(support_mask) + 1
+
+    return (resistance_idx, closes[resistance_idx - 1],
+            support_idx, closes[support_idx - 1])
+
+
+# Function to link every event to the next older event the band rule accepts
+def _link_events(idx, values, direction, num_candles, tolerance):
+    count = len(idx)
+    links = np.full(count, -1, dtype=np.int64)
+    max_lag = min(num_candles - 1, count - 1)
+    if max_lag <= 0:
+        return links
+
+    lags = np.arange(1, max_lag + 1)
+    for start in range(0, count, LINK_CHUNK):
+        rows = np.arange(start, min(start + LINK_CHUNK, count))
+        older = rows[:, None] - lags[None, :]
+        valid = older >= 0
+        older = np.where(valid, older, 0)
+
+        # Only events that can share a window with this one are candidates
+        valid &= idx[older] > idx[rows, None] - num_candles
+
+        level = values[rows, None]
+        value = values[older]
+        if tolerance is None:
+            accepted = value > level if direction > 0 else value < level
+        elif direction > 0:
+            accepted = (level <= value) & (value <= level + tolerance)
+        else:
+            accepted = (level >= value) & (value >= level - tolerance)
+        accepted &= valid
+
+        found = accepted.any(axis=1)
+        first = accepted.argmax(axis=1)
+        links[rows[found]] = older[found, first[found]]
+
+    return links
+
+
+# Function to turn one side's reversal events into a level for every bar
+def levels_from_reversals(idx, values, length, direction, num_candles=100, tolerance=2.0):
+    levels = np.full(length, np.nan)
+    if len(idx) == 0 or length == 0:
+        return levels
+
+    idx = np.asarray(idx, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    links = _link_events(idx, values, direction, num_candles, tolerance)
+
+    # Level for bar i uses candles [0, i): newest event at or before bar i - 1
+    bars = np.arange(length)
+    node = np.searchsorted(idx, bars - 1, side="right") - 1
+    window_start = bars - num_candles
+    has_level = node >= 0
+    has_level[has_level] = idx[node[has_level]] >= window_start[has_level]
+
+    node = node[has_level]
+    window_start = window_start[has_level]
+
+    # Follow the links with binary lifting while they stay inside the window
+    jumps = [links]
+    while (1 << len(jumps)) < num_candles:
+        prev = jumps[-1]
+        jumps.append(np.where(prev >= 0, prev[np.maximum(prev, 0)], -1))
+
+    for jump in reversed(jumps):
+        target = jump[node]
+        move = target >= 0
+        move[move] = idx[target[move]] >= window_start[move]
+        node = np.where(move, target, node)
+
+    levels[has_level] = values[node]
+    return levels
+
+
+# Vectorised version of detect_support_resistance over a whole series
+def detect_support_resistance_series(opens, closes, num_candles=100, tolerance=2.0):
+    """Returns (support, resistance) arrays with one entry per bar.
+
+    support[i] and resistance[i] equal detect_support_resistance(df.iloc[:i])
+    for that bar, with NaN where the function would return None.
+    """
+    length = len(closes)
+    resistance_idx, resistance_val, support_idx, support_val = find_reversals(opens, closes)
+
+    support = levels_from_reversals(support_idx, support_val, length, -1, num_candles, tolerance)
+    resistance = levels_from_reversals(resistance_idx, resistance_val, length, 1, num_candles, tolerance)
+    return support, resistance
@@ -0,0 +1,143 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from breakouts import CONFIRMATION_RULES, RESISTANCE_BREAKOUT, select_breakouts
+from sessions import utc_window_mask
+from support_resistance import find_reversals, levels_from_reversals
+
+# Default grid, the first value of each matches the current strategy
+NUM_CANDLES = (100, 50, 200)
+TOLERANCES = (2.0, 1.0, 5.0, None)
+SESSION_WINDOWS = ((10, 16), (7, 16), (12, 20), (0, 24))
+CONFIRMATIONS = CONFIRMATION_RULES
+
+# continuation_rate/mean_move: the candle after the breakout, NaN when the confirmation rule chose it
+# follow_rate/follow_move: the candle after that, the first one after a confirmed entry
+RESULT_COLUMNS = [
+    "num_candles", "tolerance", "session_start", "session_end", "confirmation",
+    "breakouts", "trades", "mean_size", "median_size", "continuation_rate", "mean_move",
+    "follow_rate", "follow_move",
+]
+
+# Shared arrays of the worker process, set once by _init_worker
+_DATA = {}
+
+
+def _init_worker(data):
+    _DATA.update(data)
+
+
+# Function to evaluate every session/confirmation setting for one level setting
+def _evaluate_levels(num_candles, tolerance, session_windows, confirmations):
+    opens = _DATA["opens"]
+    closes = _DATA["closes"]
+    length = len(closes)
+
+    # Reversal pairs are computed once for the whole sweep, only levels depend on the knobs
+    support = levels_from_reversals(_DATA["support_idx"], _DATA["support_val"], length, -1, num_candles, tolerance)
+    resistance = levels_from_reversals(_DATA["resistance_idx"], _DATA["resistance_val"], length, 1, num_candles, tolerance)
+
+    # Signed move of every candle, positive when it closes up
+    moves = closes - opens
+
+    results = []
+    for window, confirmation in itertools.product(session_windows, confirmations):
+        rows, codes = select_breakouts(opens, closes, support, resistance,
+                                       _DATA["sessions"][window], num_candles, confirmation)
+        breakouts = int(np.count_nonzero(codes))
+
+        # Outcome is the candle after the breakout, measured in the breakout's direction
+        direction = np.where(codes[rows] == RESISTANCE_BREAKOUT, 1.0, -1.0)
+        next_move = moves[rows + 1] * direction
+        next_size = np.abs(moves[rows + 1])
+
+        # The same_direction rule already fixes that candle, so also look one candle further;
+        # follow_* is measured after entry for every rule and is what settings are compared by
+        follow = rows + 2 < length
+        follow_move = moves[rows[follow] + 2] * direction[follow]
+
+        # The next candle only tells something when the rule did not pick it, confirmed rows get NaN
+        measured = len(rows) and confirmation == "none"
+
+        results.append({
+            "num_candles": num_candles,
+            "tolerance": tolerance,
+            "session_start": window[0],
+            "session_end": window[1],
+            "confirmation": confirmation,
+            "breakouts": breakouts,
+            "trades": len(rows),
+            "mean_size": next_size.mean() if len(rows) else np.nan,
+            "median_size": np.median(next_size) if len(rows) else np.nan,
+            "continuation_rate": (next_move > 0).mean() if measured else np.nan,
+            "mean_move": next_move.mean() if measured else np.nan,
+            "follow_rate": (follow_move > 0).mean() if len(follow_move) else np.nan,
+            "follow_move": follow_move.mean() if len(follow_move) else np.nan,
+        })
+    return results
+
+
+# Function to sweep breakout settings over one candle series in parallel
+def run_sweep(df, num_candles=NUM_CANDLES, tolerances=TOLERANCES, session_windows=SESSION_WINDOWS,
+              confirmations=CONFIRMATIONS, max_workers=None):
+    """Returns a results table with one row per parameter combination.
+
+    Work that does not depend on a knob is done once: reversal pairs, candle
+    moves and one session mask per window. Each worker process receives those
+    arrays once and then computes the levels for a (num_candles, tolerance)
+    pair, reusing them for every session window and confirmation rule.
+    """
+    opens = df["open"].to_numpy(dtype=np.float64)
+    closes = df["close"].to_numpy(dtype=np.float64)
+    resistance_idx, resistance_val, support_idx, support_val = find_reversals(opens, closes)
+
+    session_windows = [tuple(window) for window in session_windows]
+    data = {
+        "opens": opens,
+        "closes": closes,
+        "resistance_idx": resistance_idx,
+        "resistance_val": resistance_val,
+        "support_idx": support_idx,
+        "support_val": support_val,
+        "sessions": {window: utc_window_mask(df["time"], *window) for window in session_windows},
+    }
+
+    level_settings = list(itertools.product(num_candles, tolerances))
+    workers = min(max_workers or os.cpu_count() or 1, len(level_settings))
+
+    results = []
+    if workers <= 1:
+        _init_worker(data)
+        for n, tolerance in level_settings:
+            results.extend(_evaluate_levels(n, tolerance, session_windows, confirmations))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(data,)) as pool:
+            futures = [
+                pool.submit(_evaluate_levels, n, tolerance, session_windows, confirmations)
+                for n, tolerance in level_settings
+            ]
+            for future in futures:
+                results.extend(future.result())
+
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+
+# Function to order sweep results best first, by the move after entry
+def rank_results(results):
+    """follow_move and follow_rate come from the candle after the one a breakout is
+    confirmed on, so confirmed and unconfirmed settings are compared on equal terms."""
+    return results.sort_values(["follow_move", "follow_rate"], ascending=False, ignore_index=True)
+
+
+if __name__ == "__main__":
+    from candle_store import CandleStore
+
+    # Sweep the stored XAU_USD M30 candles, fill the store with fetch_multiple_data first
+    candles = CandleStore().load("XAU_USD", "M30", "M", "2024-01-01", "2025-01-01")
+    results = run_sweep(candles)
+    results.to_csv("sweep_results.csv", index=False)
+    print(rank_results(results).to_string(index=False))
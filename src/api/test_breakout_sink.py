@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+
+from breakout_sink import BreakoutSink, read_breakouts
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def make_rows(n, offset=0):
+    return pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=n, freq="30min", tz="UTC") + pd.Timedelta(days=offset),
+        "size": np.arange(n) + offset * 1000.0,
+        "breakout_type": np.where(np.arange(n) % 2, "support", "resistance"),
+    })
+
+
+def test_npz_parts_read_back_in_write_order(tmp_path):
+    folder = str(tmp_path / "breakouts")
+    with BreakoutSink(folder, format="npz", batch_size=7, flush_interval=0) as sink:
+        rows = make_rows(50)
+        for record in rows.to_dict("records"):
+            sink.add(record)
+        sink.add_frame(make_rows(5, offset=10))
+
+    expected = pd.concat([rows, make_rows(5, offset=10)], ignore_index=True)
+    pd.testing.assert_frame_equal(read_breakouts(folder), expected, check_dtype=False)
+
+
+def test_processes_sharing_a_folder_keep_every_part(tmp_path):
+    folder = str(tmp_path / "breakouts")
+    code = (
+        "import sys, pandas as pd\n"
+        "from breakout_sink import BreakoutSink\n"
+        "sink = BreakoutSink(sys.argv[1], format='npz', flush_interval=0)\n"
+        "for i in range(30):\n"
+        "    sink.add_frame(pd.DataFrame({'worker': [int(sys.argv[2])], 'part': [i]}))\n"
+        "sink.close()\n"
+    )
+    workers = [subprocess.Popen([sys.executable, "-c", code, folder, str(w)], cwd=HERE) for w in range(4)]
+    assert all(worker.wait(timeout=60) == 0 for worker in workers)
+
+    df = read_breakouts(folder)
+    assert len(df) == 4 * 30
+    assert not df.duplicated().any()
+    # Each process's parts come back in the order it wrote them
+    for _, parts in df.groupby("worker"):
+        assert parts["part"].tolist() == list(range(30))
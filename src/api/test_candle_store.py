@@ -0,0 +1,167 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import candle_store
+from candle_store import COLUMNS, HEADER_SIZE, CandleStore
+from mock_oanda import make_candles
+
+KEY = ("XAU_USD", "M30", "M")
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CandleStore(str(tmp_path))
+
+
+@pytest.fixture
+def candles():
+    return make_candles(1000, "2024-01-01")
+
+
+# Function to write candles[lo:hi] with the range they span as covered
+def write_rows(store, candles, lo, hi):
+    part = candles.iloc[lo:hi]
+    end = part["time"].iloc[-1] + pd.Timedelta(minutes=30)
+    store.write(*KEY, part, part["time"].iloc[0], end)
+
+
+# Function to check the store holds exactly these candles, sorted and without duplicates
+def assert_holds(store, expected):
+    stored = store.load(*KEY)
+    expected = expected.sort_values("time", kind="stable").drop_duplicates("time", keep="last").reset_index(drop=True)
+    pd.testing.assert_frame_equal(stored, expected[list(COLUMNS)], check_dtype=False)
+
+
+def test_appends_are_written_in_place(store, candles, monkeypatch):
+    write_rows(store, candles, 0, 400)
+    # Appending must not rewrite the stored candles
+    monkeypatch.setattr(candle_store, "_copy_rows", lambda *args: pytest.fail("stored candles were copied"))
+    write_rows(store, candles, 400, 700)
+    write_rows(store, candles, 700, 1000)
+    assert_holds(store, candles)
+
+
+def test_appends_do_not_load_the_stored_candles(store, candles, monkeypatch):
+    write_rows(store, candles, 0, 400)
+    loads = []
+    load = store.load_arrays
+    monkeypatch.setattr(store, "load_arrays", lambda *args, **kwargs: loads.append(kwargs) or load(*args, **kwargs))
+    write_rows(store, candles, 400, 1000)
+    assert all(kwargs.get("mmap", True) for kwargs in loads)
+
+
+def test_prepend_and_insert_keep_the_series_sorted(store, candles):
+    write_rows(store, candles, 600, 1000)
+    write_rows(store, candles, 0, 200)
+    write_rows(store, candles, 300, 500)
+    write_rows(store, candles, 200, 300)
+    write_rows(store, candles, 500, 600)
+    assert_holds(store, candles)
+
+
+def test_overlap_keeps_the_newest_copy(store, candles):
+    write_rows(store, candles, 0, 600)
+    revised = candles.iloc[500:800].copy()
+    revised["close"] += 1.0
+    revised["volume"] += 7
+    write_rows(store, revised, 0, len(revised))
+    write_rows(store, candles, 100, 200)
+    assert_holds(store, pd.concat([candles.iloc[:800], revised]))
+
+
+def test_columns_keep_their_header_and_load_like_np_save(store, candles, tmp_path):
+    write_rows(store, candles, 0, 500)
+    write_rows(store, candles, 500, 1000)
+    folder = tmp_path / "XAU_USD" / "M30" / "M"
+    for name, dtype in COLUMNS.items():
+        assert candle_store._data_offset(str(folder / f"{name}.npy")) == HEADER_SIZE
+        values = np.load(folder / f"{name}.npy")
+        assert values.dtype == dtype and len(values) == 1000
+
+
+def test_np_save_columns_are_upgraded_on_the_next_write(store, candles, tmp_path):
+    folder = tmp_path / "XAU_USD" / "M30" / "M"
+    folder.mkdir(parents=True)
+    first = candles.iloc[:400]
+    np.save(folder / "time.npy", pd.DatetimeIndex(first["time"]).as_unit("ns").asi8)
+    for name, dtype in COLUMNS.items():
+        if name != "time":
+            np.save(folder / f"{name}.npy", first[name].to_numpy(dtype=dtype))
+
+    write_rows(store, candles, 400, 1000)
+    assert candle_store._data_offset(str(folder / "close.npy")) == HEADER_SIZE
+    assert_holds(store, candles)
+
+
+# Function to serve candles like fetch_historical_data, recording every (from, to) asked for
+def make_download(candles, calls, fail_after=None):
+    def download(from_str, to_str):
+        if fail_after is not None and len(calls) >= fail_after:
+            return None
+        calls.append((from_str, to_str))
+        return candles[(candles["time"] >= from_str) & (candles["time"] < to_str)]
+    return download
+
+
+def test_sync_downloads_only_the_gaps_and_records_coverage(store, tmp_path):
+    candles = make_candles(start="2024-01-01", end="2024-01-22")
+    calls = []
+    download = make_download(candles, calls)
+
+    assert store.sync(*KEY, "2024-01-08", "2024-01-15", download)
+    assert calls == [("2024-01-08T00:00:00Z", "2024-01-15T00:00:00Z")]
+
+    calls.clear()
+    assert store.sync(*KEY, "2024-01-01", "2024-01-22", download)
+    assert calls == [("2024-01-01T00:00:00Z", "2024-01-08T00:00:00Z"),
+                     ("2024-01-15T00:00:00Z", "2024-01-22T00:00:00Z")]
+    assert store.coverage(*KEY) == [[candle_store.to_epoch_ns("2024-01-01"), candle_store.to_epoch_ns("2024-01-22")]]
+    assert (tmp_path / "XAU_USD" / "M30" / "M" / "coverage.json").exists()
+    assert_holds(store, candles)
+
+    # Weekends hold no candles but are covered, so nothing is asked for again
+    calls.clear()
+    assert store.sync(*KEY, "2024-01-05", "2024-01-20", download)
+    assert calls == []
+
+
+def test_get_returns_the_range_from_the_store(store):
+    candles = make_candles(start="2024-01-01", end="2024-01-15")
+    calls = []
+    result = store.get(*KEY, "2024-01-03", "2024-01-10", make_download(candles, calls))
+    expected = candles[(candles["time"] >= "2024-01-03") & (candles["time"] < "2024-01-10")]
+    pd.testing.assert_frame_equal(result, expected.reset_index(drop=True), check_dtype=False)
+    assert len(calls) == 1
+
+
+def test_max_candles_splits_long_gaps(store):
+    candles = make_candles(start="2024-01-01", end="2024-01-05")
+    calls = []
+    assert store.sync(*KEY, "2024-01-01", "2024-01-05", make_download(candles, calls), max_candles=48)
+    assert [to for _, to in calls] == ["2024-01-02T00:00:00Z", "2024-01-03T00:00:00Z",
+                                       "2024-01-04T00:00:00Z", "2024-01-05T00:00:00Z"]
+    assert_holds(store, candles)
+
+
+def test_failed_download_is_not_covered(store):
+    candles = make_candles(start="2024-01-01", end="2024-01-05")
+    calls = []
+    assert not store.sync(*KEY, "2024-01-01", "2024-01-05", make_download(candles, calls, fail_after=2),
+                          max_candles=48)
+    assert store.missing_ranges(*KEY, "2024-01-01", "2024-01-05") == [
+        (candle_store.to_epoch_ns("2024-01-03"), candle_store.to_epoch_ns("2024-01-05"))]
+
+    calls.clear()
+    assert store.sync(*KEY, "2024-01-01", "2024-01-05", make_download(candles, calls))
+    assert calls == [("2024-01-03T00:00:00Z", "2024-01-05T00:00:00Z")]
+    assert_holds(store, candles)
+
+
+def test_the_forming_candle_is_never_covered(store):
+    now = pd.Timestamp.now(tz="UTC").floor("30min")
+    candles = make_candles(start=now - pd.Timedelta(hours=5), end=now + pd.Timedelta(minutes=30), weekends=True)
+    store.write(*KEY, candles, candles["time"].iloc[0], now + pd.Timedelta(minutes=30))
+
+    assert store.load(*KEY)["time"].iloc[-1] < now
+    assert store.missing_ranges(*KEY, now - pd.Timedelta(hours=1), now + pd.Timedelta(minutes=30))
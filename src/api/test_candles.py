@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+import candles as candles_module
+from candle_cache import CandleCache, next_candle_close
+from candles import Candles
+from mock_oanda import MockOandaServer, make_candles
+
+
+@pytest.fixture
+def mock():
+    candles = make_candles(500)
+    with MockOandaServer({("XAU_USD", "M30"): candles}) as server:
+        yield server, candles
+
+
+def make_cc(server):
+    # Own response cache, the class one is shared by every instance
+    cc = Candles()
+    cc.api = server.api()
+    cc.cache = CandleCache()
+    return cc
+
+
+def test_accessors_share_one_fetch(mock):
+    server, candles = mock
+    cc = make_cc(server)
+    newest = candles.iloc[::-1].reset_index(drop=True)
+
+    for shift in range(10):
+        assert cc.getOpen(shift) == newest["open"][shift]
+        assert cc.getHigh(shift) == newest["high"][shift]
+        assert cc.getLow(shift) == newest["low"][shift]
+        assert cc.getClose(shift) == newest["close"][shift]
+        assert cc.getVolume(shift) == newest["volume"][shift]
+        assert cc.isBullish(shift) == (newest["close"][shift] >= newest["open"][shift])
+    assert server.request_count == 1
+
+
+def test_deeper_shift_fetches_again_and_keeps_the_series(mock):
+    server, candles = mock
+    cc = make_cc(server)
+    cc.series_size = 5
+    cc.getClose(0)
+    assert cc.getClose(20) == candles["close"].to_numpy()[::-1][20]
+    cc.getClose(3)
+    assert server.request_count == 2
+    assert len(cc.getSeries(0)) == 21
+
+
+def test_changing_instrument_or_granularity_drops_the_series(mock):
+    server, candles = mock
+    cc = make_cc(server)
+    cc.setUseCache(True)
+    cc.getClose(0)
+    cc.setGranularity("M30")
+    assert cc.series is None
+    # Reloaded from the response cache, the candle has not closed yet
+    assert np.isclose(cc.getClose(1), candles["close"].to_numpy()[-2])
+    assert server.request_count == 1
+
+
+def test_series_is_fetched_again_once_its_candle_closes(mock, monkeypatch):
+    server, candles = mock
+    cc = make_cc(server)
+    now = 1_700_000_100.0
+    monkeypatch.setattr(candles_module, "time", SimpleNamespace(time=lambda: now))
+    cc.getClose(0)
+    cc.getClose(1)
+    assert server.request_count == 1
+
+    now = next_candle_close("M30", now)
+    cc.getClose(0)
+    assert server.request_count == 2
+
+
+def test_use_cache_off_skips_the_shared_responses(mock):
+    server, candles = mock
+    cc = make_cc(server)
+    cc.setUseCache(True)
+    cc.getClose(0)
+    other = make_cc(server)
+    other.cache = cc.cache
+    other.setUseCache(True)
+    other.getClose(0)
+    assert server.request_count == 1
+
+    # Turning the cache off drops the loaded series and asks OANDA again
+    other.setUseCache(False)
+    other.getClose(0)
+    assert server.request_count == 2
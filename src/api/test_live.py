@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from breakouts import TRAINING_COLUMNS, build_training_table
+from live import LiveBreakoutEngine
+from mock_oanda import MockOandaServer, ReplayClock, make_candles
+
+NUM_CANDLES = 100
+
+
+# Function to record confirmed breakouts as the rows build_training_table gives
+def make_recorder(rows):
+    def on_confirmed(candle, candle1, candle2, candle3, candle4, breakout_type, support, resistance):
+        rows.append({
+            "time": candle["time"],
+            "size": abs(candle["close"] - candle["open"]),
+            "volume": candle["volume"],
+            **{f"Candle{i}Size": abs(c["close"] - c["open"]) for i, c in enumerate([candle1, candle2, candle3, candle4], 1)},
+            "breakout_type": breakout_type,
+            "support_level": np.nan if support is None else support,
+            "resistance_level": np.nan if resistance is None else resistance,
+        })
+    return on_confirmed
+
+
+# Function to check the live rows against the table rows confirmed after since
+def assert_matches_table(rows, candles, since, until=None, confirmation="same_direction"):
+    table = build_training_table(candles.reset_index(drop=True), NUM_CANDLES, confirmation=confirmation)
+    expected = table[table["time"] > since]
+    if until is not None:
+        expected = expected[expected["time"] <= until]
+    assert len(expected) > 0
+
+    live = pd.DataFrame(rows, columns=TRAINING_COLUMNS)
+    pd.testing.assert_frame_equal(live.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.parametrize("confirmation", ["same_direction", "none"])
+def test_streamed_candles_give_the_training_table_rows(confirmation):
+    candles = make_candles(start="2024-03-04", end="2024-03-30", seed=7)
+    rows = []
+    live = LiveBreakoutEngine(None, "XAU_USD", num_candles=NUM_CANDLES, confirmation=confirmation,
+                              on_confirmed=make_recorder(rows))
+
+    # What bootstrap() fetches, then the rest a few candles per poll
+    boot = NUM_CANDLES + 4
+    live.process(candles.iloc[:boot], report=False)
+    for start in range(boot, len(candles), 7):
+        live.process(candles.iloc[start:start + 7])
+
+    assert_matches_table(rows, candles, candles["time"].iloc[boot - 1], confirmation=confirmation)
+
+
+def test_replay_from_the_mock_server_gives_the_training_table_rows():
+    candles = make_candles(start="2024-03-04", end="2024-03-30", seed=7)
+    start = pd.Timestamp("2024-03-08T12:00:00Z")
+    clock = ReplayClock(start, speed=180_000)
+    rows = []
+
+    with MockOandaServer({("XAU_USD", "M30"): candles}, clock=clock.time) as server:
+        live = LiveBreakoutEngine(server.api(), "XAU_USD", num_candles=NUM_CANDLES, clock=clock.time,
+                                  sleep=clock.sleep, on_confirmed=make_recorder(rows))
+        assert live.run(max_candles=200) >= 200
+
+    # Bootstrap ends with the last candle completed at start, breakouts before it are not reported
+    assert_matches_table(rows, candles, start - pd.Timedelta(minutes=30), until=live.last_time)
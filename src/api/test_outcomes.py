@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from breakouts import build_training_table
+from mock_oanda import make_candles
+from outcomes import simulate_outcomes, summarize_outcomes
+
+
+def make_bars(rows):
+    return pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=len(rows), freq="30min", tz="UTC"),
+        **{name: [row[i] for row in rows] for i, name in enumerate(["open", "high", "low", "close"])},
+    })
+
+
+def make_trade(time, breakout_type, predicted_size):
+    return pd.DataFrame({"time": [time], "breakout_type": [breakout_type], "size": [99.0],
+                         "predicted_size": [predicted_size]})
+
+
+def test_trades_enter_at_the_close_of_the_confirmation_candle():
+    candles = make_bars([
+        (100, 110, 99, 109),   # confirmation candle, reaching what would be TP from its open
+        (109, 111, 108, 110),
+        (110, 113, 109, 112),  # TP 109 + 3
+    ])
+    trade = make_trade(candles["time"][0], "resistance", 3.0)
+    result = simulate_outcomes(trade, candles).iloc[0]
+
+    assert result["entry_price"] == 109
+    assert result["outcome"] == "tp"
+    assert result["exit_bar"] == 1
+    assert result["exit_price"] == 112
+
+
+def test_a_gap_through_the_stop_fills_at_the_open():
+    candles = make_bars([
+        (100, 101, 95, 96),
+        (90, 91, 88, 89),  # opens below the long's stop at 94
+    ])
+    result = simulate_outcomes(make_trade(candles["time"][0], "resistance", 2.0), candles).iloc[0]
+    assert result["outcome"] == "sl"
+    assert result["exit_price"] == 90
+
+
+def test_missing_next_candle_or_size_is_not_traded():
+    candles = make_bars([(100, 101, 99, 100), (100, 101, 99, 100)])
+    assert simulate_outcomes(make_trade(candles["time"][1], "support", 1.0), candles)["outcome"][0] == "missing"
+    assert simulate_outcomes(make_trade(candles["time"][0], "support", np.nan), candles)["outcome"][0] == "missing"
+
+
+def test_the_logged_size_is_refused():
+    candles = make_bars([(100, 101, 99, 100), (100, 101, 99, 100)])
+    with pytest.raises(ValueError):
+        simulate_outcomes(make_trade(candles["time"][0], "support", 1.0), candles, size_column="size")
+
+
+def test_outcomes_do_not_close_on_the_confirmation_candle():
+    candles = make_candles(20_000)
+    trades = build_training_table(candles)
+    # A size known at entry: the breakout candle's own move
+    trades["predicted_size"] = trades["Candle1Size"].clip(lower=0.5)
+    results = simulate_outcomes(trades, candles)
+
+    assert (results["outcome"] != "missing").all()
+    assert results["exit_bar"].max() > 0
+    assert summarize_outcomes(results)["tp_rate"].between(0.2, 0.8).all()
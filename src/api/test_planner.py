@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from candle_store import to_epoch_ns
+from planner import plan_requests
+
+CLOSE = pd.Timedelta(days=4, hours=22)
+OPEN = pd.Timedelta(days=6, hours=21)
+
+
+# Function to list every candle of a given alignment that overlaps trading time (outside the weekly closure)
+def trading_candles(start, end, step, phase):
+    times = pd.date_range(pd.Timestamp(start) + phase - step, end, freq=step, tz="UTC")
+    offset = times - times.normalize() + pd.to_timedelta(times.dayofweek, unit="D")
+    inside = (offset >= CLOSE) & (offset + step <= OPEN)
+    return times[~inside].asi8
+
+
+@pytest.mark.parametrize("granularity, minutes", [("M30", 30), ("H4", 240)])
+@pytest.mark.parametrize("phase_minutes", [0, 7, 29])
+def test_no_request_goes_over_the_limit_whatever_the_alignment(granularity, minutes, phase_minutes):
+    step = pd.Timedelta(minutes=minutes)
+    start, end = "2024-01-03T05:00:00Z", "2024-03-20T00:00:00Z"
+    candles = trading_candles(start, end, step, pd.Timedelta(minutes=phase_minutes))
+
+    plan = plan_requests("XAU_USD", granularity, start, end, max_candles=100)
+    assert plan[0][0] == "2024-01-03T05:00:00Z" and plan[-1][1] == "2024-03-20T00:00:00Z"
+    for from_time, to_time in plan:
+        # OANDA returns the candles that start in [from, to)
+        returned = np.count_nonzero((candles >= to_epoch_ns(from_time)) & (candles < to_epoch_ns(to_time)))
+        assert returned <= 100
+
+
+def test_weekend_is_folded_into_the_neighbouring_requests():
+    assert plan_requests("XAU_USD", "M30", "2024-01-06T00:00:00Z", "2024-01-07T00:00:00Z") == []
+    plan = plan_requests("XAU_USD", "M30", "2024-01-05T21:00:00Z", "2024-01-07T22:00:00Z", max_candles=3)
+    # 21:00 and 21:30 Friday and 21:00 Sunday fill the first request, the closed slots between cost nothing
+    assert plan == [("2024-01-05T21:00:00Z", "2024-01-07T21:30:00Z"),
+                    ("2024-01-07T21:30:00Z", "2024-01-07T22:00:00Z")]
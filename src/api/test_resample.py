@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import get_training
+from candle_cache import CandleCache
+from candles import Candles
+from mock_oanda import MockOandaServer, make_candles
+from resample import Resampler, resample_arrays, resample_candles, session_bars
+
+
+@pytest.fixture
+def candles():
+    return make_candles(start="2023-12-29", end="2024-01-20")
+
+
+def test_a_bar_the_data_starts_partway_through_is_incomplete(candles):
+    # 2024-01-01 22:00Z is the D bar's start (17:00 New York), the data starts at 23:00Z
+    late = candles[candles["time"] >= "2024-01-01T23:00:00Z"]
+    bars = resample_arrays(late, "D")
+    assert bars["time"][0] == pd.Timestamp("2024-01-01T22:00:00Z").value
+    assert not bars["complete"][0]
+
+    full = resample_candles(candles, "D")
+    partial = resample_candles(late, "D")
+    assert partial["time"].iloc[0] == pd.Timestamp("2024-01-02T22:00:00Z")
+    pd.testing.assert_frame_equal(partial, full[full["time"] >= "2024-01-02T22:00:00Z"].reset_index(drop=True))
+
+
+def test_data_start_marks_a_bar_without_early_candles_complete(candles):
+    # No candles between the bar start and 23:00Z, but the data was asked for from the bar start
+    late = candles[candles["time"] >= "2024-01-01T23:00:00Z"]
+    bars = resample_arrays(late, "D", data_start="2024-01-01T22:00:00Z")
+    assert bars["complete"][0]
+    assert not session_bars(late, "london", data_start="2024-01-02T09:00:00Z").empty
+
+
+def test_resampler_never_emits_a_partial_first_bar(candles):
+    late = candles[candles["time"] >= "2024-01-03T01:30:00Z"]
+    resampler = Resampler("H4")
+    emitted = pd.concat([resampler.update(late.iloc[i:i + 5]) for i in range(0, len(late), 5)], ignore_index=True)
+    pd.testing.assert_frame_equal(emitted, resample_candles(late, "H4"))
+    assert emitted["time"].iloc[0] == pd.Timestamp("2024-01-03T02:00:00Z")
+
+
+@pytest.mark.parametrize("granularity", ["H4", "D"])
+def test_fetch_multiple_data_fetches_back_to_the_first_bar(candles, monkeypatch, granularity):
+    requested = []
+
+    def fetch_historical_data(start_time, end_time, granularity="M30"):
+        requested.append(start_time)
+        return candles[(candles["time"] >= start_time) & (candles["time"] < end_time)].reset_index(drop=True)
+
+    monkeypatch.setattr(get_training, "fetch_historical_data", fetch_historical_data)
+    bars = get_training.fetch_multiple_data("2024-01-03", "2024-01-12", granularity)
+
+    assert min(requested) < "2024-01-03"
+    full = resample_candles(candles, granularity)
+    first = bars["time"].iloc[0]
+    # The bar holding the start, every bar whole
+    assert first <= pd.Timestamp("2024-01-03", tz="UTC") < first + pd.Timedelta(hours=4 if granularity == "H4" else 24)
+    expected = full[(full["time"] >= first) & (full["time"] <= bars["time"].iloc[-1])].reset_index(drop=True)
+    pd.testing.assert_frame_equal(bars, expected, check_dtype=False)
+
+
+def test_candles_build_whole_daily_bars_over_a_range(candles):
+    with MockOandaServer({("XAU_USD", "M30"): candles}) as server:
+        cc = Candles()
+        cc.api = server.api()
+        cc.cache = CandleCache()
+        series = cc.getResampledSeriesByTime("D", "2024-01-03T05:00:00Z", "2024-01-12T00:00:00Z")
+
+    full = resample_candles(candles, "D")
+    oldest = pd.Timestamp(series.getTime(len(series) - 1), tz="UTC")
+    assert oldest == pd.Timestamp("2024-01-02T22:00:00Z")
+    row = full[full["time"] == oldest].iloc[0]
+    assert series.getOpen(len(series) - 1) == pytest.approx(row["open"])
+    assert series.getVolume(len(series) - 1) == row["volume"]
+    assert np.all(np.diff(series.time.astype(np.int64)) < 0)
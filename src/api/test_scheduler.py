@@ -0,0 +1,104 @@
+import time
+
+import pytest
+from oandapyV20.endpoints.instruments import InstrumentsCandles
+from oandapyV20.exceptions import V20Error
+
+from mock_oanda import MockOandaServer, make_candles
+from scheduler import BACKFILL, LIVE, RequestScheduler
+
+
+@pytest.fixture
+def candles():
+    return {("XAU_USD", "M30"): make_candles(500)}
+
+
+def endpoint(instrument="XAU_USD"):
+    return InstrumentsCandles(instrument=instrument, params={"granularity": "M30", "count": 5})
+
+
+def test_full_burst_stays_under_the_server_limit(candles):
+    # The server allows 22 at once, the scheduler's burst of 20 plus 8 held tokens would go over
+    with MockOandaServer(candles, rate_limit=22) as server, \
+            RequestScheduler(server.api(), rate=20, burst=20, max_in_flight=8, max_retries=0) as scheduler:
+        # Idle workers must not be holding tokens when the burst comes
+        time.sleep(1.0)
+
+        futures = [scheduler.submit(endpoint()) for _ in range(40)]
+        responses = [future.result(timeout=30) for future in futures]
+
+        assert all(len(response["candles"]) == 5 for response in responses)
+        assert server.throttled_count == 0
+        assert scheduler.stats()["failed"] == 0
+
+
+def test_429s_are_backed_off_and_retried(candles):
+    with MockOandaServer(candles, rate_limit=5) as server, \
+            RequestScheduler(server.api(), rate=100, burst=20, max_retries=10,
+                                     base_backoff=0.05, max_backoff=0.5) as scheduler:
+        futures = [scheduler.submit(endpoint()) for _ in range(20)]
+        assert all(len(future.result(timeout=60)["candles"]) == 5 for future in futures)
+
+        stats = scheduler.stats()
+        assert server.throttled_count > 0
+        assert stats["throttled"] == server.throttled_count
+        assert stats["retries"] == server.throttled_count
+        assert stats["succeeded"] == 20 and stats["failed"] == 0
+
+
+def test_retries_run_out_with_the_servers_error(candles):
+    with MockOandaServer(candles, rate_limit=1) as server, \
+            RequestScheduler(server.api(), rate=100, burst=20, max_retries=1, base_backoff=0.01) as scheduler:
+        futures = [scheduler.submit(endpoint()) for _ in range(5)]
+        errors = [future.exception(timeout=30) for future in futures]
+
+        assert any(isinstance(error, V20Error) and error.code == 429 for error in errors)
+        assert scheduler.stats()["failed"] == sum(error is not None for error in errors)
+
+
+def test_client_errors_are_not_retried(candles):
+    with MockOandaServer(candles) as server, \
+            RequestScheduler(server.api(), max_retries=5) as scheduler:
+        with pytest.raises(V20Error):
+            scheduler.client(BACKFILL).request(endpoint("EUR_USD"))
+        assert scheduler.stats()["retries"] == 0
+        assert server.request_count == 1
+
+
+def test_live_requests_jump_the_backfill_queue(candles):
+    with MockOandaServer(candles) as server, \
+            RequestScheduler(server.api(), rate=10, burst=1, max_in_flight=1) as scheduler:
+        backfill = [scheduler.submit(endpoint(), BACKFILL) for _ in range(20)]
+        live = scheduler.submit(endpoint(), LIVE)
+
+        live.result(timeout=30)
+        assert sum(future.done() for future in backfill) <= 3
+        for future in backfill:
+            future.result(timeout=30)
+
+
+def test_close_stops_the_workers_and_cancels_retries(candles):
+    with MockOandaServer(candles, rate_limit=1) as server:
+        scheduler = RequestScheduler(server.api(), rate=100, burst=20, max_in_flight=1, max_retries=5)
+        scheduler._backoff = lambda attempt: 10.0
+        futures = [scheduler.submit(endpoint()) for _ in range(2)]
+        # The first request gets through, the second is throttled and waits 10s to be retried
+        futures[0].result(timeout=30)
+        deadline = time.monotonic() + 30
+        while scheduler.stats()["waiting_retry"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        started = time.monotonic()
+        scheduler.close()
+        assert time.monotonic() - started < 5
+        assert not any(worker.is_alive() for worker in scheduler.workers)
+        assert futures[1].cancelled()
+        with pytest.raises(RuntimeError):
+            scheduler.submit(endpoint())
+
+
+def test_close_finishes_the_queued_requests_first(candles):
+    with MockOandaServer(candles) as server:
+        with RequestScheduler(server.api(), rate=50, burst=1, max_in_flight=1) as scheduler:
+            futures = [scheduler.submit(endpoint()) for _ in range(5)]
+        assert all(future.done() and not future.cancelled() for future in futures)
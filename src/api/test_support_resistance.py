@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ai_get_training
+import get_training
+from support_resistance import SupportResistanceEngine, detect_support_resistance_series
+
+# Original loops, the reference every faster version has to match
+REFERENCE = {2.0: get_training.detect_support_resistance, None: ai_get_training.detect_support_resistance}
+
+
+# Function to make breakout_data.csv-style candles: XAU_USD prices in cents, some dojis, close levels that repeat
+def make_candles(n, seed):
+    rng = np.random.default_rng(seed)
+    close = np.round(1900 + np.cumsum(rng.choice([-1.5, -0.5, 0.0, 0.5, 1.5], n)), 2)
+    open_ = np.r_[close[0], close[:-1]]
+    doji = rng.random(n) < 0.1
+    open_[doji] = close[doji]
+    return pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=n, freq="30min", tz="UTC"),
+        "open": open_,
+        "close": close,
+    })
+
+
+def as_level(value):
+    return None if np.isnan(value) else value
+
+
+@pytest.mark.parametrize("tolerance", [2.0, None])
+@pytest.mark.parametrize("num_candles", [10, 40])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_series_and_engine_match_the_loop(tolerance, num_candles, seed):
+    df = make_candles(200, seed)
+    opens = df["open"].to_numpy()
+    closes = df["close"].to_numpy()
+    support, resistance = detect_support_resistance_series(opens, closes, num_candles, tolerance)
+    engine = SupportResistanceEngine(num_candles=num_candles, tolerance=tolerance)
+
+    # Bars before num_candles see a window shorter than num_candles
+    for i in range(len(df)):
+        expected = REFERENCE[tolerance](df.iloc[:i], num_candles)
+        assert (as_level(support[i]), as_level(resistance[i])) == expected, i
+        assert engine.levels() == expected, i
+        engine.update(opens[i], closes[i])
+
+
+def test_dojis_make_no_levels():
+    df = make_candles(60, 3)
+    df["open"] = df["close"]
+    support, resistance = detect_support_resistance_series(df["open"].to_numpy(), df["close"].to_numpy(), 20)
+    assert np.isnan(support).all() and np.isnan(resistance).all()
+    assert get_training.detect_support_resistance(df, 20) == (None, None)
+
+
+def test_series_handles_fewer_candles_than_the_window():
+    df = make_candles(5, 4)
+    support, resistance = detect_support_resistance_series(df["open"].to_numpy(), df["close"].to_numpy(), 100)
+    for i in range(len(df)):
+        assert (as_level(support[i]), as_level(resistance[i])) == get_training.detect_support_resistance(df.iloc[:i])
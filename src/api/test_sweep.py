@@ -0,0 +1,22 @@
+import numpy as np
+
+from mock_oanda import make_candles
+from sweep import rank_results, run_sweep
+
+
+def test_confirmed_rows_are_not_scored_on_the_candle_they_were_picked_by():
+    results = run_sweep(make_candles(20_000), num_candles=(100,), tolerances=(2.0,),
+                        session_windows=((10, 16), (0, 24)), max_workers=1)
+
+    confirmed = results[results["confirmation"] == "same_direction"]
+    unconfirmed = results[results["confirmation"] == "none"]
+    assert confirmed["continuation_rate"].isna().all() and confirmed["mean_move"].isna().all()
+    assert unconfirmed["continuation_rate"].notna().all()
+    assert results["follow_rate"].between(0, 1).all()
+
+
+def test_results_are_ranked_by_the_move_after_entry():
+    results = run_sweep(make_candles(20_000), num_candles=(100, 50), tolerances=(2.0, None),
+                        session_windows=((10, 16),), max_workers=1)
+    ranked = rank_results(results)
+    assert np.all(np.diff(ranked["follow_move"].to_numpy()) <= 0)
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_importing_the_scripts_starts_no_threads():
+    # A fresh interpreter, this one already has threads from other tests
+    code = (
+        "import threading, get_training, ai_get_training\n"
+        "assert threading.active_count() == 1, threading.enumerate()\n"
+        "for module in (get_training, ai_get_training):\n"
+        "    assert module.SCHEDULER is None and module.BREAKOUT_SINK is None\n"
+    )
+    subprocess.run([sys.executable, "-c", code], cwd=HERE, check=True)
+
+
+def test_scheduler_and_sink_are_created_once(tmp_path, monkeypatch):
+    import get_training
+
+    monkeypatch.setattr(get_training, "BREAKOUT_CSV", str(tmp_path / "data.csv"))
+    monkeypatch.setattr(get_training, "BREAKOUT_SINK", None)
+    monkeypatch.setattr(get_training, "SCHEDULER", None)
+
+    sink = get_training.get_breakout_sink()
+    scheduler = get_training.get_scheduler()
+    assert get_training.get_breakout_sink() is sink
+    assert get_training.get_scheduler() is scheduler
+    assert sink.path == str(tmp_path / "data.csv")
+    sink.close()
+
+    get_training.close_scheduler()
+    assert get_training.SCHEDULER is None
+    assert not any(worker.is_alive() for worker in scheduler.workers)
@@ -1,67 +1,73 @@
 import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 import matplotlib.pyplot as plt
+from model_registry import ModelRegistry
+from training import evaluate_walk_forward, load_features
+from tuning import tune_hyperparameters
 
 # Step 1: Load the Data
-# data = pd.read_csv('breakout_data.csv')
-data = pd.read_csv('data.csv')
-
 # Step 2: Preprocess the Data
-# Drop the 'time' column as it's not useful for prediction
-data = data.drop(columns=['time'])
+# Rows are sorted by time and encoded once ('time' dropped, 'breakout_type' one-hot),
+# the matrix is cached next to the CSV until the CSV changes
+# features = load_features('breakout_data.csv')
+features = load_features('data.csv')
 
-# Convert categorical 'breakout_type' to numerical using one-hot encoding
-data = pd.get_dummies(data, columns=['breakout_type'], drop_first=True)
+pd.set_option('display.width', 200)
 
-# Define features (X) and target (y)
-X = data.drop(columns=['size'])
-y = data['size']
+# Set to True to search the model settings first (slow, every core), the best ones are then trained
+TUNE = False
 
 # Step 3: Split the Data
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-
 # Step 4: Train the Model
-model = RandomForestRegressor(random_state=42)
-model.fit(X_train, y_train)
+# Tuning scores candidates on walk-forward folds with successive halving, the leaderboard shows
+# error against fit time and live prediction latency; params are left at the defaults otherwise
+params = {}
+if TUNE:
+    leaderboard = tune_hyperparameters(features)
+    print(leaderboard.drop(columns='params').to_string(index=False))
+    params = leaderboard['params'][0]
 
-# Step 5: Evaluate the Model
-y_pred = model.predict(X_test)
+# The registry keeps the fitted model between runs: unchanged data reuses it,
+# newly appended breakouts only add trees (warm_start), anything else retrains
+registry = ModelRegistry('models')
+model, meta, action = registry.train('size', features, n_jobs=-1, **params)
+print(f'Model version {meta["version"]}: {action} ({meta["trees"]} trees, {meta["rows"]} rows)')
 
-# Calculate evaluation metrics
-mse = mean_squared_error(y_test, y_pred)
-rmse = mse ** 0.5  # Root Mean Squared Error
-mae = mean_absolute_error(y_test, y_pred)
-r2 = r2_score(y_test, y_pred)
+# Step 5: Evaluate the Model
+# Walk-forward folds: each trains only on earlier breakouts and tests on the next ones,
+# so no future data leaks into training. The folds train in parallel, one core each.
+# Skipped when the model did not change, nothing new to report then.
+if action != 'unchanged':
+    report, predictions = evaluate_walk_forward(features, n_splits=5, **params)
 
-# Print the metrics
-print(f'Mean Squared Error (MSE): {mse}')
-print(f'Root Mean Squared Error (RMSE): {rmse}')
-print(f'Mean Absolute Error (MAE): {mae}')
-print(f'R² Score (Coefficient of Determination): {r2}')
+    # Print the metrics per fold, the last row is the mean
+    print(report.to_string(index=False))
 
+    mean = report.iloc[-1]
+    print(f'Mean Squared Error (MSE): {mean["mse"]}')
+    print(f'Root Mean Squared Error (RMSE): {mean["rmse"]}')
+    print(f'Mean Absolute Error (MAE): {mean["mae"]}')
+    print(f'R² Score (Coefficient of Determination): {mean["r2"]}')
 
 # Step 6: Make Predictions
-# Example: Predict the size of a new candle
-# new_data = pd.DataFrame({
-#     'volume': [2441],
-#     'Candle1Size': [5.4849999999999],
-#     'Candle2Size': [1.900000000000091],
-#     'Candle3Size': [1.5199999999999818],
-#     'Candle4Size': [9.710000000000036],
-#     'support_level': [1830.02],
-#     'resistance_level': [1863.9],
-#     'breakout_type_support': [1]  # Assuming 'support' is encoded as 1
-# })
-
-# predicted_size = model.predict(new_data)
-# print(f'Predicted Size: {predicted_size[0]}')
+# Example: Predict the size of a new candle with the saved model
+new_data = pd.DataFrame({
+    'volume': [2441],
+    'Candle1Size': [5.4849999999999],
+    'Candle2Size': [1.900000000000091],
+    'Candle3Size': [1.5199999999999818],
+    'Candle4Size': [9.710000000000036],
+    'support_level': [1830.02],
+    'resistance_level': [1863.9],
+    'breakout_type': ['support']
+})
 
+predicted_size = registry.predict('size', new_data)
+print(f'Predicted Size: {predicted_size[0]}')
 
 
-plt.scatter(y_test, y_pred)
-plt.xlabel('Actual Size')
-plt.ylabel('Predicted Size')
-plt.title('Actual vs Predicted Size')
-plt.show()
\ No newline at end of file
+if action != 'unchanged':
+    plt.scatter(predictions['actual'], predictions['predicted'], s=4)
+    plt.xlabel('Actual Size')
+    plt.ylabel('Predicted Size')
+    plt.title('Actual vs Predicted Size')
+    plt.show()
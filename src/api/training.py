@@ -0,0 +1,157 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+from sklearn.model_selection import TimeSeriesSplit
+
+from breakout_sink import read_breakouts
+
+# Model inputs in the order train_model.py has always used (get_dummies puts the dummy last)
+FEATURE_COLUMNS = [
+    "volume", "Candle1Size", "Candle2Size", "Candle3Size", "Candle4Size",
+    "support_level", "resistance_level", "breakout_type_support",
+]
+TARGET_COLUMN = "size"
+
+# Walk-forward defaults: folds, and training rows kept (None keeps every earlier row)
+N_SPLITS = 5
+MAX_TRAIN_SIZE = None
+
+
+# Function to get the path of the encoded features kept next to a breakout dataset
+def _cache_path(path):
+    return path.rstrip(os.sep) + ".features.npz"
+
+
+# Function to get a stamp that changes whenever the dataset is rewritten
+def _source_stamp(path):
+    if os.path.isdir(path):
+        files = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+    else:
+        files = [path]
+    stats = [os.stat(name) for name in files]
+    return np.array([[s.st_size, s.st_mtime_ns] for s in stats], dtype=np.int64)
+
+
+# Function to turn breakout rows into the feature matrix, sorted by time
+def encode_features(data):
+    data = data.sort_values("time", kind="stable", ignore_index=True)
+    features = data.reindex(columns=FEATURE_COLUMNS[:-1]).to_numpy(dtype=np.float64)
+    is_support = (data["breakout_type"].astype(str) == "support").to_numpy(dtype=np.float64)
+    return {
+        "X": np.column_stack([features, is_support]),
+        "y": data[TARGET_COLUMN].to_numpy(dtype=np.float64),
+        "time": pd.DatetimeIndex(pd.to_datetime(data["time"], utc=True)).as_unit("ns").asi8,
+        "columns": list(FEATURE_COLUMNS),
+    }
+
+
+# Function to load the encoded features of a breakout dataset, re-encoding only when it changed
+def load_features(path, cache=True):
+    """Returns a dict with X, y, time (epoch ns) and columns, rows in time order.
+
+    path is a CSV or an npz directory written by BreakoutSink. The encoded
+    matrix is cached in <path>.features.npz and reused until the dataset
+    changes.
+    """
+    stamp = _source_stamp(path)
+    cache_file = _cache_path(path)
+    if cache and os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as cached:
+            if np.array_equal(cached["stamp"], stamp):
+                return {
+                    "X": cached["X"],
+                    "y": cached["y"],
+                    "time": cached["time"],
+                    "columns": [str(name) for name in cached["columns"].tolist()],
+                }
+
+    features = encode_features(read_breakouts(path))
+    if cache:
+        tmp = cache_file + ".tmp.npz"
+        np.savez(tmp, stamp=stamp, X=features["X"], y=features["y"], time=features["time"],
+                 columns=np.array(features["columns"], dtype=str))
+        os.replace(tmp, cache_file)
+    return features
+
+
+# Function to make the model train_model.py fits, extra params override the defaults
+def make_model(**params):
+    params = {"random_state": 42, **params}
+    return RandomForestRegressor(**params)
+
+
+# Function to get expanding (or, with max_train_size, sliding) walk-forward folds
+def walk_forward_splits(n_rows, n_splits=N_SPLITS, max_train_size=MAX_TRAIN_SIZE, gap=0):
+    """Every fold trains only on rows before its test rows; gap rows are left out between them."""
+    splitter = TimeSeriesSplit(n_splits=n_splits, max_train_size=max_train_size, gap=gap)
+    return list(splitter.split(np.empty((n_rows, 1))))
+
+
+# Function to train and score one fold, run in a joblib worker
+def _fit_fold(fold, X, y, times, train, test, params):
+    model = make_model(**params)
+
+    started = time.perf_counter()
+    model.fit(X[train], y[train])
+    fit_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predicted = model.predict(X[test])
+    predict_seconds = time.perf_counter() - started
+
+    mse = mean_squared_error(y[test], predicted)
+    metrics = {
+        "fold": fold,
+        "train_start": times[train[0]],
+        "train_end": times[train[-1]],
+        "test_start": times[test[0]],
+        "test_end": times[test[-1]],
+        "train_rows": len(train),
+        "test_rows": len(test),
+        "mse": mse,
+        "rmse": mse ** 0.5,
+        "mae": mean_absolute_error(y[test], predicted),
+        "r2": r2_score(y[test], predicted),
+        # Predicting the training mean, the score any useful model has to beat
+        "baseline_mae": mean_absolute_error(y[test], np.full(len(test), y[train].mean())),
+        "fit_seconds": fit_seconds,
+        "predict_seconds": predict_seconds,
+    }
+    return metrics, predicted
+
+
+# Function to evaluate the model walk-forward, training the folds in parallel
+def evaluate_walk_forward(features, n_splits=N_SPLITS, max_train_size=MAX_TRAIN_SIZE, gap=0, n_jobs=-1, **params):
+    """Returns (report, predictions): one row of metrics and timings per fold
+    plus a mean row, and the out-of-sample predictions of every fold.
+
+    Folds run on n_jobs processes with one core each; joblib memory-maps the
+    feature matrix into the workers instead of copying it per fold.
+    """
+    X, y = features["X"], features["y"]
+    times = pd.to_datetime(features["time"], unit="ns", utc=True)
+    splits = walk_forward_splits(len(y), n_splits, max_train_size, gap)
+
+    params = {"n_jobs": 1, **params}
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(fold, X, y, times, train, test, params)
+        for fold, (train, test) in enumerate(splits, start=1)
+    )
+
+    report = pd.DataFrame([metrics for metrics, _ in results])
+    mean = report.drop(columns=["fold", "train_start", "train_end", "test_start", "test_end"]).mean()
+    report = pd.concat([report, mean.to_frame().T.assign(fold="mean")], ignore_index=True)
+    report[["train_rows", "test_rows"]] = report[["train_rows", "test_rows"]].round().astype(int)
+
+    predictions = pd.DataFrame({
+        "time": np.concatenate([times[test] for _, test in splits]),
+        "actual": np.concatenate([y[test] for _, test in splits]),
+        "predicted": np.concatenate([predicted for _, predicted in results]),
+        "fold": np.concatenate([np.full(len(test), fold) for fold, (_, test) in enumerate(splits, start=1)]),
+    })
+    return report, predictions
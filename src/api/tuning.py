@@ -0,0 +1,95 @@
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401, unlocks HalvingRandomSearchCV
+from sklearn.model_selection import HalvingRandomSearchCV, TimeSeriesSplit
+
+from inference import FlatForest
+from training import N_SPLITS, make_model
+
+# Settings tried by the search, sampled at random
+SEARCH_SPACE = {
+    "n_estimators": [50, 100, 200, 400],
+    "max_depth": [None, 6, 10, 16, 24],
+    "min_samples_leaf": [1, 2, 5, 10, 20],
+    "max_features": [1.0, 0.7, 0.5, "sqrt"],
+}
+
+# Candidates in the first round; each round keeps the best 1/FACTOR on FACTOR times the rows
+N_CANDIDATES = 81
+FACTOR = 3
+
+# Finalists refitted on every row to time their live predictions
+TOP_CANDIDATES = 10
+LATENCY_ROWS = 200
+
+
+# Function to fit one finalist on every row and time single-breakout predictions the way inference.py makes them
+def _time_candidate(params, X, y, rows):
+    model = make_model(n_jobs=1, **params)
+    started = time.perf_counter()
+    model.fit(X, y)
+    fit_seconds = time.perf_counter() - started
+
+    forest = FlatForest(model)
+    latencies = []
+    for row in X[rows]:
+        started = time.perf_counter()
+        forest.predict(row)
+        latencies.append(time.perf_counter() - started)
+
+    return {
+        "full_fit_seconds": fit_seconds,
+        "latency_p50_ms": float(np.percentile(latencies, 50)) * 1000,
+        "latency_p99_ms": float(np.percentile(latencies, 99)) * 1000,
+        "nodes": sum(estimator.tree_.node_count for estimator in model.estimators_),
+    }
+
+
+# Function to search model settings with successive halving over walk-forward folds
+def tune_hyperparameters(features, search_space=SEARCH_SPACE, n_candidates=N_CANDIDATES, factor=FACTOR,
+                         n_splits=N_SPLITS, top=TOP_CANDIDATES, n_jobs=-1, random_state=42):
+    """Returns a leaderboard, best first, with one row per candidate.
+
+    Every candidate is scored by MAE on TimeSeriesSplit folds (training rows
+    always before test rows). The first round scores all of them on a small
+    share of the rows, each later round keeps the best 1/factor and gives
+    them factor times more, until the last round uses every row. Candidates
+    are fitted in parallel on n_jobs processes, which share the one encoded
+    feature matrix. The top finalists are then refitted on all rows to
+    measure fit time and single-breakout prediction latency (FlatForest, as
+    in live inference); the others have NaN there.
+    """
+    X, y = features["X"], features["y"]
+    search = HalvingRandomSearchCV(
+        make_model(n_jobs=1), search_space, n_candidates=n_candidates, factor=factor,
+        min_resources="exhaust", cv=TimeSeriesSplit(n_splits=n_splits), scoring="neg_mean_absolute_error",
+        refit=False, return_train_score=False, random_state=random_state, n_jobs=n_jobs,
+    )
+    search.fit(X, y)
+
+    # One row per candidate, from the last round it took part in
+    results = pd.DataFrame(search.cv_results_)
+    results["candidate"] = results["params"].map(repr)
+    results = results.sort_values("iter").drop_duplicates("candidate", keep="last")
+    leaderboard = pd.DataFrame({
+        "round": results["iter"] + 1,
+        "rows": results["n_resources"],
+        **{name: results[f"param_{name}"] for name in search_space},
+        "mae": -results["mean_test_score"],
+        "mae_std": results["std_test_score"],
+        "fit_seconds": results["mean_fit_time"],
+        "score_seconds": results["mean_score_time"],
+        "params": results["params"],
+    })
+    leaderboard = leaderboard.sort_values(["round", "mae"], ascending=[False, True], ignore_index=True)
+
+    rows = np.linspace(0, len(y) - 1, min(LATENCY_ROWS, len(y))).astype(int)
+    finalists = leaderboard["params"][:top]
+    timings = Parallel(n_jobs=n_jobs)(delayed(_time_candidate)(params, X, y, rows) for params in finalists)
+    timings = pd.DataFrame(timings, index=finalists.index)
+    leaderboard = leaderboard.join(timings)
+    leaderboard.insert(0, "rank", np.arange(1, len(leaderboard) + 1))
+    return leaderboard